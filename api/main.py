@@ -1,50 +1,173 @@
-from fastapi import FastAPI, UploadFile, File
-from pydantic import BaseModel
-from typing import Optional
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, BackgroundTasks
+from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel, ConfigDict, StringConstraints
+from typing import Annotated, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import logging
+import aiofiles
 import uvicorn
 import os
 import uuid
 
 # Import the core functions
-from nexus.core import process_text_input_core, process_document_file_core, search_knowledge_core
+from nexus.core import (
+    ingest_text,
+    ingest_document_file,
+    search_knowledge_core,
+    submit_ingest_job,
+    run_ingest_job,
+    get_ingest_job,
+    get_search_cache_stats,
+    clear_search_cache
+)
+from db.db_manager import get_db_manager
 
-app = FastAPI(title="KnowledgeNexus API")
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent blocking Neo4j/LLM calls offloaded from the event loop
+MAX_BLOCKING_WORKERS = int(os.getenv("MAX_BLOCKING_WORKERS", "32"))
+# Largest accepted upload body in bytes (default 100 MiB)
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+def _prewarm():
+    manager = get_db_manager()
+    manager.driver.verify_connectivity()
+    logger.info("Neo4j connection pool is warm")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor = ThreadPoolExecutor(
+        max_workers=MAX_BLOCKING_WORKERS,
+        thread_name_prefix="knowledge-nexus-blocking"
+    )
+    asyncio.get_running_loop().set_default_executor(executor)
+    # Open the Neo4j pool before the first request instead of during it. A
+    # database that is not up yet should not keep the API from starting.
+    try:
+        await asyncio.to_thread(_prewarm)
+    except Exception as e:
+        logger.warning("Neo4j prewarm failed, connecting on first request: %s", str(e))
+    try:
+        yield
+    finally:
+        executor.shutdown(wait=False)
+
+app = FastAPI(title="KnowledgeNexus API", lifespan=lifespan)
+# Search results are plain text blocks that compress well; tiny bodies are
+# not worth the CPU
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
+
+# Identical requests currently being computed, keyed by request hash. Only
+# touched from the event loop thread, so no extra locking is needed.
+_inflight: Dict[bytes, asyncio.Future] = {}
+
+async def _single_flight(key: bytes, func, *args):
+    """Run func in a worker thread, sharing the result with identical concurrent calls."""
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    # Shield so a disconnecting client does not cancel the work for the others
+    return await asyncio.shield(future)
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_SIZE:
+        return JSONResponse(status_code=413, content={"detail": "Request body too large"})
+    return await call_next(request)
 
 class AddTextRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     text: str
     instructions: Optional[str] = ""
 
-class AddTextResponse(BaseModel):
-    result: str
+class JobResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    job_id: str
+    status: str
+    result: Optional[str] = None
 
 class SearchKnowledgeRequest(BaseModel):
-    query_text: str
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+    # Stripped whitespace lets equivalent queries share the in-flight and
+    # result cache keys
+    query_text: Annotated[str, StringConstraints(strip_whitespace=True)]
     node_type: Optional[str] = "ALL"
     k: Optional[int] = 10
     min_score: Optional[float] = 0.5
 
 class SearchKnowledgeResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     result: str
 
-@app.post("/add_text", response_model=AddTextResponse)
-def add_text(request: AddTextRequest):
-    result = process_text_input_core(request.text, request.instructions)
-    return AddTextResponse(result=result)
+class CacheStatsResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
 
-@app.post("/add_file", response_model=AddTextResponse)
-def add_file(file: UploadFile = File(...)):
+    size: int
+    maxsize: int
+    ttl: float
+    generation: Optional[int] = None
+    hits: int
+    misses: int
+
+async def _save_upload(file: UploadFile) -> str:
+    """Stream an upload to disk in fixed-size chunks so memory stays bounded."""
     temp_dir = os.path.join(os.getcwd(), "knowledge_nexus_files")
     os.makedirs(temp_dir, exist_ok=True)
     temp_filename = f"{uuid.uuid4()}_{file.filename}"
     file_path = os.path.join(temp_dir, temp_filename)
-    with open(file_path, "wb") as f:
-        f.write(file.file.read())
-    result = process_document_file_core(file_path)
-    return AddTextResponse(result=result)
+    written = 0
+    try:
+        async with aiofiles.open(file_path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > MAX_UPLOAD_SIZE:
+                    raise HTTPException(status_code=413, detail="Uploaded file too large")
+                await out.write(chunk)
+    except HTTPException:
+        os.remove(file_path)
+        raise
+    return file_path
+
+@app.post("/add_text", response_model=JobResponse, response_model_exclude_none=True, status_code=202)
+async def add_text(request: AddTextRequest, background_tasks: BackgroundTasks):
+    # Ingestion takes seconds of LLM and Neo4j work, so it runs after the
+    # response is sent and the client polls /jobs/{job_id} for the outcome
+    job_id = await asyncio.to_thread(submit_ingest_job, "text")
+    background_tasks.add_task(run_ingest_job, job_id, ingest_text, request.text, request.instructions)
+    return JobResponse(job_id=job_id, status="queued")
+
+@app.post("/add_file", response_model=JobResponse, response_model_exclude_none=True, status_code=202)
+async def add_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    file_path = await _save_upload(file)
+    job_id = await asyncio.to_thread(submit_ingest_job, "file")
+    background_tasks.add_task(run_ingest_job, job_id, ingest_document_file, file_path)
+    return JobResponse(job_id=job_id, status="queued")
+
+@app.get("/jobs/{job_id}", response_model=JobResponse, response_model_exclude_none=True)
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(get_ingest_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(job_id=job["id"], status=job["status"], result=job["result"])
 
 @app.post("/search_knowledge", response_model=SearchKnowledgeResponse)
-def search_knowledge(request: SearchKnowledgeRequest):
-    result = search_knowledge_core(
+async def search_knowledge(request: SearchKnowledgeRequest):
+    key = hashlib.blake2b(request.model_dump_json().encode()).digest()
+    result = await _single_flight(
+        key,
+        search_knowledge_core,
         request.query_text,
         request.node_type,
         request.k,
@@ -52,5 +175,28 @@ def search_knowledge(request: SearchKnowledgeRequest):
     )
     return SearchKnowledgeResponse(result=result)
 
+# Sizes and hit counters are those of the worker handling the request; the
+# generation is shared, and clearing bumps it for every worker
+@app.get("/cache/stats", response_model=CacheStatsResponse)
+async def cache_stats():
+    return await asyncio.to_thread(get_search_cache_stats)
+
+@app.post("/cache/clear", response_model=CacheStatsResponse)
+async def cache_clear():
+    await asyncio.to_thread(clear_search_cache)
+    return await asyncio.to_thread(get_search_cache_stats)
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # "auto" picks uvloop/httptools when installed (uvicorn[standard]) and
+    # falls back to asyncio/h11 on platforms without them, e.g. Windows
+    uvicorn.run(
+        "api.main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="auto",
+        http="auto",
+        limit_concurrency=1000,
+        backlog=2048,
+        timeout_keep_alive=30
+    )
@@ -1,4 +1,4 @@
-from db.db_manager import Neo4jManager
+from db.db_manager import get_db_manager
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -6,13 +6,12 @@ logger = logging.getLogger(__name__)
 
 def check_apoc():
     """Check if APOC is available in the Neo4j instance."""
-    db_manager = Neo4jManager()
     try:
-        db_manager.connect()
+        db_manager = get_db_manager()
         with db_manager.get_session() as session:
             # Try to list all APOC procedures
-            result = session.run("CALL dbms.procedures() YIELD name WITH name WHERE name STARTS WITH 'apoc' RETURN name")
-            procedures = [record["name"] for record in result]
+            result = session.run("SHOW PROCEDURES YIELD name WHERE name STARTS WITH 'apoc' RETURN name")
+            procedures = result.value("name")
             
             if procedures:
                 logger.info("APOC is installed! Found %d APOC procedures:", len(procedures))
@@ -24,16 +23,17 @@ def check_apoc():
                 logger.warning("No APOC procedures found. APOC might not be installed.")
                 
             # Specifically check for apoc.coll.union
-            result = session.run("CALL dbms.procedures() YIELD name WITH name WHERE name = 'apoc.coll.union' RETURN name")
-            if list(result):
+            result = session.run(
+                "SHOW FUNCTIONS YIELD name WHERE name = $name RETURN count(*) > 0 AS available",
+                name="apoc.coll.union"
+            )
+            if result.single()["available"]:
                 logger.info("apoc.coll.union is available!")
             else:
                 logger.warning("apoc.coll.union is NOT available!")
                 
     except Exception as e:
         logger.error("Error checking APOC: %s", str(e))
-    finally:
-        db_manager.close()
 
 if __name__ == "__main__":
     check_apoc() 
\ No newline at end of file
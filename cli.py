@@ -1,65 +1,87 @@
 import logging
-import re
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Dict, Optional
 import os
 
 import click
 import cognitive.entity_extraction as ce
-from db.db_manager import Neo4jManager
+from db.db_manager import get_db_manager
 from nexus.entity_resolution import EntityResolutionPipeline
 from nexus.entity_pipeline import EntityPipeline
 from nexus.pipeline import KnowledgeNexusPipeline
 from nexus.entity_processing import EntityProcessingPipeline
+from nexus.document_pipeline import DEFAULT_CONCURRENCY
+from nexus.core import invalidate_search_cache
+from db.vector_index import backfill_int8_codes
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class _State:
+    """Components shared by the commands of one CLI invocation."""
+    _pipelines: Dict[Optional[str], KnowledgeNexusPipeline] = field(default_factory=dict)
+
+    @property
+    def db_manager(self):
+        return get_db_manager()
+
+    def pipeline(self, storage_base: Optional[str] = None) -> KnowledgeNexusPipeline:
+        """Return the pipeline for a storage base, building it on first use."""
+        if storage_base not in self._pipelines:
+            self._pipelines[storage_base] = KnowledgeNexusPipeline(
+                db_manager=self.db_manager,
+                file_storage_base=storage_base
+            )
+        return self._pipelines[storage_base]
+
+
 @click.group()
-def cli():
+@click.pass_context
+def cli(ctx: click.Context):
     """CLI group for KnowledgeNexus entity extraction and document processing."""
-    pass
+    ctx.ensure_object(_State)
 
 
 @cli.command(name='process_input')
 @click.argument('text')
 @click.option('--instructions', '-i', default="", help="Optional instructions for entity extraction")
-def process_input(text: str, instructions: str = ""):
+@click.pass_obj
+def process_input(state: _State, text: str, instructions: str = ""):
     """Process the input text by extracting entities, resolving them, and inferring relationships."""
     try:
         # Initialize components
-        db_manager = Neo4jManager()
-        db_manager.connect()
-        
         resolution_pipeline = EntityResolutionPipeline()
-        pipeline = EntityPipeline(db_manager, resolution_pipeline)
+        pipeline = EntityPipeline(state.db_manager, resolution_pipeline)
         
         # Process the full input (extract entities, resolve them, infer and store relationships)
         entities, relationships = pipeline.process_input(text, instructions)
+        invalidate_search_cache()
         logger.info("Pipeline processed %d entities and inferred %d relationships.", 
                    len(entities), len(relationships))
         
-        # Output results
-        click.echo(f"\nProcessed {len(entities)} entities:")
-        for entity in entities:
-            click.echo(f"- {entity.name}")
-        
-        click.echo(f"\nInferred {len(relationships)} relationships:")
-        for rel in relationships:
-            click.echo(f"- {rel.subject} {rel.predicate} {rel.object} (confidence: {rel.confidence:.2f})")
+        # Output results in a single write
+        lines = [f"\nProcessed {len(entities)} entities:"]
+        lines.extend(f"- {entity.name}" for entity in entities)
+        lines.append(f"\nInferred {len(relationships)} relationships:")
+        lines.extend(
+            f"- {rel.subject} {rel.predicate} {rel.object} (confidence: {rel.confidence:.2f})"
+            for rel in relationships
+        )
+        click.echo("\n".join(lines))
         
     except Exception as e:
         logger.error("Error processing input: %s", str(e))
         click.echo(f"Error: {str(e)}", err=True)
-    finally:
-        if 'db_manager' in locals():
-            db_manager.close()
 
 
 @cli.command(name='process_document')
 @click.argument('file_path', type=click.Path(exists=True))
 @click.option('--storage-base', '-s', default=None, 
               help="Base directory for file storage (optional)")
-def process_document(file_path: str, storage_base: str = None):
+@click.pass_obj
+def process_document(state: _State, file_path: str, storage_base: str = None):
     """Process a document through the KnowledgeNexus pipeline.
     
     This command will:
@@ -68,44 +90,37 @@ def process_document(file_path: str, storage_base: str = None):
     3. Store the document and its relationships in the knowledge graph
     """
     try:
-        # Initialize components
-        db_manager = Neo4jManager()
-        db_manager.connect()
-        
-        # Initialize the main pipeline
-        pipeline = KnowledgeNexusPipeline(
-            db_manager=db_manager,
-            file_storage_base=storage_base
-        )
+        pipeline = state.pipeline(storage_base)
         
         # Process the document
         document = pipeline.process_document(file_path)
+        invalidate_search_cache()
         
-        # Output results
-        click.echo(f"\nProcessed document: {document.file_name}")
-        click.echo(f"Document ID: {document.id}")
-        click.echo(f"Status: {document.conversion_status}")
-        
+        # Output results in a single write
+        lines = [
+            f"\nProcessed document: {document.file_name}",
+            f"Document ID: {document.id}",
+            f"Status: {document.conversion_status}"
+        ]
         if document.error_message:
-            click.echo(f"Errors: {document.error_message}")
-            
-        click.echo(f"\nExtracted {len(document.entities)} entities:")
-        for entity in document.entities:
-            click.echo(f"- {entity}")
+            lines.append(f"Errors: {document.error_message}")
+        lines.append(f"\nExtracted {len(document.entities)} entities:")
+        lines.extend(f"- {entity}" for entity in document.entities)
+        click.echo("\n".join(lines))
             
     except Exception as e:
         logger.error("Error processing document: %s", str(e))
         click.echo(f"Error: {str(e)}", err=True)
-    finally:
-        if 'db_manager' in locals():
-            db_manager.close()
 
 
 @cli.command(name='process_directory')
 @click.argument('directory_path', type=click.Path(exists=True, file_okay=False, dir_okay=True))
 @click.option('--storage-base', '-s', default=None, 
               help="Base directory for file storage (optional)")
-def process_directory(directory_path: str, storage_base: str = None):
+@click.option('--concurrency', '-c', default=DEFAULT_CONCURRENCY, show_default=True,
+              help="Number of documents processed concurrently")
+@click.pass_obj
+def process_directory(state: _State, directory_path: str, storage_base: str = None, concurrency: int = DEFAULT_CONCURRENCY):
     """Process all documents in a directory through the KnowledgeNexus pipeline.
     
     This command will process each document in the directory (and subdirectories) by:
@@ -114,48 +129,34 @@ def process_directory(directory_path: str, storage_base: str = None):
     3. Storing the documents and their relationships in the knowledge graph
     """
     try:
-        # Initialize components
-        db_manager = Neo4jManager()
-        db_manager.connect()
-        
-        # Initialize the main pipeline
-        pipeline = KnowledgeNexusPipeline(
-            db_manager=db_manager,
-            file_storage_base=storage_base
-        )
+        pipeline = state.pipeline(storage_base)
         
         # Process the directory
-        documents = pipeline.process_directory(directory_path)
+        documents = pipeline.process_directory(directory_path, concurrency)
+        invalidate_search_cache()
         
-        # Output results
-        click.echo(f"\nProcessed {len(documents)} documents:")
+        # Output results in a single write
+        lines = [f"\nProcessed {len(documents)} documents:"]
         for doc in documents:
-            click.echo(f"\nDocument: {doc.file_name}")
-            click.echo(f"Status: {doc.conversion_status}")
-            click.echo(f"Entities: {len(doc.entities)}")
-            
+            lines.append(f"\nDocument: {doc.file_name}")
+            lines.append(f"Status: {doc.conversion_status}")
+            lines.append(f"Entities: {len(doc.entities)}")
             if doc.error_message:
-                click.echo(f"Errors: {doc.error_message}")
+                lines.append(f"Errors: {doc.error_message}")
+        click.echo("\n".join(lines))
             
     except Exception as e:
         logger.error("Error processing directory: %s", str(e))
         click.echo(f"Error: {str(e)}", err=True)
-    finally:
-        if 'db_manager' in locals():
-            db_manager.close()
 
 
 @cli.command(name='get_document_info')
 @click.argument('document_id')
-def get_document_info(document_id: str):
+@click.pass_obj
+def get_document_info(state: _State, document_id: str):
     """Retrieve and display information about a processed document."""
     try:
-        # Initialize components
-        db_manager = Neo4jManager()
-        db_manager.connect()
-        
-        # Initialize the main pipeline
-        pipeline = KnowledgeNexusPipeline(db_manager=db_manager)
+        pipeline = state.pipeline()
         
         # Get document metadata
         document = pipeline.get_document_metadata(document_id)
@@ -166,28 +167,42 @@ def get_document_info(document_id: str):
         # Get document entities
         entities = pipeline.get_document_entities(document_id)
         
-        # Output results
-        click.echo(f"\nDocument Information:")
-        click.echo(f"ID: {document.id}")
-        click.echo(f"Name: {document.file_name}")
-        click.echo(f"Type: {document.file_type}")
-        click.echo(f"Size: {document.file_size} bytes")
-        click.echo(f"Upload Date: {document.upload_date}")
-        click.echo(f"Status: {document.conversion_status}")
-        
+        # Output results in a single write
+        lines = [
+            "\nDocument Information:",
+            f"ID: {document.id}",
+            f"Name: {document.file_name}",
+            f"Type: {document.file_type}",
+            f"Size: {document.file_size} bytes",
+            f"Upload Date: {document.upload_date}",
+            f"Status: {document.conversion_status}"
+        ]
         if document.error_message:
-            click.echo(f"Errors: {document.error_message}")
-        
-        click.echo(f"\nEntities ({len(entities)}):")
-        for entity in entities:
-            click.echo(f"- {entity}")
+            lines.append(f"Errors: {document.error_message}")
+        lines.append(f"\nEntities ({len(entities)}):")
+        lines.extend(f"- {entity}" for entity in entities)
+        click.echo("\n".join(lines))
             
     except Exception as e:
         logger.error("Error retrieving document info: %s", str(e))
         click.echo(f"Error: {str(e)}", err=True)
-    finally:
-        if 'db_manager' in locals():
-            db_manager.close()
+
+
+@cli.command(name='backfill_embedding_codes')
+@click.option('--label', '-l', multiple=True, default=("Entity", "Document", "Memory"), show_default=True,
+              help="Node label to backfill (repeatable)")
+@click.pass_obj
+def backfill_embedding_codes(state: _State, label):
+    """Store int8 embedding codes on nodes created before they were written."""
+    try:
+        lines = []
+        for node_label in label:
+            updated = backfill_int8_codes(state.db_manager.driver, node_label)
+            lines.append(f"{node_label}: {updated} nodes updated")
+        click.echo("\n".join(lines))
+    except Exception as e:
+        logger.error("Error backfilling embedding codes: %s", str(e))
+        click.echo(f"Error: {str(e)}", err=True)
 
 
 def run_test():
@@ -235,8 +250,7 @@ Born on December 21, 1973, in a small canadian village called Senneterre, situat
         
         # Initialize components with explicit error handling
         try:
-            db_manager = Neo4jManager()
-            db_manager.connect()
+            get_db_manager()
             logger.info("Successfully connected to Neo4j database")
         except Exception as e:
             logger.error("Failed to connect to Neo4j: %s", str(e))
@@ -244,14 +258,11 @@ Born on December 21, 1973, in a small canadian village called Senneterre, situat
             return
 
         try:
-            process_input.callback(test_text, test_instructions)
+            cli.main(["process_input", test_text, "-i", test_instructions], standalone_mode=False)
             logger.info("Successfully processed test input")
         except Exception as e:
             logger.error("Error processing test input: %s", str(e))
             click.echo(f"Error processing test input: {str(e)}", err=True)
-        finally:
-            db_manager.close()
-            logger.info("Closed database connection")
 
         # Test document processing with explicit error handling
         # test_file = "C:/Users/lampr/OneDrive/Pictures/67673571642__3A378B89-2C90-4849-9EA2-3734DB41017C.jpg"
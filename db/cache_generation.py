@@ -0,0 +1,37 @@
+"""
+Database operations for the shared cache generation counters.
+
+Every process that caches query results keys its entries by the current
+generation of the data they were computed from. Writers bump the counter
+in Neo4j, so the caches of every API worker, the Gradio app and the CLI
+stop serving entries computed before the write.
+"""
+import logging
+from db.db_manager import Neo4jManager
+
+logger = logging.getLogger(__name__)
+
+GET_GENERATION_QUERY = """
+OPTIONAL MATCH (g:CacheGeneration {name: $name})
+RETURN coalesce(g.value, 0) AS value
+"""
+
+BUMP_GENERATION_QUERY = """
+MERGE (g:CacheGeneration {name: $name})
+SET g.value = coalesce(g.value, 0) + 1
+RETURN g.value AS value
+"""
+
+def get_generation(db_manager: Neo4jManager, name: str) -> int:
+    """Return the current value of a generation counter; 0 if it was never bumped."""
+    with db_manager.get_session() as session:
+        return session.run(GET_GENERATION_QUERY, name=name).single()["value"]
+
+def bump_generation(db_manager: Neo4jManager, name: str) -> int:
+    """Increment a generation counter and return its new value."""
+    with db_manager.get_session() as session:
+        value = session.execute_write(
+            lambda tx: tx.run(BUMP_GENERATION_QUERY, name=name).single()["value"]
+        )
+        logger.info("Cache generation %s is now %d", name, value)
+        return value
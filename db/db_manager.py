@@ -1,10 +1,14 @@
 """
 Database manager module for Neo4j operations.
 """
+import atexit
 import logging
 import os
-from typing import Optional
-from neo4j import GraphDatabase, Driver, Session
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterator, Optional
+from neo4j import GraphDatabase, Driver, Session, Transaction
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +22,9 @@ class Neo4jManager:
         self.password = password or os.getenv("NEO4J_PASSWORD")
         logger.info("Neo4jManager initialized with URI: %s, User: %s", self.uri, self.user)
         self.driver = None
+        # Whether APOC is available, set once entity infrastructure is set up
+        self.has_apoc: Optional[bool] = None
+        self.setup_lock = threading.Lock()
         
     def connect(self) -> None:
         """Establish connection to Neo4j database."""
@@ -27,7 +34,9 @@ class Neo4jManager:
         try:
             self.driver = GraphDatabase.driver(
                 self.uri,
-                auth=(self.user, self.password)
+                auth=(self.user, self.password),
+                max_connection_pool_size=int(os.getenv("NEO4J_POOL_SIZE", "50")),
+                max_connection_lifetime=int(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))
             )
             logger.info(f"Connected to Neo4j at {self.uri}")
         except Exception as e:
@@ -46,7 +55,34 @@ class Neo4jManager:
             raise RuntimeError("Database connection not initialized")
         return self.driver.session()
 
+    @contextmanager
+    def get_transaction(self) -> Iterator[Transaction]:
+        """
+        Open a session and an explicit transaction that commits when the block exits.
+
+        Lets several writes, e.g. batched entity and relationship upserts, share
+        one commit. The transaction is rolled back if the block raises.
+        """
+        with self.get_session() as session:
+            with session.begin_transaction() as tx:
+                yield tx
+                tx.commit()
+
     def update_entity(self, entity: dict):
         """Update an entity in the Neo4j database."""
         logger.info("Entity updated: %s", entity)
-        # Stub: Actual Neo4j interaction would occur here 
\ No newline at end of file
+        # Stub: Actual Neo4j interaction would occur here 
+
+@lru_cache(maxsize=1)
+def get_db_manager() -> Neo4jManager:
+    """
+    Return the process-wide connected Neo4jManager.
+
+    The underlying driver keeps its own connection pool, so sharing one
+    manager avoids a Bolt handshake per request or command. The connection
+    is closed automatically at interpreter exit.
+    """
+    manager = Neo4jManager()
+    manager.connect()
+    atexit.register(manager.close)
+    return manager
@@ -3,42 +3,113 @@ Database operations for document management.
 """
 import logging
 from typing import Optional, List, Dict
+from neo4j import Transaction
 from db.db_manager import Neo4jManager
 from models.document import Document
+from db.vector_utils import quantize_int8
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-def create_document(db_manager: Neo4jManager, document: Document) -> None:
+# Statuses of documents that were stored completely; a document with any
+# other status gives up its content hash so the file can be ingested again
+INGESTED_STATUSES = ["Success", "Conversion Skipped"]
+
+CREATE_DOCUMENT_QUERY = (
+    "CREATE (d:Document {"
+    "id: $id, "
+    "fileName: $file_name, "
+    "fileType: $file_type, "
+    "fileSize: $file_size, "
+    "uploadDate: $upload_date, "
+    "originalPath: $original_path, "
+    "markdownPath: $markdown_path, "
+    "conversionStatus: $conversion_status, "
+    "errorMessage: $error_message, "
+    "topics: $topics, "
+    "entities: $entities, "
+    "embedding: $embedding, "
+    "embedding_int8: $embedding_int8, "
+    "embedding_scale: $embedding_scale, "
+    "description: $description, "
+    "contentType: $content_type, "
+    "summary: $summary, "
+    "contentHash: $content_hash"
+    "}) RETURN d"
+)
+
+MIGRATE_DOCUMENT_STATUS_QUERY = """
+MATCH (d:Document)
+WHERE d.conversion_status IS NOT NULL
+SET d.conversionStatus = d.conversion_status,
+    d.errorMessage = d.error_message,
+    d.contentHash = CASE WHEN d.conversion_status IN $statuses THEN d.contentHash END
+REMOVE d.conversion_status, d.error_message
+"""
+
+def setup_document_infrastructure(db_manager: Neo4jManager) -> None:
     """
-    Create a Document node in Neo4j with the provided document metadata, including the embedding vector.
+    Create the uniqueness constraints on Document.id and Document.contentHash. They also
+    index lookups by id and by content hash, and keep concurrent ingests of the same
+    file from storing it twice. Each statement runs on its own, so one failing does
+    not skip the others.
+    """
+    statements = [
+        # Statuses used to be written to snake_case properties that nothing
+        # reads, so failed documents still looked ingested and kept their hash.
+        # Runs first: failed documents sharing a hash would block the constraint.
+        ("migrate document statuses", MIGRATE_DOCUMENT_STATUS_QUERY),
+        ("create Document id constraint",
+         "CREATE CONSTRAINT document_id_unique IF NOT EXISTS FOR (d:Document) REQUIRE d.id IS UNIQUE"),
+        # Superseded by the constraint's own index
+        ("drop Document content hash index", "DROP INDEX document_content_hash IF EXISTS"),
+        ("create Document content hash constraint",
+         "CREATE CONSTRAINT document_content_hash_unique IF NOT EXISTS "
+         "FOR (d:Document) REQUIRE d.contentHash IS UNIQUE"),
+    ]
+    try:
+        with db_manager.get_session() as session:
+            for description, statement in statements:
+                try:
+                    session.run(statement, statuses=INGESTED_STATUSES).consume()
+                except Exception as e:
+                    logger.warning("Could not %s: %s", description, str(e))
+        logger.info("Document id and content hash constraints created or already exist")
+    except Exception as e:
+        logger.warning("Could not set up Document infrastructure: %s", str(e))
+
+# Only documents that made it through conversion count as already ingested
+FIND_DOCUMENT_BY_HASH_QUERY = """
+MATCH (d:Document {contentHash: $content_hash})
+WHERE d.conversionStatus IN $statuses
+RETURN d.id AS id, d.fileName AS file_name, d.fileType AS file_type, d.fileSize AS file_size,
+       d.uploadDate AS upload_date, d.originalPath AS original_path, d.markdownPath AS markdown_path,
+       d.conversionStatus AS conversion_status, d.errorMessage AS error_message,
+       coalesce(d.entities, []) AS entities, coalesce(d.topics, []) AS topics,
+       coalesce(d.description, '') AS description, coalesce(d.contentType, '') AS content_type,
+       coalesce(d.summary, '') AS summary, d.contentHash AS content_hash
+LIMIT 1
+"""
+
+def find_document_by_hash(db_manager: Neo4jManager, content_hash: str) -> Optional[Document]:
+    """
+    Return the previously ingested document whose original file has the given content hash.
     Args:
         db_manager: Neo4jManager instance
-        document: Document model instance containing metadata and embedding property.
+        content_hash: SHA-256 hex digest of the file's bytes.
+    Returns:
+        The stored Document (without its embedding), or None if the file was never ingested.
     """
-    query = (
-        "CREATE (d:Document {"
-        "id: $id, "
-        "fileName: $file_name, "
-        "fileType: $file_type, "
-        "fileSize: $file_size, "
-        "uploadDate: $upload_date, "
-        "originalPath: $original_path, "
-        "markdownPath: $markdown_path, "
-        "conversionStatus: $conversion_status, "
-        "errorMessage: $error_message, "
-        "topics: $topics, "
-        "entities: $entities, "
-        "embedding: $embedding, "
-        "description: $description, "
-        "contentType: $content_type, "
-        "summary: $summary"
-        "}) RETURN d"
-    )
-    
+    with db_manager.get_session() as session:
+        record = session.run(FIND_DOCUMENT_BY_HASH_QUERY, content_hash=content_hash, statuses=INGESTED_STATUSES).single()
+    if record is None:
+        return None
+    return Document.model_validate(record.data())
+
+def _document_params(document: Document) -> Dict:
     upload_date = document.upload_date.isoformat() if isinstance(document.upload_date, datetime) else document.upload_date
-    
-    params = {
+    embedding_int8, embedding_scale = quantize_int8(document.embedding) if document.embedding else (None, None)
+    return {
         "id": document.id,
         "file_name": document.file_name,
         "file_type": document.file_type,
@@ -51,50 +122,177 @@ def create_document(db_manager: Neo4jManager, document: Document) -> None:
         "topics": document.topics,
         "entities": document.entities,
         "embedding": document.embedding,
+        "embedding_int8": embedding_int8,
+        "embedding_scale": embedding_scale,
         "description": document.description,
         "content_type": document.content_type,
-        "summary": document.summary
+        "summary": document.summary,
+        "content_hash": document.content_hash
     }
+
+def _tx_create_document(tx: Transaction, params: Dict):
+    return tx.run(CREATE_DOCUMENT_QUERY, params).consume()
+
+def create_document(db_manager: Neo4jManager, document: Document, tx: Optional[Transaction] = None) -> None:
+    """
+    Create a Document node in Neo4j with the provided document metadata, including the embedding vector.
+    Args:
+        db_manager: Neo4jManager instance
+        document: Document model instance containing metadata and embedding property.
+        tx: Optional open transaction to run in; by default a retrying write transaction is used.
+    """
+    params = _document_params(document)
     
     try:
-        with db_manager.get_session() as session:
-            logger.debug("Executing query: %s", query)
-            logger.debug("With parameters: %s", params)
-            
-            result = session.run(query, params)
-            summary = result.consume()
-            
-            if summary.counters.nodes_created == 1:
-                logger.info("Document node created successfully: %s", document.file_name)
-            else:
-                logger.error("Failed to create document node: no node was created")
-                raise RuntimeError("Document node creation failed")
+        logger.debug("Executing query: %s", CREATE_DOCUMENT_QUERY)
+        logger.debug("With parameters: %s", params)
+        
+        if tx is not None:
+            summary = _tx_create_document(tx, params)
+        else:
+            with db_manager.get_session() as session:
+                summary = session.execute_write(_tx_create_document, params)
+        
+        if summary.counters.nodes_created == 1:
+            logger.info("Document node created successfully: %s", document.file_name)
+        else:
+            logger.error("Failed to create document node: no node was created")
+            raise RuntimeError("Document node creation failed")
                 
     except Exception as e:
         logger.error("Failed to create document: %s", str(e))
         raise RuntimeError(f"Failed to create document node: {str(e)}")
 
-def create_document_entity_relationship(db_manager: Neo4jManager, document_id: str, entity_name: str) -> None:
+# Entity names are stored lowercase, so the MATCH below is an index lookup
+CREATE_DOCUMENT_WITH_ENTITIES_QUERY = CREATE_DOCUMENT_QUERY.replace(" RETURN d", "") + """
+WITH d
+UNWIND $entity_names AS entity_name
+MATCH (e:Entity {name: entity_name})
+MERGE (d)-[:MENTIONS]->(e)
+"""
+
+def _tx_create_document_with_entities(tx: Transaction, params: Dict):
+    return tx.run(CREATE_DOCUMENT_WITH_ENTITIES_QUERY, params).consume()
+
+def create_document_with_entities(db_manager: Neo4jManager, document: Document, entity_names: List[str],
+                                  tx: Optional[Transaction] = None) -> None:
     """
-    Create a relationship between the Document and an Entity node using case-insensitive matching on entity name.
+    Create a Document node and its MENTIONS relationships to existing entities in one statement.
     Args:
         db_manager: Neo4jManager instance
-        document_id (str): The ID of the Document node
-        entity_name (str): The name of the Entity node
+        document: Document model instance containing metadata and embedding property.
+        entity_names: Names of the entities the document mentions, matched case-insensitively.
+        tx: Optional open transaction to run in; by default a retrying write transaction is used.
     """
-    query = """
-    MATCH (d:Document {id: $document_id})
-    MATCH (e:Entity) WHERE toLower(e.name) = toLower($entity_name)
+    params = _document_params(document)
+    params["entity_names"] = list(dict.fromkeys(name.lower() for name in entity_names))
+    
+    try:
+        if tx is not None:
+            summary = _tx_create_document_with_entities(tx, params)
+        else:
+            with db_manager.get_session() as session:
+                summary = session.execute_write(_tx_create_document_with_entities, params)
+        
+        if summary.counters.nodes_created != 1:
+            logger.error("Failed to create document node: no node was created")
+            raise RuntimeError("Document node creation failed")
+        logger.info("Document node created successfully: %s (%d entity mentions)",
+                    document.file_name, summary.counters.relationships_created)
+    except Exception as e:
+        logger.error("Failed to create document: %s", str(e))
+        raise RuntimeError(f"Failed to create document node: {str(e)}")
+
+# One statement for a whole batch of documents; the mentions run in a unit
+# subquery so a document without entities still keeps its row
+CREATE_DOCUMENTS_WITH_ENTITIES_QUERY = "UNWIND $documents AS doc\n" + CREATE_DOCUMENT_QUERY.replace(" RETURN d", "").replace("$", "doc.") + """
+WITH d, doc
+CALL {
+    WITH d, doc
+    UNWIND doc.entity_names AS entity_name
+    MATCH (e:Entity {name: entity_name})
     MERGE (d)-[:MENTIONS]->(e)
+}
+"""
+
+def _tx_create_documents_with_entities(tx: Transaction, rows: List[Dict]):
+    return tx.run(CREATE_DOCUMENTS_WITH_ENTITIES_QUERY, documents=rows).consume()
+
+def create_documents_with_entities(db_manager: Neo4jManager, documents: List[Document],
+                                   tx: Optional[Transaction] = None) -> None:
     """
-    try:
+    Create many Document nodes and their MENTIONS relationships to existing entities in one statement.
+    Args:
+        db_manager: Neo4jManager instance
+        documents: Document model instances; each mentions the entities named in its entities field.
+        tx: Optional open transaction to run in; by default a retrying write transaction is used.
+    """
+    if not documents:
+        return
+    rows = []
+    for document in documents:
+        params = _document_params(document)
+        params["entity_names"] = list(dict.fromkeys(name.lower() for name in document.entities))
+        rows.append(params)
+    if tx is not None:
+        summary = _tx_create_documents_with_entities(tx, rows)
+    else:
         with db_manager.get_session() as session:
-            session.run(query, document_id=document_id, entity_name=entity_name)
-            logger.info("Created relationship between document %s and entity %s", document_id, entity_name)
+            summary = session.execute_write(_tx_create_documents_with_entities, rows)
+    if summary.counters.nodes_created != len(documents):
+        raise RuntimeError(
+            f"Document node creation failed: {summary.counters.nodes_created} of {len(documents)} created"
+        )
+    logger.info("Created %d document nodes (%d entity mentions)",
+                len(documents), summary.counters.relationships_created)
+
+CREATE_DOCUMENT_ENTITY_RELATIONSHIPS_QUERY = """
+MATCH (d:Document {id: $document_id})
+UNWIND $entity_names AS entity_name
+MATCH (e:Entity {name: entity_name})
+MERGE (d)-[:MENTIONS]->(e)
+"""
+
+def _tx_create_document_entity_relationships(tx: Transaction, document_id: str, entity_names: List[str]):
+    return tx.run(CREATE_DOCUMENT_ENTITY_RELATIONSHIPS_QUERY, document_id=document_id, entity_names=entity_names).consume()
+
+def create_document_entity_relationships(db_manager: Neo4jManager, document_id: str, entity_names: List[str],
+                                         tx: Optional[Transaction] = None) -> None:
+    """
+    Create MENTIONS relationships from an existing Document to many Entity nodes in one statement,
+    using case-insensitive matching on entity names.
+    Args:
+        db_manager: Neo4jManager instance
+        document_id (str): The ID of the Document node
+        entity_names: The names of the Entity nodes
+        tx: Optional open transaction to run in; by default a retrying write transaction is used.
+    """
+    names = list(dict.fromkeys(name.lower() for name in entity_names))
+    if not names:
+        return
+    try:
+        if tx is not None:
+            _tx_create_document_entity_relationships(tx, document_id, names)
+        else:
+            with db_manager.get_session() as session:
+                session.execute_write(_tx_create_document_entity_relationships, document_id, names)
+        logger.info("Created relationships between document %s and %d entities", document_id, len(names))
     except Exception as e:
-        logger.error("Failed to create document-entity relationship: %s", e)
+        logger.error("Failed to create document-entity relationships: %s", e)
         raise
 
+def create_document_entity_relationship(db_manager: Neo4jManager, document_id: str, entity_name: str,
+                                        tx: Optional[Transaction] = None) -> None:
+    """
+    Create a relationship between the Document and an Entity node using case-insensitive matching on entity name.
+    Args:
+        db_manager: Neo4jManager instance
+        document_id (str): The ID of the Document node
+        entity_name (str): The name of the Entity node
+        tx: Optional open transaction to run in; by default a retrying write transaction is used.
+    """
+    create_document_entity_relationships(db_manager, document_id, [entity_name], tx=tx)
+
 def get_document_metadata(db_manager: Neo4jManager, document_id: str) -> Optional[Dict]:
     """Retrieve metadata for a document."""
     with db_manager.get_session() as session:
@@ -114,23 +312,65 @@ def get_document_entities(db_manager: Neo4jManager, document_id: str) -> List[st
         """, {'doc_id': document_id})
         return [record["entity_name"] for record in result]
 
-def update_document_status(db_manager: Neo4jManager, document_id: str, status: str, error_message: str) -> None:
+UPDATE_DOCUMENT_STATUS_QUERY = (
+    "MATCH (d:Document {id: $document_id}) "
+    "SET d.conversionStatus = $status, d.errorMessage = $error_message, "
+    "d.contentHash = CASE WHEN $status IN $statuses THEN d.contentHash END"
+)
+
+def _tx_update_document_status(tx: Transaction, document_id: str, status: str, error_message: str):
+    return tx.run(
+        UPDATE_DOCUMENT_STATUS_QUERY,
+        document_id=document_id, status=status, error_message=error_message, statuses=INGESTED_STATUSES
+    ).consume()
+
+def update_document_status(db_manager: Neo4jManager, document_id: str, status: str, error_message: str,
+                           tx: Optional[Transaction] = None) -> None:
     """
-    Update the status and error message of a Document node in Neo4j.
+    Update the status and error message of a Document node in Neo4j. A failed
+    document's content hash is cleared so the same file can be ingested again.
     Args:
         db_manager: Neo4jManager instance
         document_id (str): The ID of the Document node
         status (str): New status
         error_message (str): Error message to store
+        tx: Optional open transaction to run in; by default a retrying write transaction is used.
     """
-    query = (
-        "MATCH (d:Document {id: $document_id}) "
-        "SET d.conversion_status = $status, d.error_message = $error_message"
-    )
     try:
-        with db_manager.get_session() as session:
-            session.run(query, document_id=document_id, status=status, error_message=error_message)
-            logger.info("Updated document %s status to %s", document_id, status)
+        if tx is not None:
+            _tx_update_document_status(tx, document_id, status, error_message)
+        else:
+            with db_manager.get_session() as session:
+                session.execute_write(_tx_update_document_status, document_id, status, error_message)
+        logger.info("Updated document %s status to %s", document_id, status)
     except Exception as e:
         logger.error("Failed to update document status: %s", e)
-        raise 
\ No newline at end of file
+        raise
+
+RELEASE_FAILED_CONTENT_HASH_QUERY = """
+MATCH (d:Document {contentHash: $content_hash})
+WHERE NOT d.conversionStatus IN $statuses
+SET d.contentHash = null
+RETURN count(d) AS released
+"""
+
+def release_failed_content_hash(db_manager: Neo4jManager, content_hash: str) -> bool:
+    """
+    Clear the content hash of a document that failed to be stored, so a new
+    ingest of the same file is not rejected by the uniqueness constraint.
+    Args:
+        db_manager: Neo4jManager instance
+        content_hash: SHA-256 hex digest of the file's bytes.
+    Returns:
+        True if a failed document held the hash.
+    """
+    with db_manager.get_session() as session:
+        record = session.execute_write(
+            lambda tx: tx.run(
+                RELEASE_FAILED_CONTENT_HASH_QUERY, content_hash=content_hash, statuses=INGESTED_STATUSES
+            ).single()
+        )
+    released = record["released"] > 0
+    if released:
+        logger.info("Released content hash %s held by a failed document", content_hash)
+    return released
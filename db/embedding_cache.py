@@ -0,0 +1,244 @@
+"""
+Persistent embedding cache stored in Neo4j.
+
+Embeddings are keyed by the SHA-256 of the model name, the requested
+dimensions and the cleaned text, so re-ingested or duplicate content is
+embedded once across processes and restarts. Vectors are stored as packed
+float32 bytes.
+
+Long texts also get a MinHash signature of their character 5-grams. A text
+that misses the exact lookup reuses the embedding of a cached text whose
+estimated Jaccard similarity is at least FUZZY_MATCH_THRESHOLD, so a fixed
+typo or re-saved whitespace does not pay for a new embedding.
+"""
+import hashlib
+import logging
+import threading
+import zlib
+from typing import Dict, List, Optional, Set
+import numpy as np
+from db.db_manager import Neo4jManager
+from db.vector_utils import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, get_embeddings
+
+logger = logging.getLogger(__name__)
+
+# Texts shorter than this are only matched exactly; for short texts a small
+# edit is a large change in meaning
+FUZZY_MIN_CHARS = 1000
+FUZZY_MATCH_THRESHOLD = 0.97
+SHINGLE_SIZE = 5
+MINHASH_PERMUTATIONS = 128
+# 16 bands of 8 rows: texts at 0.97 similarity share a band with near
+# certainty, texts at 0.5 only about 6% of the time
+LSH_BANDS = 16
+_LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 32, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+LOOKUP_EMBEDDINGS_QUERY = """
+UNWIND $keys AS key
+MATCH (c:EmbeddingCache {key: key})
+RETURN c.key AS key, c.vector AS vector
+"""
+
+STORE_EMBEDDINGS_QUERY = """
+UNWIND $rows AS row
+MERGE (c:EmbeddingCache {key: row.key})
+ON CREATE SET c.model = row.model, c.vector = row.vector, c.minhash = row.minhash, c.created_at = timestamp()
+"""
+
+LOAD_SIGNATURES_QUERY = """
+MATCH (c:EmbeddingCache)
+WHERE c.minhash IS NOT NULL AND c.model = $model
+RETURN c.key AS key, c.minhash AS minhash
+"""
+
+def minhash_signature(text: str) -> np.ndarray:
+    """Return the MinHash signature (uint32 per permutation) of a text's character shingles."""
+    normalized = " ".join(text.split())
+    shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(max(len(normalized) - SHINGLE_SIZE + 1, 1))}
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    signature = np.full(MINHASH_PERMUTATIONS, np.iinfo(np.uint32).max, dtype=np.uint64)
+    # Blocks bound the (shingles x permutations) intermediate for long documents
+    for start in range(0, len(hashes), 8192):
+        block = hashes[start:start + 8192, None]
+        permuted = ((block * _PERM_A + _PERM_B) % _MERSENNE_PRIME) & np.uint64(0xFFFFFFFF)
+        np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+class _MinHashIndex:
+    """In-process LSH index over the signatures of cached long texts."""
+
+    def __init__(self):
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(LSH_BANDS)]
+        self.loaded_models: Set[str] = set()
+        self.lock = threading.Lock()
+
+    def _bands(self, signature: np.ndarray):
+        for band in range(LSH_BANDS):
+            yield band, signature[band * _LSH_ROWS:(band + 1) * _LSH_ROWS].tobytes()
+
+    def insert(self, key: str, signature: np.ndarray) -> None:
+        with self.lock:
+            self.signatures[key] = signature
+            for band, bucket in self._bands(signature):
+                self.buckets[band].setdefault(bucket, set()).add(key)
+
+    def best_match(self, signature: np.ndarray) -> Optional[str]:
+        """Return the key of the most similar indexed text at or above FUZZY_MATCH_THRESHOLD."""
+        with self.lock:
+            candidates = set()
+            for band, bucket in self._bands(signature):
+                candidates |= self.buckets[band].get(bucket, set())
+            best_key, best_score = None, FUZZY_MATCH_THRESHOLD
+            for key in candidates:
+                score = float(np.mean(self.signatures[key] == signature))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            return best_key
+
+    def ensure_loaded(self, db_manager: Neo4jManager, model: str) -> None:
+        """Load the stored signatures of a model once per process."""
+        if model in self.loaded_models:
+            return
+        with db_manager.get_session() as session:
+            records = list(session.run(LOAD_SIGNATURES_QUERY, model=model))
+        for record in records:
+            self.insert(record["key"], np.frombuffer(record["minhash"], dtype="<u4").astype(np.uint32))
+        self.loaded_models.add(model)
+
+_minhash_index = _MinHashIndex()
+
+def setup_embedding_cache(db_manager: Neo4jManager) -> None:
+    """Create the uniqueness constraint that indexes cache lookups by key."""
+    try:
+        with db_manager.get_session() as session:
+            session.run(
+                "CREATE CONSTRAINT embedding_cache_key_unique IF NOT EXISTS "
+                "FOR (c:EmbeddingCache) REQUIRE c.key IS UNIQUE"
+            ).consume()
+            logger.info("Embedding cache constraint created or already exists")
+    except Exception as e:
+        logger.warning("Could not create embedding cache constraint: %s", str(e))
+
+def _model_tag(model: str) -> str:
+    """Identify the vectors of a model at the configured dimensions, which differ per size."""
+    return f"{model}:{EMBEDDING_DIMENSIONS}"
+
+def cache_key(text: str, model: str = EMBEDDING_MODEL) -> str:
+    """Return the cache key of a text, cleaned the same way get_embedding cleans it."""
+    cleaned_text = text.replace("\n", " ").strip()
+    return hashlib.sha256(f"{_model_tag(model)}\0{cleaned_text}".encode("utf-8")).hexdigest()
+
+def composite_key(content_hash: str, fields: List[str], model: str = EMBEDDING_MODEL) -> str:
+    """
+    Return the cache key of a text made of a large body plus small fields, e.g. a
+    document's markdown followed by its generated metadata. Only the hash of the
+    body is needed, so the combined text does not have to be hashed again.
+    """
+    digest = hashlib.sha256(f"{_model_tag(model)}\0composite\0{content_hash}".encode("utf-8"))
+    for value in fields:
+        digest.update(b"\0")
+        digest.update(value.encode("utf-8"))
+    return digest.hexdigest()
+
+def get_or_compute_many(db_manager: Neo4jManager, texts: List[str],
+                        model: str = EMBEDDING_MODEL,
+                        keys: Optional[List[Optional[str]]] = None) -> List[Optional[list]]:
+    """
+    Return embeddings for many texts, generating only those not cached yet.
+
+    Cached vectors are read with one query, misses are embedded with one
+    batched API request and written back with one query. If the cache
+    cannot be read or written, the texts are simply embedded.
+
+    Args:
+        db_manager: Neo4jManager instance
+        texts: The input texts.
+        model: The embedding model to use.
+        keys: Optional precomputed cache keys (see composite_key), one per
+            text; None entries are keyed with cache_key.
+
+    Returns:
+        One embedding per input text, in order; None for empty texts.
+    """
+    keys = [
+        key if key is not None else cache_key(text, model)
+        for text, key in zip(texts, keys if keys is not None else [None] * len(texts))
+    ]
+    cached = {}
+    try:
+        with db_manager.get_session() as session:
+            for record in session.run(LOOKUP_EMBEDDINGS_QUERY, keys=list(dict.fromkeys(keys))):
+                cached[record["key"]] = np.frombuffer(record["vector"], dtype="<f4").tolist()
+    except Exception as e:
+        logger.warning("Embedding cache lookup failed: %s", str(e))
+
+    missing = [i for i, key in enumerate(keys) if key not in cached and texts[i].strip()]
+    signatures = {
+        i: minhash_signature(texts[i]) for i in missing if len(texts[i]) >= FUZZY_MIN_CHARS
+    }
+    if signatures:
+        missing = _fuzzy_lookup(db_manager, model, keys, missing, signatures, cached)
+    embeddings = [cached.get(key) for key in keys]
+    if not missing:
+        return embeddings
+    logger.info("Embedding cache: %d hits, %d misses", len(texts) - len(missing), len(missing))
+
+    computed = get_embeddings([texts[i] for i in missing], model=model)
+    rows = {}
+    for i, embedding in zip(missing, computed):
+        embeddings[i] = embedding
+        if embedding is not None:
+            signature = signatures.get(i)
+            rows[keys[i]] = {
+                "key": keys[i],
+                "model": _model_tag(model),
+                "vector": np.asarray(embedding, dtype="<f4").tobytes(),
+                "minhash": signature.astype("<u4").tobytes() if signature is not None else None
+            }
+            if signature is not None:
+                _minhash_index.insert(keys[i], signature)
+    if rows:
+        try:
+            with db_manager.get_session() as session:
+                session.execute_write(lambda tx: tx.run(STORE_EMBEDDINGS_QUERY, rows=list(rows.values())).consume())
+        except Exception as e:
+            logger.warning("Embedding cache write failed: %s", str(e))
+    return embeddings
+
+def _fuzzy_lookup(db_manager: Neo4jManager, model: str, keys: List[str], missing: List[int],
+                  signatures: Dict[int, np.ndarray], cached: Dict[str, list]) -> List[int]:
+    """Fill cached with near-duplicate matches for long missing texts and return the indices still missing."""
+    try:
+        _minhash_index.ensure_loaded(db_manager, _model_tag(model))
+        matches = {}
+        for i, signature in signatures.items():
+            match = _minhash_index.best_match(signature)
+            if match is not None:
+                matches[i] = match
+        if not matches:
+            return missing
+        with db_manager.get_session() as session:
+            vectors = {
+                record["key"]: np.frombuffer(record["vector"], dtype="<f4").tolist()
+                for record in session.run(LOOKUP_EMBEDDINGS_QUERY, keys=list(set(matches.values())))
+            }
+        for i, match in matches.items():
+            if match in vectors:
+                cached[keys[i]] = vectors[match]
+        logger.info("Embedding cache: %d near-duplicate hits", sum(keys[i] in cached for i in matches))
+    except Exception as e:
+        logger.warning("Embedding cache fuzzy lookup failed: %s", str(e))
+    return [i for i in missing if keys[i] not in cached]
+
+def get_or_compute(db_manager: Neo4jManager, text: str, model: str = EMBEDDING_MODEL) -> Optional[list]:
+    """Return the embedding of a single text from the cache, generating it on a miss."""
+    return get_or_compute_many(db_manager, [text], model)[0]
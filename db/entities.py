@@ -1,9 +1,11 @@
 import logging
+import os
+from neo4j import Transaction
 from db.db_manager import Neo4jManager
-from typing import List, Optional
+from typing import Iterator, List, Optional
 from models.relationship import RelationshipSchema
-from db.vector_utils import get_embedding
-from db.memories import cosine_similarity
+from db.vector_index import drop_vector_index_if_dimensions_differ
+from db.vector_utils import EMBEDDING_DIMENSIONS, get_embedding, get_embeddings, quantize_int8, dequantize_int8, embedding_matrix, nearest_rows
 
 logger = logging.getLogger(__name__)
 
@@ -19,45 +21,125 @@ ON MATCH SET
 RETURN e
 """
 
-SEARCH_SIMILAR_ENTITIES_QUERY = """
-MATCH (e:Entity)
-WHERE e.name =~ $name_pattern
-RETURN e.name as name, e.aliases as aliases
+# Entity names are stored lowercase, so an exact lookup on the lowercase
+# name is served by the entity_name index
+FIND_ENTITY_BY_NAME_QUERY = """
+MATCH (e:Entity {name: $name})
+RETURN e
+"""
+
+# Neo4j reports cosine index scores as (1 + cos) / 2; convert back so the
+# threshold compares against plain cosine similarity
+SEARCH_ENTITY_VECTOR_INDEX_QUERY = """
+CALL db.index.vector.queryNodes('entity_embedding', $k, $embedding)
+YIELD node AS e, score
+WITH e, 2 * score - 1 AS similarity
+WHERE similarity >= $threshold
+RETURN e, similarity
 """
 
-MERGE_RELATIONSHIP_QUERY = """
-MATCH (s:Entity) WHERE toLower(s.name) = toLower($subject)
-MATCH (o:Entity) WHERE toLower(o.name) = toLower($object)
-MERGE (s)-[r:RELATED {predicate: $predicate}]->(o)
+# Rows sent per UNWIND statement, and per transaction unless the caller
+# passes its own; large single transactions hold a lot of server memory
+WRITE_BATCH_SIZE = int(os.getenv("NEO4J_WRITE_BATCH_SIZE", "1000"))
+
+# Entity names are stored lowercase and rows carry lowercased names, so both
+# MATCHes are index seeks rather than toLower() over every Entity
+MERGE_RELATIONSHIPS_QUERY = """
+UNWIND $rows AS row
+MATCH (s:Entity {name: row.subject})
+MATCH (o:Entity {name: row.object})
+MERGE (s)-[r:RELATED {predicate: row.predicate}]->(o)
 ON CREATE SET 
-    r.confidence = $confidence,
+    r.confidence = row.confidence,
     r.created_at = timestamp()
 ON MATCH SET 
     r.last_seen_at = timestamp(),
-    r.confidence = $confidence
-RETURN r
+    r.confidence = row.confidence
 """
 
+UPDATE_ENTITY_APOC_QUERY = """
+UNWIND $rows AS row
+MERGE (e:Entity {name: row.name})
+ON CREATE SET 
+    e.aliases = row.aliases, 
+    e.entity_type = row.entity_type, 
+    e.embedding = row.embedding,
+    e.embedding_int8 = row.embedding_int8,
+    e.embedding_scale = row.embedding_scale,
+    e.created_at = timestamp()
+ON MATCH SET 
+    e.entity_type = row.entity_type, 
+    e.embedding = row.embedding,
+    e.embedding_int8 = row.embedding_int8,
+    e.embedding_scale = row.embedding_scale,
+    e.last_seen_at = timestamp(),
+    e.aliases = apoc.coll.union(coalesce(e.aliases, []), row.aliases)
+"""
+
+UPDATE_ENTITY_FALLBACK_QUERY = """
+UNWIND $rows AS row
+MERGE (e:Entity {name: row.name})
+ON CREATE SET 
+    e.aliases = row.aliases, 
+    e.entity_type = row.entity_type, 
+    e.embedding = row.embedding,
+    e.embedding_int8 = row.embedding_int8,
+    e.embedding_scale = row.embedding_scale,
+    e.created_at = timestamp()
+ON MATCH SET 
+    e.entity_type = row.entity_type, 
+    e.embedding = row.embedding,
+    e.embedding_int8 = row.embedding_int8,
+    e.embedding_scale = row.embedding_scale,
+    e.last_seen_at = timestamp(),
+    e.aliases = CASE 
+        WHEN e.aliases IS NULL THEN row.aliases 
+        ELSE [x IN e.aliases + row.aliases WHERE x IS NOT NULL] 
+    END
+"""
+
+ENTITY_VECTOR_INDEX_QUERY = """
+CREATE VECTOR INDEX entity_embedding IF NOT EXISTS
+FOR (e:Entity)
+ON (e.embedding)
+OPTIONS {
+    indexConfig: {
+        `vector.dimensions`: %d,
+        `vector.similarity_function`: 'cosine'%s
+    }
+}
+"""
+QUANTIZED_VECTOR_INDEX_OPTION = ",\n        `vector.quantization.enabled`: true"
+
 def setup_entity_infrastructure(session):
     """Creates necessary indexes and verifies APOC installation."""
     try:
-        # Attempt to create vector index for entity embeddings.
+        # Attempt to create vector index for entity embeddings, quantized where
+        # the server supports it (Neo4j 5.13+) to shrink the index in memory.
         try:
-            session.run("""
-            CREATE VECTOR INDEX entity_embedding IF NOT EXISTS
-            FOR (e:Entity)
-            ON (e.embedding)
-            OPTIONS {
-                indexConfig: {
-                    `vector.dimensions`: 3072,
-                    `vector.similarity_function`: 'cosine'
-                }
-            }
-            """)
+            drop_vector_index_if_dimensions_differ(session, "entity_embedding", EMBEDDING_DIMENSIONS)
+            try:
+                session.run(ENTITY_VECTOR_INDEX_QUERY % (EMBEDDING_DIMENSIONS, QUANTIZED_VECTOR_INDEX_OPTION)).consume()
+            except Exception as quant_err:
+                logger.info("Quantized vector index not supported, creating a plain one: %s", str(quant_err))
+                session.run(ENTITY_VECTOR_INDEX_QUERY % (EMBEDDING_DIMENSIONS, "")).consume()
             logger.info("Entity embedding vector index created or already exists")
         except Exception as vec_err:
             logger.warning("Vector index creation not supported: %s", str(vec_err))
         
+        # A uniqueness constraint backs MERGE/MATCH on Entity.name with an index
+        # and keeps concurrent MERGEs from creating duplicate entities. It cannot
+        # coexist with a plain index on the same property, so that one goes first.
+        try:
+            session.run("DROP INDEX entity_name IF EXISTS").consume()
+            session.run(
+                "CREATE CONSTRAINT entity_name_unique IF NOT EXISTS "
+                "FOR (e:Entity) REQUIRE e.name IS UNIQUE"
+            ).consume()
+        except Exception as constraint_err:
+            logger.warning("Could not create Entity name constraint, indexing names instead: %s", str(constraint_err))
+            session.run("CREATE INDEX entity_name IF NOT EXISTS FOR (e:Entity) ON (e.name)").consume()
+        
         # Test if APOC is available
         result = session.run("CALL apoc.help('coll')")
         if list(result):
@@ -70,119 +152,154 @@ def setup_entity_infrastructure(session):
         logger.warning("Could not setup entity infrastructure: %s", str(e))
         return False
 
+def _ensure_entity_infrastructure(manager: Neo4jManager) -> bool:
+    """Run setup_entity_infrastructure once per manager and return whether APOC is available."""
+    if manager.has_apoc is None:
+        with manager.setup_lock:
+            if manager.has_apoc is None:
+                with manager.get_session() as session:
+                    manager.has_apoc = setup_entity_infrastructure(session)
+    return manager.has_apoc
+
 def update_entity(manager: Neo4jManager, name: str, aliases: List[str], entity_type: str):
     """
     Update or create an Entity node in the database.
     Uses a case-insensitive match on the entity name (stored in lowercase) and sets the embedding
     based on the normalized (lowercase) name.
     """
-    normalized_name = name.lower()
-    embedding = get_embedding(normalized_name)
-    
-    # First try to setup infrastructure
-    with manager.get_session() as session:
-        has_apoc = setup_entity_infrastructure(session)
+    update_entities(manager, [{"name": name, "aliases": aliases, "entity_type": entity_type}])
+
+def update_entities(manager: Neo4jManager, entities: List[dict], tx: Optional[Transaction] = None) -> None:
+    """
+    Update or create many Entity nodes with batched UNWIND writes in one transaction.
+    Each item needs 'name', 'aliases' and 'entity_type'; names are stored in lowercase and
+    embedded in their normalized form, as in update_entity. An item may carry the
+    'embedding' of its normalized name; the others are embedded in one batched request.
+    Pass an open tx (see Neo4jManager.get_transaction) to commit together with other writes.
+    """
+    if not entities:
+        return
+    missing = [entity["name"].lower() for entity in entities if entity.get("embedding") is None]
+    computed = iter(get_embeddings(missing)) if missing else iter(())
+    rows = []
+    for entity in entities:
+        normalized_name = entity["name"].lower()
+        embedding = entity.get("embedding")
+        if embedding is None:
+            embedding = next(computed)
+        embedding_int8, embedding_scale = quantize_int8(embedding) if embedding else (None, None)
+        rows.append({
+            "name": normalized_name,
+            "aliases": entity["aliases"],
+            "entity_type": entity["entity_type"],
+            "embedding": embedding,
+            "embedding_int8": embedding_int8,
+            "embedding_scale": embedding_scale
+        })
     
-    # Use appropriate query based on APOC availability
-    if has_apoc:
-        query = """
-        MERGE (e:Entity {name: $normalized_name})
-        ON CREATE SET 
-            e.aliases = $aliases, 
-            e.entity_type = $entity_type, 
-            e.embedding = $embedding,
-            e.created_at = timestamp()
-        ON MATCH SET 
-            e.entity_type = $entity_type, 
-            e.embedding = $embedding,
-            e.last_seen_at = timestamp(),
-            e.aliases = apoc.coll.union(e.aliases, $aliases)
-        RETURN e
-        """
-    else:
-        query = """
-        MERGE (e:Entity {name: $normalized_name})
-        ON CREATE SET 
-            e.aliases = $aliases, 
-            e.entity_type = $entity_type, 
-            e.embedding = $embedding,
-            e.created_at = timestamp()
-        ON MATCH SET 
-            e.entity_type = $entity_type, 
-            e.embedding = $embedding,
-            e.last_seen_at = timestamp(),
-            e.aliases = CASE 
-                WHEN e.aliases IS NULL THEN $aliases 
-                ELSE [x IN e.aliases + $aliases WHERE x IS NOT NULL] 
-            END
-        RETURN e
-        """
+    query = UPDATE_ENTITY_APOC_QUERY if _ensure_entity_infrastructure(manager) else UPDATE_ENTITY_FALLBACK_QUERY
     
-    with manager.get_session() as session:
-        session.run(query, 
-                   normalized_name=normalized_name, 
-                   aliases=aliases, 
-                   entity_type=entity_type, 
-                   embedding=embedding)
+    _write_in_batches(manager, query, rows, tx)
+    logger.info("Updated %d entities", len(rows))
 
-def search_similar_entities(manager: Neo4jManager, entity_name: str, threshold: float = 0.95, k: int = 5):
+def search_similar_entities(manager: Neo4jManager, entity_name: str, threshold: float = 0.95, k: int = 5,
+                            query_embedding: Optional[list] = None):
     """
     Search for similar entities using embedding similarity based on the entity name.
-    Retrieves all Entity nodes that have an embedding and returns those with cosine similarity
-    above the threshold.
+    An entity stored under exactly this name is returned on its own with similarity 1.0.
+    Otherwise the entity_embedding vector index is queried for the k nearest entities with
+    cosine similarity above the threshold, scanning every embedded entity if the index is
+    unavailable. Pass query_embedding when the lowercase name has already been embedded.
     """
-    query_embedding = get_embedding(entity_name.lower())
-    query = "MATCH (e:Entity) WHERE e.embedding IS NOT NULL RETURN e"
+    with manager.get_session() as session:
+        record = session.run(FIND_ENTITY_BY_NAME_QUERY, name=entity_name.lower()).single()
+        if record:
+            ent = dict(record["e"])
+            ent["similarity"] = 1.0
+            return [ent]
+        
+        if query_embedding is None:
+            query_embedding = get_embedding(entity_name.lower())
+        try:
+            result = session.run(
+                SEARCH_ENTITY_VECTOR_INDEX_QUERY,
+                k=k,
+                embedding=query_embedding,
+                threshold=threshold
+            )
+            similar_entities = []
+            for record in result:
+                ent = dict(record["e"])
+                ent["similarity"] = record["similarity"]
+                similar_entities.append(ent)
+            return similar_entities
+        except Exception as e:
+            logger.warning("Entity vector index search failed, scanning all entities: %s", str(e))
+    return _scan_similar_entities(manager, query_embedding, threshold, k)
+
+def _scan_similar_entities(manager: Neo4jManager, query_embedding: list, threshold: float, k: int):
+    # Entities with int8 codes leave their float list on the server
+    query = (
+        "MATCH (e:Entity) WHERE e.embedding IS NOT NULL "
+        "RETURN e {.*, embedding: CASE WHEN e.embedding_int8 IS NULL THEN e.embedding END} AS e"
+    )
     with manager.get_session() as session:
         result = session.run(query)
-        nodes = [record["e"] for record in result]
+        nodes = [dict(record["e"]) for record in result]
+    if not nodes:
+        return []
+
+    # Score every entity with one matrix-vector product, then order only the
+    # candidates above the threshold. Cosine similarity ignores the int8 scale.
+    matrix, rows = embedding_matrix(nodes)
+    candidates, sims = nearest_rows(query_embedding, matrix, k, threshold)
 
     similar_entities = []
-    for node in nodes:
-        # Convert node to dictionary for mutation
-        ent = dict(node)
-        emb = ent.get("embedding")
-        if emb:
-            sim = cosine_similarity(query_embedding, emb)
-            if sim >= threshold:
-                ent["similarity"] = sim
-                similar_entities.append(ent)
+    for i, sim in zip(candidates, sims):
+        ent = nodes[rows[i]]
+        codes = ent.pop("embedding_int8", None)
+        scale = ent.pop("embedding_scale", None)
+        if codes:
+            ent["embedding"] = dequantize_int8(codes, scale or 1.0).tolist()
+        ent["similarity"] = float(sim)
+        similar_entities.append(ent)
+    return similar_entities
 
-    similar_entities.sort(key=lambda x: x["similarity"], reverse=True)
-    return similar_entities[:k]
+def store_relationships(manager: Neo4jManager, relationships: List[RelationshipSchema],
+                        tx: Optional[Transaction] = None) -> None:
+    """Stores multiple relationships in the database with a single batched write.
+    Pass an open tx (see Neo4jManager.get_transaction) to commit together with other writes.
+    """
+    if not relationships:
+        return
+    rows = [
+        {
+            "subject": rel.subject.lower(),
+            "object": rel.object.lower(),
+            "predicate": rel.predicate,
+            "confidence": rel.confidence
+        }
+        for rel in relationships
+    ]
+    _write_in_batches(manager, MERGE_RELATIONSHIPS_QUERY, rows, tx)
+    logger.info("Stored %d relationships", len(rows))
 
-def store_relationship(manager: Neo4jManager, relationship: RelationshipSchema) -> None:
-    """Creates or updates a relationship between two entities in the database."""
-    session = manager.get_session()
-    try:
-        result = session.run(
-            MERGE_RELATIONSHIP_QUERY,
-            subject=relationship.subject,
-            object=relationship.object,
-            predicate=relationship.predicate,
-            confidence=relationship.confidence
-        )
-        record = result.single()
-        logger.info("Relationship stored: %s -[%s]-> %s", 
-                   relationship.subject, relationship.predicate, relationship.object)
-        return record
-    finally:
-        session.close()
-
-def store_relationships(manager: Neo4jManager, relationships: List[RelationshipSchema]) -> None:
-    """Store inferred relationships between entities in the graph database.
-    For each relationship, match the two entities by name and create a relationship edge with the given predicate and confidence.
+def _chunk(rows: List[dict], size: int) -> Iterator[List[dict]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def _write_batch(tx, query: str, rows: List[dict]) -> None:
+    tx.run(query, rows=rows).consume()
+
+def _write_in_batches(manager: Neo4jManager, query: str, rows: List[dict], tx: Optional[Transaction] = None) -> None:
+    """Run an UNWIND statement over rows in WRITE_BATCH_SIZE chunks.
+    Within a caller's tx every chunk joins it; otherwise each chunk commits in its own
+    execute_write, which the driver retries on transient errors such as deadlocks.
     """
-    query = (
-        "UNWIND $relationships AS rel "
-        "MATCH (a:Entity {name: rel.subject}), (b:Entity {name: rel.object}) "
-        "MERGE (a)-[r:RELATIONSHIP {predicate: rel.predicate}]->(b) "
-        "SET r.confidence = rel.confidence"
-    )
+    if tx is not None:
+        for batch in _chunk(rows, WRITE_BATCH_SIZE):
+            _write_batch(tx, query, batch)
+        return
     with manager.get_session() as session:
-        session.run(query, relationships=[rel.dict() for rel in relationships])
-
-def store_relationships(manager: Neo4jManager, relationships: List[RelationshipSchema]) -> None:
-    """Stores multiple relationships in the database."""
-    for relationship in relationships:
-        store_relationship(manager, relationship) 
\ No newline at end of file
+        for batch in _chunk(rows, WRITE_BATCH_SIZE):
+            session.execute_write(_write_batch, query, batch)
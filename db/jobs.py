@@ -0,0 +1,57 @@
+"""
+Database operations for tracking background ingestion jobs.
+"""
+import logging
+from typing import Dict, Optional
+from db.db_manager import Neo4jManager
+
+logger = logging.getLogger(__name__)
+
+def create_job(db_manager: Neo4jManager, job_id: str, kind: str) -> None:
+    """Create an IngestJob node in the queued state."""
+    query = "CREATE (j:IngestJob {id: $job_id, kind: $kind, status: 'queued', created_at: timestamp()})"
+    with db_manager.get_session() as session:
+        session.run(query, job_id=job_id, kind=kind).consume()
+        logger.info("Queued %s job %s", kind, job_id)
+
+
+def update_job(db_manager: Neo4jManager, job_id: str, status: str, result: Optional[str] = None) -> None:
+    """Set the status and, once finished, the result text of an IngestJob node."""
+    query = (
+        "MATCH (j:IngestJob {id: $job_id}) "
+        "SET j.status = $status, j.result = $result, j.updated_at = timestamp()"
+    )
+    with db_manager.get_session() as session:
+        session.run(query, job_id=job_id, status=status, result=result).consume()
+        logger.info("Job %s is %s", job_id, status)
+
+
+def fail_stale_jobs(db_manager: Neo4jManager, timeout: int, job_id: Optional[str] = None) -> int:
+    """
+    Mark queued or running IngestJob nodes not updated for timeout seconds as failed.
+    Restricted to one job when job_id is given. Returns the number of jobs marked.
+    """
+    query = (
+        "MATCH (j:IngestJob) "
+        "WHERE ($job_id IS NULL OR j.id = $job_id) AND j.status IN ['queued', 'running'] "
+        "AND coalesce(j.updated_at, j.created_at) < timestamp() - $timeout_ms "
+        "SET j.status = 'failed', j.result = 'Error: job was interrupted before it finished', "
+        "j.updated_at = timestamp() "
+        "RETURN count(j) AS count"
+    )
+    with db_manager.get_session() as session:
+        count = session.run(query, job_id=job_id, timeout_ms=timeout * 1000).single()["count"]
+        if count:
+            logger.warning("Marked %d interrupted job(s) as failed", count)
+        return count
+
+
+def get_job(db_manager: Neo4jManager, job_id: str) -> Optional[Dict]:
+    """Return the status and result of an IngestJob node, or None if it does not exist."""
+    query = (
+        "MATCH (j:IngestJob {id: $job_id}) "
+        "RETURN j.id AS id, j.kind AS kind, j.status AS status, j.result AS result"
+    )
+    with db_manager.get_session() as session:
+        record = session.run(query, job_id=job_id).single()
+        return dict(record) if record else None
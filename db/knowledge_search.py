@@ -2,15 +2,64 @@ import logging
 import numpy as np
 from neo4j import Session
 from typing import List, Dict, Optional
+from db.db_manager import Neo4jManager
+from db import entities, memories, vector_index
+from db.vector_utils import EMBEDDING_DIMENSIONS, stream_top_k, top_k_indices
 
 logger = logging.getLogger(__name__)
 
-def cosine_similarity(vec1, vec2):
-    """Compute cosine similarity between two vectors."""
-    dot_product = np.dot(vec1, vec2)
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
-    return dot_product / (norm1 * norm2) if norm1 and norm2 else 0
+# Native vector indexes covering the embedded node labels
+VECTOR_INDEXES = {
+    "Entity": "entity_embedding",
+    "Memory": "memoryIndex",
+    "Document": "Document_embedding_vector_index"
+}
+
+VECTOR_INDEX_QUERY = """
+CALL db.index.vector.queryNodes($index_name, $k, $embedding)
+YIELD node AS n, score
+WITH n, 2 * score - 1 AS similarity
+WHERE similarity >= $min_score
+RETURN n {.*, embedding: null, embedding_int8: null} AS n, labels(n) AS types, similarity
+"""
+
+# Stored vectors are never returned; a 3072-dim embedding would dominate
+# the size of every result
+_VECTOR_FIELDS = frozenset(("embedding", "embedding_int8", "embedding_scale"))
+
+HYDRATE_NODES_QUERY = """
+UNWIND $node_ids AS node_id
+MATCH (n) WHERE elementId(n) = node_id
+RETURN node_id, n {.*, embedding: null, embedding_int8: null} AS n, labels(n) AS types
+"""
+
+def setup_search_indexes(db_manager: Neo4jManager) -> None:
+    """
+    Create the vector index of every label in VECTOR_INDEXES. A label whose
+    index cannot be created is still searched, through the full scan.
+    """
+    try:
+        entities._ensure_entity_infrastructure(db_manager)
+    except Exception as e:
+        logger.warning("Could not create the Entity vector index: %s", str(e))
+    try:
+        with db_manager.get_session() as session:
+            memories.create_vector_index(session, EMBEDDING_DIMENSIONS)
+    except Exception as e:
+        logger.warning("Could not create the Memory vector index: %s", str(e))
+    try:
+        vector_index.create_vector_index(
+            db_manager.driver,
+            label="Document",
+            property="embedding",
+            dimensions=EMBEDDING_DIMENSIONS
+        )
+    except Exception as e:
+        logger.warning("Could not create the Document vector index: %s", str(e))
+
+def _node_data(node) -> Dict:
+    """Copy node properties, dropping the stored vector fields."""
+    return {key: value for key, value in node.items() if key not in _VECTOR_FIELDS}
 
 def search_knowledge(
     session: Session,
@@ -21,6 +70,9 @@ def search_knowledge(
 ) -> List[Dict]:
     """
     Search for nodes with embeddings, optionally filtered by type.
+
+    Labels with a native vector index are searched through it; if an index
+    is missing or the server cannot query it, the full scan is used instead.
     
     Args:
         session: Neo4j session
@@ -32,44 +84,91 @@ def search_knowledge(
     Returns:
         List of dictionaries containing node data and similarity scores
     """
-    # Construct query based on whether a specific node type is requested
     if node_type and node_type.lower() != "all":
-        query = f"""
-        MATCH (n:{node_type})
-        WHERE n.embedding IS NOT NULL
-        RETURN n
-        """
+        labels = [node_type]
     else:
-        query = """
-        MATCH (n)
-        WHERE n.embedding IS NOT NULL
-        RETURN n, labels(n) as types
-        """
-    
-    result = session.run(query)
-    nodes = [record for record in result]
-    
-    # Compute similarities and sort
+        labels = list(VECTOR_INDEXES)
+    if all(label in VECTOR_INDEXES for label in labels):
+        try:
+            return _search_vector_indexes(session, query_embedding, labels, k, min_score, include_types=len(labels) > 1)
+        except Exception as e:
+            logger.warning("Vector index search failed, falling back to a full scan: %s", str(e))
+    return _scan_knowledge(session, query_embedding, node_type, k, min_score)
+
+def _search_vector_indexes(
+    session: Session,
+    query_embedding: list,
+    labels: List[str],
+    k: int,
+    min_score: float,
+    include_types: bool
+) -> List[Dict]:
+    """Query the native vector index of each label and merge the top k."""
     node_scores = []
-    for record in nodes:
-        node = record["n"]
-        if not node.get("embedding"):
-            continue
-            
-        score = cosine_similarity(query_embedding, node["embedding"])
-        if score >= min_score:
-            node_data = dict(node.items())
-            node_data["similarity"] = score
-            
-            # Include node type(s) if available
-            if "types" in record:
+    for label in labels:
+        # Neo4j reports cosine scores as (1 + cos) / 2; the query converts
+        # them back so min_score keeps its meaning
+        result = session.run(
+            VECTOR_INDEX_QUERY,
+            index_name=VECTOR_INDEXES[label],
+            k=k,
+            embedding=query_embedding,
+            min_score=min_score
+        )
+        for record in result:
+            node_data = _node_data(record["n"])
+            node_data["similarity"] = record["similarity"]
+            if include_types:
                 node_data["types"] = record["types"]
-            
             node_scores.append(node_data)
+    scores = np.fromiter((n["similarity"] for n in node_scores), dtype=np.float64, count=len(node_scores))
+    top = top_k_indices(scores, k)
+    return [node_scores[i] for i in top]
+
+def _scan_knowledge(
+    session: Session,
+    query_embedding: list,
+    node_type: Optional[str],
+    k: int,
+    min_score: float
+) -> List[Dict]:
+    """Score every node with an embedding against the query."""
+    # The first pass reads only ids and vectors, preferring the int8 codes
+    # over the float list; the other properties are fetched for the top k only
+    label = f":{node_type}" if node_type and node_type.lower() != "all" else ""
+    query = f"""
+    MATCH (n{label})
+    WHERE n.embedding IS NOT NULL
+    RETURN elementId(n) AS node_id, n.embedding_int8 AS embedding_int8,
+           CASE WHEN n.embedding_int8 IS NULL THEN n.embedding END AS embedding
+    """
     
-    # Sort by similarity score and return top k
-    node_scores.sort(key=lambda x: x["similarity"], reverse=True)
-    return node_scores[:k]
+    # Score the streamed records block by block, keeping only the running
+    # top k above the threshold
+    top = stream_top_k(query_embedding, session.run(query), k, min_score)
+    if not top:
+        return []
+    node_ids = [record["node_id"] for record, _ in top]
+    scores = [score for _, score in top]
+    nodes = {
+        record["node_id"]: record
+        for record in session.run(HYDRATE_NODES_QUERY, node_ids=node_ids)
+    }
+    
+    node_scores = []
+    for node_id, score in zip(node_ids, scores):
+        record = nodes.get(node_id)
+        if record is None:  # deleted between the two queries
+            continue
+        node_data = _node_data(record["n"])
+        node_data["similarity"] = float(score)
+        
+        # Include node types when searching across labels
+        if not label:
+            node_data["types"] = record["types"]
+        
+        node_scores.append(node_data)
+    return node_scores
 
 def get_searchable_types(session: Session) -> List[str]:
     """
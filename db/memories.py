@@ -29,8 +29,10 @@ def create_memory(session: Session, content: str, confidence: float):
         return None
     return record["m"]
 
-# Optional: Create a Memory node with vector embedding
-from db.vector_utils import get_embedding
+# Optional: Create a Memory node with vector embedding. Embeddings from
+# get_embedding are unit length, so stored vectors are normalized on write.
+from db.vector_utils import EMBEDDING_DIMENSIONS, get_embedding, get_embeddings, quantize_int8, stream_top_k
+from db.vector_index import drop_vector_index_if_dimensions_differ
 
 CREATE_MEMORY_EMBEDDING_QUERY = """
 CREATE (m:Memory {
@@ -38,6 +40,8 @@ CREATE (m:Memory {
   content: $content,
   confidence: $confidence,
   embedding: $embedding,
+  embedding_int8: $embedding_int8,
+  embedding_scale: $embedding_scale,
   created_at: timestamp()
 })
 RETURN m
@@ -46,11 +50,14 @@ RETURN m
 def create_memory_with_embedding(session: Session, content: str, confidence: float):
     """Creates a new Memory node with an embedding in the database."""
     embedding = get_embedding(content)
+    codes, scale = quantize_int8(embedding)
     result = session.run(
         CREATE_MEMORY_EMBEDDING_QUERY,
         content=content,
         confidence=confidence,
-        embedding=embedding
+        embedding=embedding,
+        embedding_int8=codes,
+        embedding_scale=scale
     )
     record = result.single()
     if not record:
@@ -59,71 +66,182 @@ def create_memory_with_embedding(session: Session, content: str, confidence: flo
 
 # Add vector similarity search for Memory nodes
 
-def create_vector_index(session: Session):
-    """Creates a vector index on Memory nodes' embedding property."""
+def create_vector_index(session: Session, dimensions: int = EMBEDDING_DIMENSIONS):
+    """Creates a vector index on Memory nodes' embedding property.
+    An existing index built for a different number of dimensions is dropped and recreated.
+    """
     try:
-        query = """
+        query = f"""
         CREATE VECTOR INDEX memoryIndex IF NOT EXISTS
         FOR (m:Memory)
         ON (m.embedding)
-        OPTIONS {
-            indexConfig: {
-                `vector.dimensions`: 3072,
+        OPTIONS {{
+            indexConfig: {{
+                `vector.dimensions`: {int(dimensions)},
                 `vector.similarity_function`: 'cosine'
-            }
-        }
+            }}
+        }}
         """
+        drop_vector_index_if_dimensions_differ(session, "memoryIndex", dimensions)
         session.run(query)
         logger.info("Vector index created or already exists")
     except Exception as e:
         logger.error(f"Failed to create vector index: {str(e)}")
         raise
 
-def cosine_similarity(vec1, vec2):
-    """Compute cosine similarity between two vectors."""
-    dot_product = np.dot(vec1, vec2)
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
-    return dot_product / (norm1 * norm2) if norm1 and norm2 else 0
+SEARCH_MEMORY_INDEX_QUERY = """
+CALL db.index.vector.queryNodes('memoryIndex', $k, $embedding)
+YIELD node AS m, score
+WITH m, 2 * score - 1 AS similarity
+WHERE similarity >= $min_score
+RETURN m {.*, embedding: null, embedding_int8: null} AS m, similarity
+"""
+
+# Stored vectors are never returned; a 3072-dim embedding would dominate
+# the size of every result
+_VECTOR_FIELDS = frozenset(("embedding", "embedding_int8", "embedding_scale"))
+
+def _memory_data(memory) -> dict:
+    """Copy memory properties, dropping the stored vector fields."""
+    return {key: value for key, value in memory.items() if key not in _VECTOR_FIELDS}
 
 def search_memories(session: Session, query_embedding: list, k: int = 10, min_score: float = 0.5):
     """Search Memory nodes using vector similarity.
-    Fetches all Memory nodes with embeddings and computes similarity scores in Python.
+    Queries the memoryIndex vector index, falling back to scoring every
+    Memory node in Python when the index cannot be used.
     """
-    # First, fetch all Memory nodes with embeddings
+    try:
+        # Neo4j reports cosine scores as (1 + cos) / 2; the query converts
+        # them back so min_score keeps its meaning
+        result = session.run(
+            SEARCH_MEMORY_INDEX_QUERY,
+            embedding=query_embedding,
+            k=k,
+            min_score=min_score
+        )
+        memory_scores = []
+        for record in result:
+            memory_data = _memory_data(record["m"])
+            memory_data["similarity"] = record["similarity"]
+            memory_scores.append(memory_data)
+        return memory_scores
+    except Exception as e:
+        logger.warning("Memory vector index search failed, falling back to a full scan: %s", str(e))
+    return _scan_memories(session, query_embedding, k, min_score)
+
+HYDRATE_MEMORIES_QUERY = """
+UNWIND $node_ids AS node_id
+MATCH (m:Memory) WHERE elementId(m) = node_id
+RETURN node_id, m {.*, embedding: null, embedding_int8: null} AS m
+"""
+
+def _scan_memories(session: Session, query_embedding: list, k: int, min_score: float):
+    """Score every Memory node with an embedding against the query."""
+    # The first pass reads only ids and vectors, preferring the int8 codes
+    # (a quarter of the float32 size); the other properties are fetched for
+    # the top k only
     query = """
     MATCH (m:Memory)
-    WHERE exists(m.embedding)
-    RETURN m
+    WHERE m.embedding IS NOT NULL
+    RETURN elementId(m) AS node_id, m.embedding_int8 AS embedding_int8,
+           CASE WHEN m.embedding_int8 IS NULL THEN m.embedding END AS embedding
     """
-    result = session.run(query)
-    memories = [record["m"] for record in result]
+    # Score the streamed records block by block, keeping only the running
+    # top k above the threshold
+    top = stream_top_k(query_embedding, session.run(query), k, min_score)
+    if not top:
+        return []
+    node_ids = [record["node_id"] for record, _ in top]
+    scores = [score for _, score in top]
+    memories = {
+        record["node_id"]: record["m"]
+        for record in session.run(HYDRATE_MEMORIES_QUERY, node_ids=node_ids)
+    }
     
-    # Compute similarities and sort
     memory_scores = []
-    for memory in memories:
-        if not memory.get("embedding"):
+    for node_id, score in zip(node_ids, scores):
+        if node_id not in memories:  # deleted between the two queries
             continue
-        score = cosine_similarity(query_embedding, memory["embedding"])
-        if score >= min_score:
-            memory_data = dict(memory.items())
-            memory_data["similarity"] = score
-            memory_scores.append(memory_data)
-    
-    # Sort by similarity score and return top k
-    memory_scores.sort(key=lambda x: x["similarity"], reverse=True)
-    return memory_scores[:k]
+        memory_data = _memory_data(memories[node_id])
+        memory_data["similarity"] = float(score)
+        memory_scores.append(memory_data)
+    return memory_scores
 
-def create_document_memory_relationship(db_manager, document_id: str, memory):
-    """Creates a relationship between a Document and a Memory node. If the Memory node does not exist, it is created with an embedding."""
-    from db.vector_utils import get_embedding
+def create_document_memory_relationship(db_manager, document_id: str, memory, embedding: list = None):
+    """Creates a relationship between a Document and a Memory node. If the Memory node does not exist, it is created with an embedding.
+    Pass a precomputed embedding (e.g. from get_embeddings) to skip the per-memory API call.
+    """
     # Compute embedding for the memory content
-    embedding = get_embedding(memory.content)
+    if embedding is None:
+        embedding = get_embedding(memory.content)
+    codes, scale = quantize_int8(embedding) if embedding else (None, None)
     query = """
     MATCH (d:Document {id: $doc_id})
     MERGE (m:Memory {content: $content})
-    ON CREATE SET m.confidence = $confidence, m.sentiment = $sentiment, m.tags = $tags, m.created_at = timestamp(), m.embedding = $embedding
+    ON CREATE SET m.confidence = $confidence, m.sentiment = $sentiment, m.tags = $tags, m.created_at = timestamp(), m.embedding = $embedding,
+                  m.embedding_int8 = $embedding_int8, m.embedding_scale = $embedding_scale
     MERGE (d)-[:HAS_MEMORY]->(m)
     """
     with db_manager.get_session() as session:
-        session.run(query, doc_id=document_id, content=memory.content, confidence=memory.confidence, sentiment=memory.sentiment, tags=memory.tags, embedding=embedding) 
\ No newline at end of file
+        session.run(query, doc_id=document_id, content=memory.content, confidence=memory.confidence, sentiment=memory.sentiment, tags=memory.tags, embedding=embedding,
+                    embedding_int8=codes, embedding_scale=scale)
+
+CREATE_DOCUMENT_MEMORIES_QUERY = """
+UNWIND $documents AS doc
+MATCH (d:Document {id: doc.doc_id})
+UNWIND doc.rows AS row
+MERGE (m:Memory {content: row.content})
+ON CREATE SET m.confidence = row.confidence, m.sentiment = row.sentiment, m.tags = row.tags, m.created_at = timestamp(), m.embedding = row.embedding,
+              m.embedding_int8 = row.embedding_int8, m.embedding_scale = row.embedding_scale
+MERGE (d)-[:HAS_MEMORY]->(m)
+"""
+
+def _tx_create_document_memories(tx, documents: list):
+    return tx.run(CREATE_DOCUMENT_MEMORIES_QUERY, documents=documents).consume()
+
+def create_documents_memory_relationships(db_manager, document_memories: list, tx=None):
+    """Creates the HAS_MEMORY relationships of many Documents in one statement.
+    document_memories holds (document_id, memories, embeddings) tuples; embeddings may be None.
+    Memory nodes that do not exist are created with an embedding; missing embeddings are generated
+    here with one batched request.
+    Pass an open tx (see Neo4jManager.get_transaction) to commit together with other writes.
+    """
+    pending = []
+    for document_id, memories, embeddings in document_memories:
+        if memories:
+            embeddings = list(embeddings) if embeddings is not None else [None] * len(memories)
+            pending.append((document_id, memories, embeddings))
+    if not pending:
+        return
+    missing = [(embeddings, i, memories[i].content)
+               for _, memories, embeddings in pending for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        for (embeddings, i, _), embedding in zip(missing, get_embeddings([content for _, _, content in missing])):
+            embeddings[i] = embedding
+    documents = []
+    for document_id, memories, embeddings in pending:
+        rows = []
+        for memory, embedding in zip(memories, embeddings):
+            codes, scale = quantize_int8(embedding) if embedding else (None, None)
+            rows.append({
+                "content": memory.content,
+                "confidence": memory.confidence,
+                "sentiment": memory.sentiment,
+                "tags": memory.tags,
+                "embedding": embedding,
+                "embedding_int8": codes,
+                "embedding_scale": scale
+            })
+        documents.append({"doc_id": document_id, "rows": rows})
+    if tx is not None:
+        _tx_create_document_memories(tx, documents)
+    else:
+        with db_manager.get_session() as session:
+            session.execute_write(_tx_create_document_memories, documents)
+
+def create_document_memory_relationships(db_manager, document_id: str, memories: list, embeddings: list = None, tx=None):
+    """Creates the HAS_MEMORY relationships from a Document to many memories in one statement.
+    Memory nodes that do not exist are created with an embedding; missing entries in embeddings are generated here.
+    Pass an open tx (see Neo4jManager.get_transaction) to commit together with other writes.
+    """
+    create_documents_memory_relationships(db_manager, [(document_id, memories, embeddings)], tx=tx)
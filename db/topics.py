@@ -5,11 +5,71 @@ from models.topic import TopicSchema
 
 logger = logging.getLogger(__name__)
 
+TOPIC_FULLTEXT_INDEX_QUERY = "CREATE FULLTEXT INDEX topicName IF NOT EXISTS FOR (t:Topic) ON EACH [t.name, t.aliases]"
+
+SEARCH_TOPICS_FULLTEXT_QUERY = """
+CALL db.index.fulltext.queryNodes('topicName', $query) YIELD node, score
+RETURN node.name AS name, node.aliases AS aliases
+ORDER BY score DESC
+LIMIT 25
+"""
+
+SEARCH_TOPICS_SCAN_QUERY = "MATCH (t:Topic) WHERE toLower(t.name) CONTAINS toLower($topic_name) RETURN t.name as name, t.aliases as aliases"
+
+# Resolves every extracted topic against the full-text index in one statement:
+# a topic matching an existing one adds its aliases to it, otherwise it is
+# created. Returns the canonical name of each input topic by position.
+RESOLVE_TOPICS_QUERY = """
+UNWIND $topics AS t
+CALL {
+    WITH t
+    WITH t WHERE t.query IS NOT NULL
+    CALL db.index.fulltext.queryNodes('topicName', t.query) YIELD node, score
+    WITH node ORDER BY score DESC LIMIT 1
+    RETURN collect(node) AS matches
+}
+WITH t, head(matches) AS existing
+FOREACH (_ IN CASE WHEN existing IS NOT NULL THEN [1] ELSE [] END |
+    SET existing.aliases = reduce(acc = [], alias IN coalesce(existing.aliases, []) + t.aliases |
+        CASE WHEN alias IN acc THEN acc ELSE acc + alias END)
+)
+FOREACH (_ IN CASE WHEN existing IS NULL THEN [1] ELSE [] END |
+    MERGE (n:Topic {name: t.name}) SET n.aliases = t.aliases
+)
+RETURN t.index AS index, coalesce(existing.name, t.name) AS name
+"""
+
+# Characters with a meaning in Lucene query syntax
+_LUCENE_SPECIAL = set('+-&|!(){}[]^"~*?:\\/')
+
+def setup_topic_infrastructure(db_manager: Neo4jManager) -> None:
+    """Create the full-text index over topic names and aliases used by search_similar_topics."""
+    try:
+        with db_manager.get_session() as session:
+            session.run(TOPIC_FULLTEXT_INDEX_QUERY).consume()
+            logger.info("Topic full-text index created or already exists")
+    except Exception as e:
+        logger.warning("Could not create Topic full-text index: %s", str(e))
+
+def _phrase_query(text: str) -> str:
+    """Quote text as a Lucene phrase, escaping the query syntax characters."""
+    escaped = "".join("\\" + c if c in _LUCENE_SPECIAL else c for c in text)
+    return f'"{escaped}"'
+
 def search_similar_topics(db_manager: Neo4jManager, topic_name: str) -> List[Dict]:
-    """Search for topics similar to the given topic_name using a simple case-insensitive match."""
-    query = "MATCH (t:Topic) WHERE toLower(t.name) CONTAINS toLower($topic_name) RETURN t.name as name, t.aliases as aliases"
+    """Search for topics whose name or aliases contain the given topic_name as a phrase.
+    Uses the topicName full-text index, falling back to a case-insensitive substring scan
+    if the index is unavailable.
+    """
+    if not topic_name.strip():
+        return []
     with db_manager.get_session() as session:
-        result = session.run(query, topic_name=topic_name)
+        try:
+            result = session.run(SEARCH_TOPICS_FULLTEXT_QUERY, query=_phrase_query(topic_name))
+            return [dict(record) for record in result]
+        except Exception as e:
+            logger.warning("Topic full-text search failed, falling back to a scan: %s", str(e))
+        result = session.run(SEARCH_TOPICS_SCAN_QUERY, topic_name=topic_name)
         return [dict(record) for record in result]
 
 
@@ -21,9 +81,85 @@ def update_topic(db_manager: Neo4jManager, name: str, aliases: List[str]) -> Non
         logger.info("Updated topic: %s", name)
 
 
+def _resolve_topics_one_by_one(db_manager: Neo4jManager, topics: List[TopicSchema]) -> List[str]:
+    final_topics = []
+    for topic in topics:
+        similar = search_similar_topics(db_manager, topic.name)
+        if similar:
+            existing_topic = similar[0]
+            merged_aliases = list(set((existing_topic.get('aliases') or []) + topic.aliases))
+            update_topic(db_manager, existing_topic['name'], merged_aliases)
+            final_topics.append(existing_topic['name'])
+        else:
+            final_topics.append(topic.name)
+            update_topic(db_manager, topic.name, topic.aliases)
+    return final_topics
+
+def resolve_topics(db_manager: Neo4jManager, topics: List[TopicSchema]) -> List[str]:
+    """
+    Merge extracted topics into the graph and return their canonical names, in order.
+
+    A topic whose name matches an existing topic's name or aliases adds its
+    aliases to that topic and takes its name; other topics are created. All
+    topics are resolved in a single write transaction, falling back to one
+    lookup and one write per topic if the full-text index is unavailable.
+    """
+    if not topics:
+        return []
+    rows = [
+        {
+            "index": i,
+            "name": topic.name,
+            "aliases": list(topic.aliases),
+            "query": _phrase_query(topic.name) if topic.name.strip() else None
+        }
+        for i, topic in enumerate(topics)
+    ]
+    try:
+        with db_manager.get_session() as session:
+            records = session.execute_write(lambda tx: list(tx.run(RESOLVE_TOPICS_QUERY, topics=rows)))
+    except Exception as e:
+        logger.warning("Batched topic resolution failed, resolving one by one: %s", str(e))
+        return _resolve_topics_one_by_one(db_manager, topics)
+    final_topics = [None] * len(topics)
+    for record in records:
+        final_topics[record["index"]] = record["name"]
+    logger.info("Resolved %d topics", len(topics))
+    return final_topics
+
 def create_document_topic_relationship(db_manager: Neo4jManager, document_id: str, topic_name: str) -> None:
     """Create a relationship between a Document node and a Topic node."""
     query = "MATCH (d:Document {id: $document_id}) MERGE (t:Topic {name: $topic_name}) MERGE (d)-[:HAS_TOPIC]->(t)"
     with db_manager.get_session() as session:
         session.run(query, document_id=document_id, topic_name=topic_name)
-        logger.info("Created relationship between document %s and topic %s", document_id, topic_name) 
\ No newline at end of file
+        logger.info("Created relationship between document %s and topic %s", document_id, topic_name)
+
+CREATE_DOCUMENTS_TOPICS_QUERY = """
+UNWIND $rows AS row
+MATCH (d:Document {id: row.document_id})
+UNWIND row.topic_names AS topic_name
+MERGE (t:Topic {name: topic_name})
+MERGE (d)-[:HAS_TOPIC]->(t)
+"""
+
+def create_documents_topic_relationships(db_manager: Neo4jManager, topic_names_by_document: Dict[str, List[str]],
+                                         tx=None) -> None:
+    """Create the HAS_TOPIC relationships of many Document nodes in one statement.
+    Pass an open tx (see Neo4jManager.get_transaction) to commit together with other writes.
+    """
+    rows = [
+        {"document_id": document_id, "topic_names": list(dict.fromkeys(topic_names))}
+        for document_id, topic_names in topic_names_by_document.items() if topic_names
+    ]
+    if not rows:
+        return
+    if tx is not None:
+        tx.run(CREATE_DOCUMENTS_TOPICS_QUERY, rows=rows).consume()
+    else:
+        with db_manager.get_session() as session:
+            session.execute_write(lambda tx: tx.run(CREATE_DOCUMENTS_TOPICS_QUERY, rows=rows).consume())
+    logger.info("Created topic relationships for %d documents", len(rows))
+
+def create_document_topic_relationships(db_manager: Neo4jManager, document_id: str, topic_names: List[str]) -> None:
+    """Create the HAS_TOPIC relationships from a Document node to many Topic nodes in one statement."""
+    create_documents_topic_relationships(db_manager, {document_id: topic_names})
@@ -1,9 +1,40 @@
 import logging
 from typing import List, Dict, Any
+from db.vector_utils import quantize_int8
 
 logger = logging.getLogger(__name__)
 
 
+def drop_vector_index_if_dimensions_differ(session, index_name: str, dimensions: int) -> bool:
+    """
+    Drop a vector index whose configured dimensions differ from the expected ones.
+
+    CREATE VECTOR INDEX ... IF NOT EXISTS keeps an existing index as is, so
+    after switching embedding models the old index would silently stay in
+    place with the wrong size.
+
+    Args:
+        session: Neo4j session.
+        index_name (str): Name of the vector index.
+        dimensions (int): The dimensionality the index should have.
+
+    Returns:
+        bool: True if an index was dropped and needs to be recreated.
+    """
+    record = session.run(
+        "SHOW INDEXES YIELD name, type, options WHERE name = $name AND type = 'VECTOR' RETURN options",
+        name=index_name
+    ).single()
+    if record is None:
+        return False
+    current = (record["options"] or {}).get("indexConfig", {}).get("vector.dimensions")
+    if current is None or int(current) == dimensions:
+        return False
+    logger.warning("Vector index %s has %s dimensions instead of %d; recreating it", index_name, current, dimensions)
+    session.run(f"DROP INDEX {index_name} IF EXISTS").consume()
+    return True
+
+
 def create_vector_index(driver, label: str, property: str, dimensions: int, similarity: str = "COSINE") -> None:
     """
     Create a vector index on nodes with the given label and property using Neo4j's native vector indexing.
@@ -17,11 +48,13 @@ def create_vector_index(driver, label: str, property: str, dimensions: int, simi
     """
     index_name = f"{label}_{property}_vector_index"
     query = (
-        f"CREATE INDEX {index_name} IF NOT EXISTS FOR (n:{label}) ON (n.{property}) "
-        f"OPTIONS {{ indexProvider: 'native-vector', vectorDimensions: {dimensions}, similarity: '{similarity}' }}"
+        f"CREATE VECTOR INDEX {index_name} IF NOT EXISTS FOR (n:{label}) ON (n.{property}) "
+        f"OPTIONS {{ indexConfig: {{ `vector.dimensions`: {dimensions}, "
+        f"`vector.similarity_function`: '{similarity.lower()}' }} }}"
     )
     try:
         with driver.session() as session:
+            drop_vector_index_if_dimensions_differ(session, index_name, dimensions)
             session.run(query)
             logger.info("Created vector index: %s", index_name)
     except Exception as e:
@@ -43,19 +76,71 @@ def find_nearest_nodes(driver, embedding: list, label: str, property: str, limit
     Returns:
         List[Dict[str, Any]]: A list of dictionaries containing node and similarity score.
     """
+    # The index returns nodes already ordered by score, so only the top
+    # matches are read instead of every node with the label. Neo4j reports
+    # cosine scores as (1 + cos) / 2; they are converted back to the plain
+    # cosine the old gds.alpha.similarity.cosine call returned.
     query = (
-        f"MATCH (n:{label}) "
-        f"RETURN n, gds.alpha.similarity.cosine(n.{property}, $embedding) AS similarity "
-        f"ORDER BY similarity DESC "
-        f"LIMIT $limit"
+        "CALL db.index.vector.queryNodes($index_name, $limit, $embedding) "
+        "YIELD node AS n, score "
+        "RETURN n, 2 * score - 1 AS similarity"
     )
     try:
         with driver.session() as session:
-            result = session.run(query, embedding=embedding, limit=limit)
+            result = session.run(
+                query,
+                index_name=f"{label}_{property}_vector_index",
+                embedding=embedding,
+                limit=limit
+            )
             nodes = []
             for record in result:
                 nodes.append({"node": record["n"], "similarity": record["similarity"]})
             return nodes
     except Exception as e:
         logger.error("Error finding nearest nodes: %s", str(e))
-        raise 
\ No newline at end of file
+        raise 
+
+def backfill_int8_codes(driver, label: str, batch_size: int = 500) -> int:
+    """
+    Add int8 codes (embedding_int8, embedding_scale) to nodes that only have a float embedding.
+
+    Similarity scans read the codes as one byte array per node instead of a
+    list of boxed Python floats, so nodes written before the codes existed
+    should be backfilled once.
+
+    Args:
+        driver: Neo4j driver instance.
+        label (str): The node label to backfill (e.g., 'Entity', 'Document' or 'Memory').
+        batch_size (int): Number of nodes read and updated per transaction.
+
+    Returns:
+        int: The number of nodes updated.
+    """
+    read_query = (
+        f"MATCH (n:{label}) WHERE n.embedding IS NOT NULL AND n.embedding_int8 IS NULL "
+        f"RETURN elementId(n) AS id, n.embedding AS embedding LIMIT $batch_size"
+    )
+    write_query = (
+        "UNWIND $rows AS row "
+        "MATCH (n) WHERE elementId(n) = row.id "
+        "SET n.embedding_int8 = row.codes, n.embedding_scale = row.scale"
+    )
+    updated = 0
+    try:
+        with driver.session() as session:
+            while True:
+                records = list(session.run(read_query, batch_size=batch_size))
+                if not records:
+                    break
+                rows = []
+                for record in records:
+                    codes, scale = quantize_int8(record["embedding"])
+                    rows.append({"id": record["id"], "codes": codes, "scale": scale})
+                session.execute_write(lambda tx: tx.run(write_query, rows=rows).consume())
+                updated += len(rows)
+                logger.info("Backfilled int8 codes for %d %s nodes", updated, label)
+        return updated
+    except Exception as e:
+        logger.error("Error backfilling int8 codes: %s", str(e))
+        raise
@@ -1,11 +1,63 @@
+import base64
 import logging
+import os
+import threading
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Mapping, Optional, Tuple
+import numpy as np
+from cachetools import LRUCache
 from openai import OpenAI
 
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional (pip install knowledge_nexus[fast])
+    njit = None
+
 logger = logging.getLogger(__name__)
 client = OpenAI()
 
+# Model used for every stored embedding
+EMBEDDING_MODEL = "text-embedding-3-large"
+# Largest number of inputs the embeddings endpoint accepts in one request
+EMBEDDING_BATCH_SIZE = 2048
+# Length of the vectors requested from the embedding model (3072, the native
+# size of text-embedding-3-large, unless shortened); the vector indexes are
+# created with it
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "3072"))
+
+# Recently generated embeddings keyed by (model, dimensions, cleaned text). Vectors are
+# kept as float32 arrays (12 KiB for text-embedding-3-large) and handed out
+# as fresh lists, so callers can never mutate a cached entry.
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+_embedding_cache = LRUCache(maxsize=EMBEDDING_CACHE_SIZE)
+_embedding_cache_lock = threading.Lock()
+
+
+def _normalize(embedding) -> np.ndarray:
+    """Return the embedding as a unit-length float32 array.
+    Accepts the base64 string of packed little-endian float32 values the API returns
+    for encoding_format="base64", or a list of floats.
+    """
+    if isinstance(embedding, str):
+        v = np.frombuffer(base64.b64decode(embedding), dtype="<f4").astype(np.float32)
+    else:
+        v = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    if norm:
+        v /= norm
+    return v
+
+# Rows decoded and scored at a time by stream_top_k
+SCAN_BLOCK_ROWS = 4096
+# Brute-force scans over more rows than this are split across threads; BLAS
+# releases the GIL, but below ~1000 rows the hand-off costs more than it saves
+PARALLEL_SCAN_MIN_ROWS = 1000
+_scan_executor = None
+_scan_executor_lock = threading.Lock()
+
 
-def get_embedding(text: str, model: str = "text-embedding-3-large") -> list:
+def get_embedding(text: str, model: str = EMBEDDING_MODEL) -> list:
     """
     Generate the vector embedding for given text using the specified OpenAI embedding model.
     
@@ -14,7 +66,7 @@ def get_embedding(text: str, model: str = "text-embedding-3-large") -> list:
         model (str): The embedding model to use.
     
     Returns:
-        list: A list of floating point numbers representing the vector embedding.
+        list: The unit-length (L2-normalized) vector embedding.
     """
     # Clean and prepare the text
     cleaned_text = text.replace("\n", " ").strip()
@@ -22,16 +74,335 @@ def get_embedding(text: str, model: str = "text-embedding-3-large") -> list:
         logger.warning("Empty text provided for embedding generation")
         return None
         
+    key = (model, EMBEDDING_DIMENSIONS, cleaned_text)
+    with _embedding_cache_lock:
+        cached = _embedding_cache.get(key)
+    if cached is not None:
+        return cached.tolist()
+        
     try:
-        # The OpenAI API expects the input parameter to be a string
+        # The OpenAI API expects the input parameter to be a string. base64
+        # halves the response size and decodes straight to packed float32
+        # instead of parsing thousands of JSON floats.
         response = client.embeddings.create(
             model=model,
             input=cleaned_text,
-            encoding_format="float"
+            dimensions=EMBEDDING_DIMENSIONS,
+            encoding_format="base64"
         )
-        embedding = response.data[0].embedding
+        embedding = _normalize(response.data[0].embedding)
         logger.info("Generated embedding for text: %s...", cleaned_text[:50])
-        return embedding
+        with _embedding_cache_lock:
+            _embedding_cache[key] = embedding
+        return embedding.tolist()
     except Exception as e:
         logger.error("Failed to generate embedding: %s", str(e))
-        raise 
\ No newline at end of file
+        raise 
+
+
+def get_embeddings(texts: List[str], model: str = EMBEDDING_MODEL) -> List[Optional[list]]:
+    """
+    Generate embeddings for many texts with as few API requests as possible.
+    
+    Args:
+        texts (List[str]): The input texts.
+        model (str): The embedding model to use.
+    
+    Returns:
+        List[Optional[list]]: One unit-length embedding per input text, in order; None for empty texts.
+    """
+    cleaned_texts = [text.replace("\n", " ").strip() for text in texts]
+    embeddings: List[Optional[list]] = [None] * len(texts)
+    non_empty = [i for i, text in enumerate(cleaned_texts) if text]
+    if len(non_empty) < len(texts):
+        logger.warning("Skipping %d empty texts in embedding batch", len(texts) - len(non_empty))
+    
+    # Serve cached texts directly and request each remaining text only once
+    pending = {}
+    with _embedding_cache_lock:
+        for i in non_empty:
+            cached = _embedding_cache.get((model, EMBEDDING_DIMENSIONS, cleaned_texts[i]))
+            if cached is not None:
+                embeddings[i] = cached.tolist()
+            else:
+                pending.setdefault(cleaned_texts[i], []).append(i)
+    unique_texts = list(pending)
+    
+    try:
+        for start in range(0, len(unique_texts), EMBEDDING_BATCH_SIZE):
+            chunk = unique_texts[start:start + EMBEDDING_BATCH_SIZE]
+            response = client.embeddings.create(
+                model=model,
+                input=chunk,
+                dimensions=EMBEDDING_DIMENSIONS,
+                encoding_format="base64"
+            )
+            for item in response.data:
+                text = chunk[item.index]
+                vector = _normalize(item.embedding)
+                with _embedding_cache_lock:
+                    _embedding_cache[(model, EMBEDDING_DIMENSIONS, text)] = vector
+                for i in pending[text]:
+                    embeddings[i] = vector.tolist()
+        logger.info("Generated %d embeddings in %d requests (%d cached)", len(unique_texts),
+                    -(-len(unique_texts) // EMBEDDING_BATCH_SIZE), len(non_empty) - sum(map(len, pending.values())))
+        return embeddings
+    except Exception as e:
+        logger.error("Failed to generate embeddings: %s", str(e))
+        raise
+
+
+def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
+    """
+    Compute the cosine similarity between two vectors.
+
+    Both squared norms come from vdot and share a single sqrt, which skips
+    the dispatch and validation np.linalg.norm does on every call. Callers
+    should convert lists to float32 arrays once, not per comparison.
+
+    Args:
+        vec1: The first vector.
+        vec2: The second vector.
+
+    Returns:
+        float: The similarity score (0 if either vector is all zeros).
+    """
+    denom = np.sqrt(np.vdot(vec1, vec1) * np.vdot(vec2, vec2))
+    return float(np.dot(vec1, vec2) / denom) if denom else 0.0
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cosine_rows(matrix, query):
+        """Cosine similarity of each matrix row with query, one fused pass per row."""
+        q_sq = np.float32(0.0)
+        for j in range(query.shape[0]):
+            q_sq += query[j] * query[j]
+        q_norm = np.sqrt(q_sq)
+        scores = np.zeros(matrix.shape[0], dtype=np.float32)
+        for i in prange(matrix.shape[0]):
+            dot = np.float32(0.0)
+            sq = np.float32(0.0)
+            for j in range(matrix.shape[1]):
+                dot += matrix[i, j] * query[j]
+                sq += matrix[i, j] * matrix[i, j]
+            denom = np.sqrt(sq) * q_norm
+            if denom > 0:
+                scores[i] = dot / denom
+        return scores
+else:
+    _cosine_rows = None
+
+
+def cosine_similarities(query, matrix) -> np.ndarray:
+    """
+    Compute the cosine similarity between one vector and every row of a matrix.
+
+    The whole batch is scored with a single float32 matrix-vector product so
+    the work runs in BLAS instead of a Python loop, or with a parallel JIT
+    kernel when numba is installed.
+
+    Args:
+        query: The query vector, shape (D,).
+        matrix: The candidate vectors, shape (N, D).
+
+    Returns:
+        np.ndarray: float32 array of N similarity scores (0 for zero vectors).
+    """
+    q = np.asarray(query, dtype=np.float32)
+    m = np.asarray(matrix, dtype=np.float32)
+    if m.ndim != 2 or m.shape[0] == 0:
+        return np.zeros(0, dtype=np.float32)
+    if _cosine_rows is not None:
+        # Computes the dot product and row norm in the same pass over memory
+        return _cosine_rows(np.ascontiguousarray(m), q)
+    norms = np.linalg.norm(m, axis=1) * np.linalg.norm(q)
+    scores = m @ q
+    return np.divide(scores, norms, out=np.zeros_like(scores), where=norms > 0)
+
+
+def top_k_indices(scores: np.ndarray, k: int, min_score: Optional[float] = None) -> np.ndarray:
+    """
+    Return the indices of the k highest scores, best first.
+
+    argpartition selects the top k in O(N) so only those k are sorted,
+    instead of sorting every score to keep a handful.
+
+    Args:
+        scores: 1-D array of scores.
+        k: Number of indices to return.
+        min_score: Optional threshold; lower scores are never returned.
+
+    Returns:
+        np.ndarray: Up to k indices into scores, ordered by descending score.
+    """
+    scores = np.asarray(scores)
+    candidates = np.arange(scores.size) if min_score is None else np.flatnonzero(scores >= min_score)
+    if k <= 0:
+        return candidates[:0]
+    if candidates.size > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def _get_scan_executor() -> ThreadPoolExecutor:
+    global _scan_executor
+    if _scan_executor is None:
+        with _scan_executor_lock:
+            if _scan_executor is None:
+                _scan_executor = ThreadPoolExecutor(
+                    max_workers=os.cpu_count() or 1,
+                    thread_name_prefix="vector-scan"
+                )
+    return _scan_executor
+
+
+def nearest_rows(query, matrix, k: int, min_score: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the k rows of a matrix most similar to a query vector.
+
+    Large matrices are split row-wise across a thread pool; each worker
+    scores its block and keeps a partial top k, and the partial results are
+    merged into the final top k.
+
+    Args:
+        query: The query vector, shape (D,).
+        matrix: The candidate vectors, shape (N, D).
+        k: Number of rows to return.
+        min_score: Optional threshold; less similar rows are never returned.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Row indices ordered by descending
+        similarity, and their cosine similarity scores.
+    """
+    m = np.asarray(matrix, dtype=np.float32)
+    workers = os.cpu_count() or 1
+    # The numba kernel already spreads rows over its own threads
+    if m.ndim != 2 or m.shape[0] <= PARALLEL_SCAN_MIN_ROWS or workers == 1 or _cosine_rows is not None:
+        scores = cosine_similarities(query, m)
+        top = top_k_indices(scores, k, min_score)
+        return top, scores[top]
+
+    q = np.asarray(query, dtype=np.float32)
+    bounds = np.linspace(0, m.shape[0], min(workers, m.shape[0]) + 1, dtype=int)
+
+    def score_block(start: int, stop: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = cosine_similarities(q, m[start:stop])
+        top = top_k_indices(scores, k, min_score)
+        return top + start, scores[top]
+
+    executor = _get_scan_executor()
+    parts = list(executor.map(score_block, bounds[:-1], bounds[1:]))
+    indices = np.concatenate([part[0] for part in parts])
+    scores = np.concatenate([part[1] for part in parts])
+    top = top_k_indices(scores, k)
+    return indices[top], scores[top]
+
+
+def quantize_int8(vector) -> Tuple[bytes, float]:
+    """
+    Symmetrically quantize a vector to int8 with a per-vector scale.
+
+    The codes take a quarter of the float32 size (an eighth of the float64
+    lists Neo4j stores), and since the scale is a positive per-vector factor,
+    cosine similarity can be computed on the codes directly.
+
+    Args:
+        vector: The embedding vector to quantize.
+
+    Returns:
+        Tuple[bytes, float]: The raw int8 codes and the scale such that
+        vector ~= codes * scale.
+    """
+    v = np.asarray(vector, dtype=np.float32)
+    max_abs = float(np.max(np.abs(v))) if v.size else 0.0
+    scale = max_abs / 127.0 if max_abs else 1.0
+    codes = np.clip(np.round(v / scale), -127, 127).astype(np.int8)
+    return codes.tobytes(), scale
+
+
+def dequantize_int8(codes: bytes, scale: float = 1.0) -> np.ndarray:
+    """
+    Decode int8 codes produced by quantize_int8 back to a float32 vector.
+
+    Args:
+        codes: The raw int8 codes.
+        scale: The per-vector scale; the default of 1.0 is enough for cosine scoring.
+
+    Returns:
+        np.ndarray: The float32 vector.
+    """
+    return np.frombuffer(codes, dtype=np.int8).astype(np.float32) * np.float32(scale)
+
+
+def embedding_matrix(nodes) -> Tuple[np.ndarray, List[int]]:
+    """
+    Decode the stored embeddings of many nodes into one float32 matrix.
+
+    Rows are written straight into a preallocated contiguous array: int8
+    codes are read from their raw bytes without an intermediate float
+    array, and float lists are converted once. Cosine scoring ignores the
+    per-vector int8 scale, so the codes are used as they are.
+
+    Args:
+        nodes: Mappings holding either `embedding_int8` codes or an `embedding` list.
+
+    Returns:
+        Tuple[np.ndarray, List[int]]: The (N, D) matrix and, for each row, the
+        index of the node it came from. Nodes without an embedding, or whose
+        dimension differs from the first one, are skipped.
+    """
+    vectors = []
+    for i, node in enumerate(nodes):
+        codes = node.get("embedding_int8")
+        if codes:
+            vectors.append((i, np.frombuffer(codes, dtype=np.int8)))
+        elif node.get("embedding"):
+            vectors.append((i, node["embedding"]))
+    if not vectors:
+        return np.empty((0, 0), dtype=np.float32), []
+    dim = len(vectors[0][1])
+    vectors = [(i, vector) for i, vector in vectors if len(vector) == dim]
+    matrix = np.empty((len(vectors), dim), dtype=np.float32)
+    for row, (_, vector) in enumerate(vectors):
+        matrix[row] = vector
+    return matrix, [i for i, _ in vectors]
+
+
+def stream_top_k(query, nodes: Iterable[Mapping], k: int, min_score: Optional[float] = None,
+                 block_size: Optional[int] = None) -> List[Tuple[Mapping, float]]:
+    """
+    Find the k nodes most similar to a query while streaming over the nodes.
+
+    Nodes are decoded and scored SCAN_BLOCK_ROWS at a time and only the
+    running top k is kept, so peak memory is one block plus k nodes rather
+    than every node of the scan.
+
+    Args:
+        query: The query vector, shape (D,).
+        nodes: Iterable of mappings as accepted by embedding_matrix, e.g. a Neo4j result.
+        k: Number of nodes to return.
+        min_score: Optional threshold; less similar nodes are never returned.
+        block_size: Rows per block, defaulting to SCAN_BLOCK_ROWS.
+
+    Returns:
+        List[Tuple[Mapping, float]]: (node, similarity) pairs, most similar first.
+    """
+    block_size = block_size or SCAN_BLOCK_ROWS
+    best_nodes: List[Mapping] = []
+    best_scores = np.zeros(0, dtype=np.float32)
+    iterator = iter(nodes)
+    while True:
+        block = list(islice(iterator, block_size))
+        if not block:
+            break
+        matrix, rows = embedding_matrix(block)
+        if not rows:
+            continue
+        top, scores = nearest_rows(query, matrix, k, min_score)
+        best_nodes += [block[rows[i]] for i in top]
+        best_scores = np.concatenate([best_scores, scores])
+        keep = top_k_indices(best_scores, k)
+        best_nodes = [best_nodes[i] for i in keep]
+        best_scores = best_scores[keep]
+    return [(node, float(score)) for node, score in zip(best_nodes, best_scores)]
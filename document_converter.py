@@ -1,18 +1,180 @@
 import os
+import re
 import uuid
+import hashlib
 import datetime
 import shutil
+import asyncio
+import atexit
+import json
 import logging
-from typing import Dict
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
 from markitdown import MarkItDown
+from openai import OpenAI
+from openai.lib._pydantic import to_strict_json_schema
+from pydantic import BaseModel
 from db.db_manager import Neo4jManager
-from db import documents
+from db import documents, embedding_cache
+from db import entities as db_entities
+from db import memories as db_memories
+from db import topics as db_topics
 from models.document import Document
+from models.llm_document_metadata import DocumentLLMMetadata
+from models.relationship import Relationships
 from nexus.entity_processing import EntityProcessingPipeline
-from db.vector_utils import get_embedding
 
 logger = logging.getLogger(__name__)
 
+# The system prompts are constants and the document text goes last in the
+# user message, so every call shares the same prompt prefix and can be served
+# from OpenAI's prompt cache
+METADATA_SYSTEM_PROMPT = """
+You are an assistant that analyzes document text and generates metadata.
+Classify the content into one of the following categories: Email, Note, Documentation, Post, Image, or Other.
+Then, generate a short description (maximum 150 characters) and a brief summary (maximum 300 characters) of the document.
+"""
+
+RELATIONSHIP_SYSTEM_PROMPT = """
+You are an assistant that infers inter-node relationships in a knowledge graph.
+You are provided with a snippet of a document and a JSON object that groups nodes extracted from the document into categories: 'entities', 'topics', and 'memories'.
+Your task is to analyze the document text and identify explicit relationships between these nodes.
+For each relationship found, return an object with the following keys:
+  - subject: the name of one node
+  - predicate: a relationship label (e.g., 'son_of', 'father_of', 'related_to')
+  - object: the name of the other node
+  - confidence: a score between 0 and 1 indicating your confidence in this relationship
+If no explicit relationship is found, return an empty array.
+Return the output strictly as a JSON object with a key 'relationships' mapping to an array of relationship objects.
+"""
+
+# Read/write block size for copying uploaded files into storage
+COPY_CHUNK_SIZE = 1 << 20
+
+# Most nodes of each category listed in the relationship inference prompt
+MAX_RELATIONSHIP_NODES = 50
+
+# Files converted and extracted at the same time by store_files_and_convert
+MAX_PARALLEL_FILES = int(os.getenv("MAX_PARALLEL_FILES", "4"))
+# Files ingested at the same time by astore_files
+DEFAULT_FILE_CONCURRENCY = 8
+
+# Worker processes for MarkItDown conversion, which is CPU-bound Python
+# parsing that would otherwise contend for the GIL with the other ingest work
+CONVERSION_WORKERS = int(os.getenv("CONVERSION_WORKERS", str(os.cpu_count() or 1)))
+_conversion_pool = None
+_conversion_pool_lock = threading.Lock()
+# The MarkItDown instance of a conversion worker process
+_worker_markitdown = None
+
+# Seconds between status checks of a submitted OpenAI batch
+LLM_BATCH_POLL_INTERVAL = float(os.getenv("LLM_BATCH_POLL_INTERVAL", "30"))
+
+_FIRST_NON_SPACE = re.compile(r"\S")
+
+def _stripped_head(text: str, limit: int) -> str:
+    """Return the first limit characters of the stripped text without copying all of a long text."""
+    match = _FIRST_NON_SPACE.search(text)
+    if match is None:
+        return ""
+    return text[match.start():match.start() + limit].rstrip()
+
+def _metadata_messages(markdown_text: str) -> List[dict]:
+    return [
+        {"role": "system", "content": METADATA_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Document text: {markdown_text[:1000]}..."}
+    ]
+
+def _fallback_metadata(markdown_text: str, file_type: str) -> Tuple[str, str, str]:
+    """Content type, description and summary used when the LLM metadata call fails."""
+    summary = _stripped_head(markdown_text, 300)
+    return file_type, summary[:150], summary
+
+def _relationship_messages(markdown_text: str, entity_names: List[str], topic_names: List[str],
+                           memories: list) -> Optional[List[dict]]:
+    """Build the relationship inference prompt, or return None if there are fewer than two nodes to relate."""
+    # Consolidate all nodes, capping each category so the prompt stays
+    # bounded on long documents. Sorted lists make the prompt identical for
+    # the same nodes, whatever order they were extracted in.
+    all_nodes = {
+        "entities": sorted(list(dict.fromkeys(entity_names))[:MAX_RELATIONSHIP_NODES]),
+        "topics": sorted(list(dict.fromkeys(topic_names))[:MAX_RELATIONSHIP_NODES]),
+        "memories": sorted([mem.content for mem in memories if hasattr(mem, 'content')][:MAX_RELATIONSHIP_NODES])
+    }
+    # A relationship needs two nodes, so the LLM call would return nothing
+    if sum(len(nodes) for nodes in all_nodes.values()) < 2:
+        return None
+    return [
+        {"role": "system", "content": RELATIONSHIP_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Document text: {markdown_text[:1000]}...\nNodes: {json.dumps(all_nodes, ensure_ascii=False)}"}
+    ]
+
+def _completed_future(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+def _init_conversion_worker() -> None:
+    global _worker_markitdown
+    _worker_markitdown = MarkItDown()
+
+def _convert_in_worker(file_path: str) -> str:
+    return _worker_markitdown.convert(file_path).text_content
+
+def _get_conversion_pool() -> ProcessPoolExecutor:
+    global _conversion_pool
+    if _conversion_pool is None:
+        with _conversion_pool_lock:
+            if _conversion_pool is None:
+                # Workers are started on demand while ingest threads, OpenAI
+                # calls and the Neo4j driver are running; forking then would
+                # copy locks those threads hold, so workers come from a
+                # single-threaded forkserver instead
+                _conversion_pool = ProcessPoolExecutor(
+                    max_workers=CONVERSION_WORKERS,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                    initializer=_init_conversion_worker
+                )
+                atexit.register(_conversion_pool.shutdown, wait=False, cancel_futures=True)
+    return _conversion_pool
+
+@dataclass
+class _PreparedDocument:
+    """A document that has been converted and extracted but not embedded or written yet."""
+    document: Document
+    is_new: bool = False
+    markdown_text: str = ""
+    markdown_hash: str = ""
+    memories: list = field(default_factory=list)
+    memory_embeddings: List[Optional[list]] = field(default_factory=list)
+    relationships_future: Optional[Future] = None
+
+    def vectorization_input(self) -> str:
+        """The text embedded for the document: its content followed by the generated metadata."""
+        if not self.markdown_text or self.markdown_text.isspace():
+            return ""
+        document = self.document
+        return "\n".join([self.markdown_text, document.description, document.content_type, document.summary])
+
+    def vectorization_key(self) -> Optional[str]:
+        """Embedding cache key of the vectorization input, derived from the markdown hash and the metadata."""
+        if not self.markdown_hash or not self.markdown_text or self.markdown_text.isspace():
+            return None
+        document = self.document
+        return embedding_cache.composite_key(
+            self.markdown_hash, [document.description, document.content_type, document.summary]
+        )
+
+@dataclass
+class _TextInput:
+    """Text ingested as a Markdown document straight from memory, without a source file."""
+    text: str
+    file_name: str
+
 class DocumentConverter:
     def __init__(self, 
                  db_manager: Neo4jManager,
@@ -29,109 +191,91 @@ class DocumentConverter:
         self.db_manager = db_manager
         self.entity_pipeline = entity_pipeline
         self.storage_dir = storage_dir
+        # One client for every LLM call so its HTTP connection pool is reused
+        self._openai = OpenAI()
+        # Image converter built once; convert() keeps no per-call state on
+        # the instance, so concurrent batch workers can share it
+        self._md_vision = MarkItDown(llm_client=self._openai, llm_model="gpt-4o")
+        # Created up front rather than from the first ingest worker thread
+        _get_conversion_pool()
 
         # Ensure the storage directory exists
         os.makedirs(self.storage_dir, exist_ok=True)
 
-    def store_file_and_convert(self, src_file_path: str) -> Document:
-        """
-        Process the file by:
-        1. Storing it in the original files directory
-        2. Converting it to Markdown using MarkItDown
-        3. Saving the markdown output
-        4. Extracting entities from the markdown
-        5. Processing entities through the pipeline
-        6. Creating a document node in Neo4j with metadata and entity relationships
-        
-        Returns:
-            Document: The processed document with metadata and extracted information
-        """
-        # Generate a unique ID and construct a unique file name
-        file_id = str(uuid.uuid4())
-        base_name = os.path.basename(src_file_path)
-        file_name, file_ext = os.path.splitext(base_name)
-        unique_file_name = f"{file_name}_{file_id}{file_ext}"
-        dest_original = os.path.join(self.storage_dir, unique_file_name)
+    @staticmethod
+    def _copy_and_hash(src_file_path: str, dest_path: str) -> Tuple[str, int]:
+        """Copy a file in one streaming pass, returning its SHA-256 hex digest and size in bytes."""
+        digest = hashlib.sha256()
+        size = 0
+        with open(src_file_path, "rb") as fin, open(dest_path, "wb") as fout:
+            while chunk := fin.read(COPY_CHUNK_SIZE):
+                fout.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+        shutil.copystat(src_file_path, dest_path)
+        return digest.hexdigest(), size
 
-        # Copy the original file to the storage directory
+    def _find_by_hash(self, content_hash: str) -> Optional[Document]:
+        """Return the stored document with the given content hash, or None if there is none or the lookup fails."""
         try:
-            shutil.copy2(src_file_path, dest_original)
+            return documents.find_document_by_hash(self.db_manager, content_hash)
         except Exception as e:
-            logger.error("Error copying file to original storage: %s", e)
-            raise e
+            logger.warning("Could not look up document by content hash: %s", e)
+            return None
 
-        # Get file metadata
-        file_size = os.path.getsize(dest_original)
-        file_type = os.path.splitext(dest_original)[1].lower()
-        upload_date = datetime.datetime.now()
+    def _release_failed_hash(self, content_hash: str) -> bool:
+        """Release a content hash held by a failed document; False if none held it or the update fails."""
+        try:
+            return documents.release_failed_content_hash(self.db_manager, content_hash)
+        except Exception as e:
+            logger.warning("Could not release content hash: %s", e)
+            return False
 
-        # Convert the file to Markdown using MarkItDown
+    def _convert_to_markdown(self, file_path: str, file_type: str, base_name: str) -> str:
+        """Return the Markdown text of a file, converting it with MarkItDown unless it already is Markdown."""
         if file_type == ".md":
             try:
-                with open(dest_original, "r", encoding="utf-8") as f:
+                with open(file_path, "r", encoding="utf-8") as f:
                     markdown_text = f.read()
-                conversion_status = "Conversion Skipped"
-                error_message = None
                 logger.info("File is markdown. Skipping conversion and using original content.")
+                return markdown_text
             except Exception as e:
-                conversion_status = "Conversion Failed"
-                error_message = str(e)
                 logger.error("Reading markdown file failed: %s", e)
                 raise RuntimeError(f"Failed to read markdown file: {str(e)}")
-        else:
-            try:
-                # Initialize OpenAI client for image processing if needed
-                image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
-                if file_type in image_extensions:
-                    from openai import OpenAI
-                    client = OpenAI()
-                    md = MarkItDown(llm_client=client, llm_model="gpt-4o")
-                else:
-                    md = MarkItDown()
-                
-                result = md.convert(dest_original)
-                markdown_text = result.text_content
-                logger.info("File converted successfully: %s", base_name)
-                conversion_status = "Success"
-                error_message = None
-            except Exception as e:
-                conversion_status = "Conversion Failed"
-                error_message = str(e)
-                logger.error("Conversion failed: %s", e)
-                raise RuntimeError(f"Document conversion failed: {str(e)}")
-
-        # Determine the markdown file path (same base name, .md extension)
-        markdown_file_name = os.path.splitext(unique_file_name)[0] + ".md"
-        dest_markdown = os.path.join(self.storage_dir, markdown_file_name)
+        try:
+            # Images are described by the LLM through the shared OpenAI client,
+            # which cannot be handed to a worker process; everything else is
+            # converted by the worker's own MarkItDown instance
+            image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
+            if file_type in image_extensions:
+                markdown_text = self._md_vision.convert(file_path).text_content
+            else:
+                markdown_text = _get_conversion_pool().submit(_convert_in_worker, file_path).result()
+            logger.info("File converted successfully: %s", base_name)
+            return markdown_text
+        except Exception as e:
+            logger.error("Conversion failed: %s", e)
+            raise RuntimeError(f"Document conversion failed: {str(e)}")
 
-        # Write the markdown output
+    def _write_markdown(self, dest_markdown: str, markdown_text: str) -> str:
+        """Write the markdown output next to the stored original and return its SHA-256 hex digest."""
         try:
             with open(dest_markdown, "w", encoding="utf-8") as md_file:
                 md_file.write(markdown_text)
+            return hashlib.sha256(markdown_text.encode("utf-8")).hexdigest()
         except Exception as e:
             logger.error("Saving markdown file failed: %s", e)
             raise RuntimeError(f"Failed to save markdown file: {str(e)}")
 
-        # LLM Metadata Extraction: Generate content_type, description, and summary from the markdown text
+    def _generate_metadata(self, markdown_text: str, file_type: str) -> Tuple[str, str, str]:
+        """
+        Generate content_type, description, and summary from the markdown text with the LLM,
+        falling back to the file type and truncated text if the call fails.
+        """
         try:
-            from openai import OpenAI
-            from models.llm_document_metadata import DocumentLLMMetadata
-            client = OpenAI()
-
-            system_prompt = """
-            You are an assistant that analyzes document text and generates metadata.
-            Classify the content into one of the following categories: Email, Note, Documentation, Post, Image, or Other.
-            Then, generate a short description (maximum 150 characters) and a brief summary (maximum 300 characters) of the document.
-            """
-
-            user_content = f"Document text: {markdown_text[:1000]}..."
-
-            completion = client.beta.chat.completions.parse(
+            completion = self._openai.beta.chat.completions.parse(
                 model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_content}
-                ],
+                messages=_metadata_messages(markdown_text),
                 response_format=DocumentLLMMetadata,
                 temperature=0.3
             )
@@ -143,14 +287,13 @@ class DocumentConverter:
             logger.info("LLM generated metadata: content_type=%s, description=%s, summary=%s", computed_content_type, computed_description, computed_summary)
         except Exception as e:
             logger.error("LLM metadata generation failed: %s", e)
-            computed_content_type = file_type
-            computed_description = markdown_text.strip()[:150] if markdown_text.strip() else ""
-            computed_summary = markdown_text.strip()[:300] if markdown_text.strip() else ""
+            computed_content_type, computed_description, computed_summary = _fallback_metadata(markdown_text, file_type)
+        return computed_content_type, computed_description, computed_summary
 
-        # Extraction of entities, topics, and memories using extract_entities_from_text
+    def _extract_knowledge(self, markdown_text: str) -> Tuple[list, list, list]:
+        """Extract and process entities, topics, and memories, returning empty lists if extraction fails."""
         try:
-            
-            extracted = self.entity_pipeline.extract_entities_from_text(markdown_text)
+            extracted = self.entity_pipeline.extract_entities_from_document(markdown_text)
             # Process extracted entities through the entity pipeline
             final_entities = self.entity_pipeline.process_extracted_entities(extracted)
             extracted_entities = final_entities
@@ -162,40 +305,130 @@ class DocumentConverter:
             extracted_entities = []
             extracted_topics = []
             extracted_memories = []
+        return extracted_entities, extracted_topics, extracted_memories
 
-        # Process extracted topics
+    def _infer_relationships(self, markdown_text: str, entity_names: List[str], topic_names: List[str],
+                             memories: list) -> list:
+        """Infer inter-node relationships between all extracted nodes using a unified LLM call."""
+        messages = _relationship_messages(markdown_text, entity_names, topic_names, memories)
+        if messages is None:
+            logger.info("Fewer than two nodes extracted; skipping relationship inference.")
+            return []
         try:
-            from db import topics as db_topics
-            final_topics = []
-            for topic in extracted_topics:
-                similar = db_topics.search_similar_topics(self.db_manager, topic.name)
-                if similar:
-                    existing_topic = similar[0]
-                    merged_aliases = list(set((existing_topic.get('aliases') or []) + topic.aliases))
-                    db_topics.update_topic(self.db_manager, existing_topic['name'], merged_aliases)
-                    final_topics.append(existing_topic['name'])
-                else:
-                    final_topics.append(topic.name)
-                    db_topics.update_topic(self.db_manager, topic.name, topic.aliases)
+            completion = self._openai.beta.chat.completions.parse(
+                model="gpt-4o",
+                messages=messages,
+                response_format=Relationships,
+                temperature=0.0
+            )
+            
+            inferred_relationships = completion.choices[0].message.parsed.relationships
+            logger.info("Inferred %d inter-node relationships.", len(inferred_relationships))
+            return inferred_relationships
         except Exception as e:
-            logger.error("Topic processing failed: %s", e)
-            raise RuntimeError(f"Topic processing failed: {str(e)}")
+            logger.error("Failed to infer inter-node relationships: %s", str(e))
+            return []
+
+    def _prepare_document(self, source: Union[str, _TextInput], relationship_pool: ThreadPoolExecutor,
+                          batch_mode: bool = False) -> _PreparedDocument:
+        """
+        Run every step of ingesting a file that comes before embedding: copying
+        and hashing, the content hash check, conversion, metadata, extraction
+        and topic processing. Relationship inference is started on relationship_pool.
+        In batch mode the metadata and relationship LLM calls are left to
+        _complete_with_llm_batch.
+
+        A _TextInput source is already Markdown: it is hashed in memory and
+        written once, as both the original and the markdown file.
+        """
+        text_input = source if isinstance(source, _TextInput) else None
+        src_file_path = None if text_input is not None else source
+        # Generate a unique ID and construct a unique file name
+        file_id = str(uuid.uuid4())
+        base_name = text_input.file_name if text_input is not None else os.path.basename(src_file_path)
+        file_name, file_ext = os.path.splitext(base_name)
+        unique_file_name = f"{file_name}_{file_id}{file_ext}"
+        dest_original = os.path.join(self.storage_dir, unique_file_name)
+
+        file_type = file_ext.lower()
+        upload_date = datetime.datetime.now()
 
-        # Process extracted memories (no additional processing assumed)
-        final_memories = extracted_memories
+        # Determine the markdown file path (same base name, .md extension)
+        markdown_file_name = os.path.splitext(unique_file_name)[0] + ".md"
+        dest_markdown = os.path.join(self.storage_dir, markdown_file_name)
 
-        # Generate embedding for the combined text content including extra fields
-        vectorization_input = "\n".join([markdown_text, computed_description, computed_content_type, computed_summary])
-        embedding = None
-        if markdown_text.strip():
+        if text_input is not None:
+            data = text_input.text.encode("utf-8")
+            content_hash, file_size = hashlib.sha256(data).hexdigest(), len(data)
+            dest_original = dest_markdown
+        else:
+            # Copy the original file to the storage directory, hashing it and
+            # counting its size in the same pass over the bytes
             try:
-                embedding = get_embedding(vectorization_input)
-                logger.info("Generated embedding for document: %s", base_name)
+                content_hash, file_size = self._copy_and_hash(src_file_path, dest_original)
             except Exception as e:
-                logger.error("Embedding generation failed: %s", e)
-                # Don't raise here, we can still proceed with document creation
+                logger.error("Error copying file to original storage: %s", e)
+                raise e
+
+        # A file with the same bytes was already converted, extracted and
+        # embedded, so the stored document is returned as is
+        existing = self._find_by_hash(content_hash)
+        if existing is not None:
+            logger.info("Duplicate ingest skipped: %s was already ingested as document %s", base_name, existing.id)
+            if text_input is None:
+                os.remove(dest_original)
+            return _PreparedDocument(document=existing)
+
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="document-convert") as pool:
+            if text_input is not None:
+                markdown_text = text_input.text
+            else:
+                markdown_text = self._convert_to_markdown(src_file_path, file_type, base_name)
+            conversion_status = "Conversion Skipped" if file_type == ".md" else "Success"
+
+            # Saving the markdown, the LLM metadata call and entity extraction
+            # only depend on the markdown text, so they run concurrently
+            write_future = pool.submit(self._write_markdown, dest_markdown, markdown_text)
+            metadata_future = None if batch_mode else pool.submit(self._generate_metadata, markdown_text, file_type)
+            extraction_future = pool.submit(self._extract_knowledge, markdown_text)
+            markdown_hash = write_future.result()
+            if metadata_future is not None:
+                computed_content_type, computed_description, computed_summary = metadata_future.result()
+            else:
+                computed_content_type, computed_description, computed_summary = file_type, "", ""
+            extracted_entities, extracted_topics, extracted_memories = extraction_future.result()
 
-        # Create document record
+        # Resolve extracted topics against existing ones in one transaction;
+        # several extracted topics can resolve to the same existing one
+        try:
+            final_topics = list(dict.fromkeys(db_topics.resolve_topics(self.db_manager, extracted_topics)))
+        except Exception as e:
+            logger.error("Topic processing failed: %s", e)
+            raise RuntimeError(f"Topic processing failed: {str(e)}")
+
+        # Drop repeated entity names and memories so every node is written and
+        # embedded once
+        entity_names = list(dict.fromkeys(entity.name for entity in extracted_entities))
+        unique_memories = {}
+        for memory in extracted_memories:
+            unique_memories.setdefault(memory.content, memory)
+        final_memories = list(unique_memories.values())
+
+        # Relationship inference only needs the extracted node names, so the
+        # LLM call runs while the embeddings are generated and the document
+        # is written
+        relationships_future = None
+        if not batch_mode:
+            relationships_future = relationship_pool.submit(
+                self._infer_relationships,
+                markdown_text,
+                entity_names,
+                final_topics,
+                final_memories
+            )
+
+        # Create document record; the embedding is filled in after the batch
+        # embedding request
         document = Document(
             id=file_id,
             file_name=base_name,
@@ -205,35 +438,152 @@ class DocumentConverter:
             original_path=dest_original,
             markdown_path=dest_markdown,
             conversion_status=conversion_status,
-            error_message=error_message,
-            entities=[entity.name for entity in extracted_entities],
+            error_message=None,
+            entities=entity_names,
             topics=final_topics,
-            embedding=embedding,
             description=computed_description,
             content_type=computed_content_type,
-            summary=computed_summary
+            summary=computed_summary,
+            content_hash=content_hash
+        )
+        return _PreparedDocument(
+            document=document,
+            is_new=True,
+            markdown_text=markdown_text,
+            markdown_hash=markdown_hash,
+            memories=final_memories,
+            relationships_future=relationships_future
+        )
+
+    def _run_llm_batch(self, requests: Dict[str, Tuple[List[dict], type, float]]) -> Dict[str, BaseModel]:
+        """
+        Run chat completions through the OpenAI Batch API and wait for them.
+
+        Args:
+            requests: Maps a custom id to the messages, the response model and
+                the temperature of one request.
+
+        Returns:
+            The parsed response of every request that succeeded, by custom id.
+        """
+        lines = []
+        for custom_id, (messages, response_model, temperature) in requests.items():
+            lines.append(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": "gpt-4o",
+                    "messages": messages,
+                    "temperature": temperature,
+                    "response_format": {
+                        "type": "json_schema",
+                        "json_schema": {
+                            "name": response_model.__name__,
+                            "schema": to_strict_json_schema(response_model),
+                            "strict": True
+                        }
+                    }
+                }
+            }))
+        batch_file = self._openai.files.create(
+            file=("knowledge_nexus_batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = self._openai.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
         )
+        logger.info("Submitted OpenAI batch %s with %d requests", batch.id, len(lines))
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(LLM_BATCH_POLL_INTERVAL)
+            batch = self._openai.batches.retrieve(batch.id)
+        logger.info("OpenAI batch %s finished with status %s", batch.id, batch.status)
+        if not batch.output_file_id:
+            return {}
 
-        # Store document in database
+        results = {}
+        for line in self._openai.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            custom_id = item.get("custom_id")
+            response = item.get("response") or {}
+            try:
+                if response.get("status_code") != 200:
+                    raise RuntimeError(item.get("error") or response.get("status_code"))
+                content = response["body"]["choices"][0]["message"]["content"]
+                results[custom_id] = requests[custom_id][1].model_validate_json(content)
+            except Exception as e:
+                logger.error("Batch request %s failed: %s", custom_id, e)
+        return results
+
+    def _complete_with_llm_batch(self, batch: List[_PreparedDocument]) -> None:
+        """Fill in the metadata and inferred relationships of prepared documents with one OpenAI batch."""
+
+        requests = {}
+        for item in batch:
+            document = item.document
+            requests[f"{document.id}:meta"] = (_metadata_messages(item.markdown_text), DocumentLLMMetadata, 0.3)
+            messages = _relationship_messages(item.markdown_text, document.entities, document.topics, item.memories)
+            if messages is not None:
+                requests[f"{document.id}:rels"] = (messages, Relationships, 0.0)
         try:
-            # Create document node
-            documents.create_document(self.db_manager, document)
-            
-            # Create relationships to entities
-            for entity_name in document.entities:
-                documents.create_document_entity_relationship(
-                    self.db_manager, document.id, entity_name
+            results = self._run_llm_batch(requests)
+        except Exception as e:
+            logger.error("OpenAI batch failed: %s", e)
+            results = {}
+
+        for item in batch:
+            document = item.document
+            metadata = results.get(f"{document.id}:meta")
+            if metadata is not None:
+                document.content_type = metadata.content_type
+                document.description = metadata.description
+                document.summary = metadata.summary
+            else:
+                document.content_type, document.description, document.summary = _fallback_metadata(
+                    item.markdown_text, document.file_type
                 )
-            
+            relationships = results.get(f"{document.id}:rels")
+            item.relationships_future = _completed_future(relationships.relationships if relationships else [])
+
+    def _store_document(self, prepared: _PreparedDocument) -> None:
+        """Write a prepared document, its relationships and the inferred inter-node relationships."""
+        document = prepared.document
+        try:
+            # Create document node and its relationships to entities
+            try:
+                documents.create_document_with_entities(self.db_manager, document, document.entities)
+            except Exception:
+                # A document that failed to be stored earlier may still hold
+                # the content hash; once released, the write is retried
+                if not self._release_failed_hash(document.content_hash):
+                    raise
+                documents.create_document_with_entities(self.db_manager, document, document.entities)
+        except Exception as e:
+            # The content hash is unique, so a concurrent ingest of the same
+            # file that committed first makes this one a duplicate
+            existing = self._find_by_hash(document.content_hash)
+            if existing is not None and existing.id != document.id:
+                logger.info("Duplicate ingest skipped: %s was stored as document %s", document.file_name, existing.id)
+                for path in (document.original_path, document.markdown_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                prepared.document = existing
+                return
+            logger.error("Database operation failed: %s", e)
+            raise RuntimeError(f"Database operation failed: {str(e)}")
+
+        try:
             # Create relationships to topics
-            from db import topics as db_topics
-            for topic_name in document.topics:
-                db_topics.create_document_topic_relationship(self.db_manager, document.id, topic_name)
+            db_topics.create_document_topic_relationships(self.db_manager, document.id, document.topics)
             
             # Create relationships to memories
-            from db import memories as db_memories
-            for memory in final_memories:
-                db_memories.create_document_memory_relationship(self.db_manager, document.id, memory)
+            db_memories.create_document_memory_relationships(
+                self.db_manager, document.id, prepared.memories, prepared.memory_embeddings
+            )
         except Exception as e:
             logger.error("Database operation failed: %s", e)
             documents.update_document_status(
@@ -242,54 +592,225 @@ class DocumentConverter:
             )
             raise RuntimeError(f"Database operation failed: {str(e)}")
 
-        # Infer inter-node relationships between all extracted nodes using a unified LLM call
+        # Store inferred inter-node relationships once the LLM call started earlier returns
         try:
-            from models.relationship import Relationships
-            from openai import OpenAI
-            client = OpenAI()
-            
-            # Consolidate all nodes
-            all_nodes = {
-                "entities": document.entities,
-                "topics": final_topics,
-                "memories": [mem.content for mem in final_memories if hasattr(mem, 'content')]
-            }
-            
-            system_prompt = """
-            You are an assistant that infers inter-node relationships in a knowledge graph.
-            You are provided with a snippet of a document and a JSON object that groups nodes extracted from the document into categories: 'entities', 'topics', and 'memories'.
-            Your task is to analyze the document text and identify explicit relationships between these nodes.
-            For each relationship found, return an object with the following keys:
-              - subject: the name of one node
-              - predicate: a relationship label (e.g., 'son_of', 'father_of', 'related_to')
-              - object: the name of the other node
-              - confidence: a score between 0 and 1 indicating your confidence in this relationship
-            If no explicit relationship is found, return an empty array.
-            Return the output strictly as a JSON object with a key 'relationships' mapping to an array of relationship objects.
-            """
-            
-            user_prompt = f"Document text: {markdown_text[:1000]}...\nNodes: {all_nodes}"
-            
-            completion = client.beta.chat.completions.parse(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format=Relationships,
-                temperature=0.0
-            )
-            
-            inferred_relationships = completion.choices[0].message.parsed.relationships
-            logger.info("Inferred %d inter-node relationships.", len(inferred_relationships))
-            from db import entities as db_entities
-            db_entities.store_relationships(self.db_manager, inferred_relationships)
+            inferred_relationships = prepared.relationships_future.result()
+            if inferred_relationships:
+                db_entities.store_relationships(self.db_manager, inferred_relationships)
         except Exception as e:
-            logger.error("Failed to infer inter-node relationships: %s", str(e))
+            logger.error("Failed to store inter-node relationships: %s", str(e))
 
         logger.info("Document processed successfully: %s", document.file_name)
-        return document
 
+    def _store_documents(self, batch: List[_PreparedDocument]) -> Dict[int, Exception]:
+        """
+        Write a batch of prepared documents with one statement per node and
+        relationship type, all in one transaction. The relationship inference
+        LLM calls keep running meanwhile and are only waited for afterwards.
+        If the transaction fails, e.g. because another ingest stored one of
+        the files first, each document is written on its own instead.
+
+        Returns:
+            The exception of every document that could not be written, by its
+            position in batch; the other documents are stored regardless.
+        """
+        try:
+            with self.db_manager.get_transaction() as tx:
+                documents.create_documents_with_entities(self.db_manager, [item.document for item in batch], tx=tx)
+                db_topics.create_documents_topic_relationships(
+                    self.db_manager, {item.document.id: item.document.topics for item in batch}, tx=tx
+                )
+                db_memories.create_documents_memory_relationships(
+                    self.db_manager,
+                    [(item.document.id, item.memories, item.memory_embeddings) for item in batch],
+                    tx=tx
+                )
+        except Exception as e:
+            logger.warning("Batched document write failed, writing documents one by one: %s", e)
+            failures = {}
+            for i, item in enumerate(batch):
+                try:
+                    self._store_document(item)
+                except Exception as store_error:
+                    logger.error("Failed to store document %s: %s", item.document.file_name, store_error)
+                    failures[i] = store_error
+            return failures
+
+        # Store the inferred inter-node relationships of the whole batch in one write
+        inferred_relationships = []
+        for item in batch:
+            try:
+                inferred_relationships.extend(item.relationships_future.result())
+            except Exception as e:
+                logger.error("Failed to infer inter-node relationships: %s", str(e))
+        try:
+            if inferred_relationships:
+                db_entities.store_relationships(self.db_manager, inferred_relationships)
+        except Exception as e:
+            logger.error("Failed to store inter-node relationships: %s", str(e))
+        logger.info("Stored %d documents in one transaction", len(batch))
+        return {}
+
+    def store_files_and_convert(self, src_file_paths: List[str], batch_mode: bool = False,
+                                return_exceptions: bool = False) -> List[Union[Document, BaseException]]:
+        """
+        Process many files, sharing one embedding request between them.
+
+        Each file is hashed, stored, converted, described and extracted in
+        parallel. The vectorization inputs of all new documents and their
+        memories are then embedded with a single batched request (reusing
+        cached embeddings), and the documents are written to Neo4j in one
+        transaction with one statement per node and relationship type.
+
+        With batch_mode, the metadata and relationship inference LLM calls of
+        all files are submitted together through the OpenAI Batch API, which
+        costs about half as much but may take up to 24 hours; this call
+        blocks until the batch finishes. Meant for offline bulk ingestion.
+
+        A file that fails does not stop the others: they are still embedded
+        and stored before its exception is raised.
+
+        Args:
+            src_file_paths: Paths of the files to ingest.
+            batch_mode: Run the LLM calls through the OpenAI Batch API.
+            return_exceptions: Return a file's exception in its place instead
+                of raising the first one, as astore_files does.
+
+        Returns:
+            One document (or exception) per path, in order. Files ingested
+            before return their stored document.
+        """
+        return self._store_sources(src_file_paths, batch_mode, return_exceptions)
+
+    def _store_sources(self, sources: List[Union[str, _TextInput]], batch_mode: bool = False,
+                       return_exceptions: bool = False) -> List[Union[Document, BaseException]]:
+        """Prepare, embed and write file paths or in-memory texts; see store_files_and_convert."""
+        if not sources:
+            return []
+        workers = min(len(sources), MAX_PARALLEL_FILES)
+        relationship_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="document-relationships")
+        results: List[Union[_PreparedDocument, BaseException]] = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="document-prepare") as pool:
+                futures = [
+                    pool.submit(self._prepare_document, source, relationship_pool, batch_mode)
+                    for source in sources
+                ]
+                for source, future in zip(sources, futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        name = source.file_name if isinstance(source, _TextInput) else source
+                        logger.error("Failed to prepare %s: %s", name, e)
+                        results.append(e)
+            new_positions = [
+                i for i, item in enumerate(results) if isinstance(item, _PreparedDocument) and item.is_new
+            ]
+            new_documents = [results[i] for i in new_positions]
+            if batch_mode and new_documents:
+                self._complete_with_llm_batch(new_documents)
+
+            # Generate embeddings for every document's combined text content
+            # including extra fields and for every memory in a single API
+            # request, reusing any that are already in the persistent cache
+            texts = []
+            keys = []
+            for item in new_documents:
+                texts.append(item.vectorization_input())
+                keys.append(item.vectorization_key())
+                texts.extend(memory.content for memory in item.memories)
+                keys.extend([None] * len(item.memories))
+            try:
+                embeddings = embedding_cache.get_or_compute_many(self.db_manager, texts, keys=keys) if texts else []
+            except Exception as e:
+                logger.error("Embedding generation failed: %s", e)
+                # Don't raise here, we can still proceed with document creation
+                embeddings = [None] * len(texts)
+            offset = 0
+            for item in new_documents:
+                item.document.embedding = embeddings[offset]
+                item.memory_embeddings = embeddings[offset + 1:offset + 1 + len(item.memories)]
+                offset += 1 + len(item.memories)
+                if item.document.embedding is not None:
+                    logger.info("Generated embedding for document: %s", item.document.file_name)
+
+            failures = self._store_documents(new_documents) if new_documents else {}
+            for i, error in failures.items():
+                results[new_positions[i]] = error
+        finally:
+            relationship_pool.shutdown(wait=False)
+        if not return_exceptions:
+            # Every other source is stored by now
+            for item in results:
+                if isinstance(item, BaseException):
+                    raise item
+        return [item.document if isinstance(item, _PreparedDocument) else item for item in results]
+
+    def store_file_and_convert(self, src_file_path: str) -> Document:
+        """
+        Process the file by:
+        0. Returning the stored document if a file with the same content hash was ingested before
+        1. Storing it in the original files directory
+        2. Converting it to Markdown using MarkItDown
+        3. Saving the markdown output
+        4. Extracting entities from the markdown
+        5. Processing entities through the pipeline
+        6. Creating a document node in Neo4j with metadata and entity relationships
+        
+        Returns:
+            Document: The processed document with metadata and extracted information
+        """
+        return self.store_files_and_convert([src_file_path])[0]
+
+    def store_text_and_convert(self, text: str, file_name: str = "text_input.md") -> Document:
+        """
+        Ingest text held in memory as a Markdown document.
+
+        The text is hashed and written to the storage directory once, serving
+        as both the original and the markdown file, and then goes through the
+        same extraction, embedding and storage steps as an uploaded file.
+
+        Args:
+            text: The text to ingest.
+            file_name: Name recorded for the document; its extension is the file type.
+
+        Returns:
+            Document: The processed document, or the stored one if the same text was ingested before.
+        """
+        return self._store_sources([_TextInput(text=text, file_name=file_name)])[0]
+
+    async def astore_file_and_convert(self, src_file_path: str) -> Document:
+        """Run store_file_and_convert in a worker thread so the event loop stays free."""
+        return await asyncio.to_thread(self.store_file_and_convert, src_file_path)
+
+    async def astore_files(self, src_file_paths: List[str], concurrency: int = DEFAULT_FILE_CONCURRENCY,
+                           return_exceptions: bool = False) -> List[Union[Document, BaseException]]:
+        """
+        Ingest many files with up to `concurrency` of them in flight at once.
+
+        Each file runs the full synchronous pipeline in a worker thread, so one
+        file's conversion overlaps with the LLM and Neo4j round trips of the
+        others.
+
+        Args:
+            src_file_paths: Paths of the files to ingest.
+            concurrency: Maximum number of files processed at the same time.
+            return_exceptions: Return a file's exception in its place instead
+                of raising the first one, as asyncio.gather does.
+
+        Returns:
+            One document (or exception) per path, in order.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def store_one(src_file_path: str) -> Document:
+            async with semaphore:
+                return await self.astore_file_and_convert(src_file_path)
+
+        return await asyncio.gather(
+            *(store_one(path) for path in src_file_paths),
+            return_exceptions=return_exceptions
+        )
 
 # If this module is run as a script, demonstrate a simple test
 if __name__ == "__main__":
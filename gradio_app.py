@@ -1,13 +1,12 @@
 import gradio as gr
 import os
 import logging
-import tempfile
+import shutil
 import uuid
+from cachetools import TTLCache, cached
 
 # Import required components from our codebase
-from db.db_manager import Neo4jManager
-from nexus.pipeline import KnowledgeNexusPipeline
-from db.vector_utils import get_embedding  # newly imported for embedding
+from db.db_manager import get_db_manager
 from db import knowledge_search
 
 # Import the new core functions
@@ -18,6 +17,8 @@ logging.basicConfig(level=logging.INFO,
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+UPLOAD_CHUNK_SIZE = 1 << 20
+
 def process_text_input(text, instructions=""):
     """
     Process text input by delegating to the core logic.
@@ -30,13 +31,20 @@ def process_document_file(file):
     """
     if file is None:
         return "No file uploaded."
-    # Gradio provides a file-like object; save it to a temp file
+    # Gradio 4 passes the path of its own temporary copy (a str with a .name);
+    # older versions pass a file-like object. Either way the bytes are
+    # streamed to disk instead of being read into memory.
+    source_path = file if isinstance(file, str) else getattr(file, "name", None)
     temp_dir = os.path.join(os.getcwd(), "knowledge_nexus_files")
     os.makedirs(temp_dir, exist_ok=True)
-    temp_filename = f"{uuid.uuid4()}_{file.name}"
+    temp_filename = f"{uuid.uuid4()}_{os.path.basename(source_path or 'upload')}"
     file_path = os.path.join(temp_dir, temp_filename)
-    with open(file_path, "wb") as f:
-        f.write(file.read())
+    if hasattr(file, "read"):
+        with open(file_path, "wb") as f:
+            shutil.copyfileobj(file, f, length=UPLOAD_CHUNK_SIZE)
+    else:
+        # copyfile uses sendfile on Linux, so the bytes never enter Python
+        shutil.copyfile(source_path, file_path)
     return process_document_file_core(file_path)
 
 def search_knowledge_fn(query_text: str, node_type: str = "ALL", k: int = 10, min_score: float = 0.5):
@@ -45,19 +53,27 @@ def search_knowledge_fn(query_text: str, node_type: str = "ALL", k: int = 10, mi
     """
     return search_knowledge_core(query_text, node_type, k, min_score)
 
+# Used until Neo4j answers, and whenever it cannot
+DEFAULT_NODE_TYPES = ["ALL", "Memory", "Document", "Entity"]
+# Seconds the searchable node types are reused before Neo4j is asked again
+NODE_TYPES_TTL = 300
+
+@cached(TTLCache(maxsize=1, ttl=NODE_TYPES_TTL))
+def _searchable_node_types():
+    with get_db_manager().get_session() as session:
+        return ["ALL"] + knowledge_search.get_searchable_types(session)
+
 def get_node_types():
     """Get available node types for the dropdown."""
-    db_manager = Neo4jManager()
-    db_manager.connect()
     try:
-        with db_manager.get_session() as session:
-            types = knowledge_search.get_searchable_types(session)
-        return ["ALL"] + types
+        return _searchable_node_types()
     except Exception as e:
         logger.error("Error getting node types: %s", str(e))
-        return ["ALL", "Memory", "Document", "Entity"]  # Fallback default types
-    finally:
-        db_manager.close()
+        return DEFAULT_NODE_TYPES
+
+def refresh_node_types():
+    """Fill the type dropdown after the page loads, so building the UI never waits on Neo4j."""
+    return gr.update(choices=get_node_types())
 
 # Build the Gradio interface
 with gr.Blocks(title="Knowledge Nexus") as demo:
@@ -114,7 +130,7 @@ with gr.Blocks(title="Knowledge Nexus") as demo:
                     scale=3
                 )
                 node_type = gr.Dropdown(
-                    choices=get_node_types(),
+                    choices=DEFAULT_NODE_TYPES,
                     value="ALL",
                     label="Filter by Type",
                     scale=1
@@ -152,6 +168,8 @@ with gr.Blocks(title="Knowledge Nexus") as demo:
     Built with Gradio for Knowledge Nexus
     """)
 
+    demo.load(fn=refresh_node_types, outputs=node_type)
+
 if __name__ == "__main__":
     demo.launch(
         server_name="0.0.0.0",  # Make accessible from other machines
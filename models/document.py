@@ -1,9 +1,11 @@
 from datetime import datetime
 from typing import List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 class Document(BaseModel):
     """Pydantic model for document metadata and content."""
+    model_config = ConfigDict(from_attributes=True)  # For ORM compatibility
+
     id: str = Field(..., description="Unique identifier for the document.")
     file_name: str = Field(..., description="Original name of the file.")
     file_type: str = Field(..., description="File extension or type of the document.")
@@ -15,10 +17,8 @@ class Document(BaseModel):
     error_message: Optional[str] = Field(None, description="Error message during processing, if any.")
     entities: List[str] = Field(default_factory=list, description="List of entity names extracted from the document.")
     topics: List[str] = Field(default_factory=list, description="List of extracted topics from the document.")
-    embedding: Optional[List[float]] = Field(None, description="Vector embedding of the document content.")
+    embedding: Optional[List[float]] = Field(None, description="Unit-length (L2-normalized) vector embedding of the document content.")
     description: str = Field("", description="Short description derived from the document content.")
     content_type: str = Field("", description="Content type determined from the document.")
     summary: str = Field("", description="generate a Brief summary of the document content.")
-
-    class Config:
-        from_attributes = True  # For ORM compatibility 
\ No newline at end of file
+    content_hash: Optional[str] = Field(None, description="SHA-256 hex digest of the original file's bytes.") 
\ No newline at end of file
@@ -1,13 +1,15 @@
 # models/entities.py
 import logging
 from typing import Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+from pydantic.dataclasses import dataclass
 from models.topic import TopicSchema
 from models.memory import LLMMemorySchema
 logger = logging.getLogger(__name__)
 
 
-class EntitySchema(BaseModel):
+@dataclass(slots=True, config=ConfigDict(extra="ignore"))
+class EntitySchema:
     name: str = Field(..., description="Name of the entity.")
     entity_type: str = Field(..., description="Category or type of the entity.")
     aliases: list[str]= Field(default_factory=list, description="Aliases for the entity.")
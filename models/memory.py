@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+from pydantic.dataclasses import dataclass
 from typing import Optional
 
 
@@ -10,7 +11,8 @@ class MemorySchema(BaseModel):
     source: Optional[str] = None 
     sentiment: Optional[str] = None
 
-class LLMMemorySchema(BaseModel):
+@dataclass(slots=True, config=ConfigDict(extra="ignore"))
+class LLMMemorySchema:
     content: str = Field(..., description="Excerpt or snippet of key knowledge extracted from text.")
     confidence: float = Field(..., description="Confidence level for this memory.")
     tags: list[str] = Field(...,description="Tags for the memory.")
@@ -1,8 +1,10 @@
 # models/relationship.py
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+from pydantic.dataclasses import dataclass
 from typing import List
 
-class RelationshipSchema(BaseModel):
+@dataclass(slots=True, config=ConfigDict(extra="ignore"))
+class RelationshipSchema:
     subject: str = Field(..., description="The subject entity in the relationship.")
     predicate: str = Field(..., description="The predicate describing the type of relationship.")
     object: str = Field(..., description="The object entity in the relationship.")
@@ -1,7 +1,11 @@
-from pydantic import BaseModel, Field
+from pydantic import ConfigDict, Field
+from pydantic.dataclasses import dataclass
 from typing import List, Optional
 
 
-class TopicSchema(BaseModel):
+# Leaf models are slotted pydantic dataclasses: one is built per extracted
+# item, and they are validated the same way inside the BaseModel containers
+@dataclass(slots=True, config=ConfigDict(extra="ignore"))
+class TopicSchema:
     name: str = Field(..., description="Name of the topic.")
     aliases: List[str] = Field(default_factory=list, description="Aliases for the topic.")
\ No newline at end of file
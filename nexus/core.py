@@ -1,134 +1,289 @@
 import os
 import uuid
+import json
+import hashlib
 import logging
-from db.db_manager import Neo4jManager
-from nexus.pipeline import KnowledgeNexusPipeline
+import threading
+import time
+from typing import Optional
+from cachetools import TTLCache
+from db.db_manager import get_db_manager
 from db.vector_utils import get_embedding
 from db import knowledge_search
+from db import jobs
+from db import cache_generation
 
-def process_text_input_core(text, instructions=""):
+# Search results are cached per process for a short time, keyed by the
+# search generation stored in Neo4j. Every ingestion, whichever API worker,
+# Gradio app or CLI run performs it, bumps that shared counter, so no process
+# serves entries computed before the write. If the counter cannot be read,
+# searches bypass the cache. The last generation read is kept in process for
+# SEARCH_GENERATION_REFRESH_MS, so cache hits do not cost a round trip; local
+# invalidations update it immediately.
+SEARCH_GENERATION = "search"
+SEARCH_GENERATION_REFRESH_MS = int(os.getenv("SEARCH_GENERATION_REFRESH_MS", "1000"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "10000"))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "300"))
+_search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+_search_cache_lock = threading.RLock()
+_search_cache_stats = {"hits": 0, "misses": 0}
+_generation = None
+_generation_read_at = 0.0
+_generation_lock = threading.Lock()
+# Seconds after which a job that is still queued or running is considered lost
+INGEST_JOB_TIMEOUT = int(os.getenv("INGEST_JOB_TIMEOUT", "3600"))
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def _get_pipeline(db_manager):
+    """Return the process's pipeline, building it on first use: setting it up runs schema statements."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None or _pipeline.db_manager is not db_manager:
+            # Imported on first ingestion: the pipeline pulls in markitdown and its
+            # converters, which search-only API workers never need
+            from nexus.pipeline import KnowledgeNexusPipeline
+            _pipeline = KnowledgeNexusPipeline(db_manager)
+        return _pipeline
+
+def _set_generation(value: Optional[int]):
+    global _generation, _generation_read_at
+    _generation = value
+    _generation_read_at = time.monotonic() if value is not None else 0.0
+
+def _current_generation() -> Optional[int]:
+    """
+    Return the shared search generation, or None if it cannot be read.
+    The value is re-read from Neo4j at most every SEARCH_GENERATION_REFRESH_MS.
+    """
+    with _generation_lock:
+        if _generation is not None and (time.monotonic() - _generation_read_at) * 1000 < SEARCH_GENERATION_REFRESH_MS:
+            return _generation
+        try:
+            _set_generation(cache_generation.get_generation(get_db_manager(), SEARCH_GENERATION))
+        except Exception as e:
+            logging.getLogger(__name__).warning("Could not read the search cache generation: %s", str(e))
+            _set_generation(None)
+        return _generation
+
+def invalidate_search_cache():
+    """Invalidate the cached search results of every process after the knowledge graph changed."""
+    with _generation_lock:
+        try:
+            _set_generation(cache_generation.bump_generation(get_db_manager(), SEARCH_GENERATION))
+        except Exception as e:
+            logging.getLogger(__name__).warning(
+                "Could not bump the search cache generation, other processes may serve stale results "
+                "for up to %d seconds: %s", SEARCH_CACHE_TTL, str(e)
+            )
+            _set_generation(None)
+    with _search_cache_lock:
+        _search_cache.clear()
+
+def clear_search_cache():
+    """
+    Drop all cached search results and reset this process's hit/miss counters.
+    Bumping the shared generation also retires the entries cached by every other process.
+    """
+    invalidate_search_cache()
+    with _search_cache_lock:
+        _search_cache.clear()
+        _search_cache_stats["hits"] = 0
+        _search_cache_stats["misses"] = 0
+
+def get_search_cache_stats() -> dict:
+    """Return the current size and hit/miss counters of the search cache."""
+    with _search_cache_lock:
+        return {
+            "size": len(_search_cache),
+            "maxsize": _search_cache.maxsize,
+            "ttl": _search_cache.ttl,
+            "generation": _current_generation(),
+            **_search_cache_stats
+        }
+
+def _search_cache_key(query_text: str, node_type: str, k: int, min_score: float, generation: int) -> bytes:
+    payload = {
+        "query_text": query_text,
+        "node_type": node_type,
+        "k": k,
+        "min_score": min_score,
+        "generation": generation
+    }
+    return hashlib.blake2b(json.dumps(payload, sort_keys=True).encode()).digest()
+
+def _format_document_result(prefix: str, document) -> str:
+    """Format an ingested document's summary for display."""
+    parts = [
+        f"{prefix}{document.file_name}\n",
+        f"Document ID: {document.id}\n",
+        f"Content Type: {document.content_type}\n",
+        f"Status: {document.conversion_status}\n",
+        f"Description: {document.description}\n\n",
+        f"Summary: {document.summary}\n\n",
+        f"Entities extracted ({len(document.entities)}):\n"
+    ]
+    parts.extend(f"- {entity}\n" for entity in document.entities)
+    if document.error_message:
+        parts.append(f"\nWarnings/Errors: {document.error_message}\n")
+    return "".join(parts)
+
+def ingest_text(text, instructions=""):
+    """Ingest text as a document and return its summary; raises if ingestion fails."""
     if not text.strip():
-        return "No text provided."
+        raise ValueError("No text provided.")
     logger = logging.getLogger(__name__)
     logger.info("Processing text input of length %d", len(text))
-    db_manager = Neo4jManager()
-    db_manager.connect()
+    pipeline = _get_pipeline(get_db_manager())
+    document = pipeline.process_text(text, instructions)
+    result = _format_document_result("Processed text as document: ", document)
+    invalidate_search_cache()
+    logger.info("Successfully processed text input as document")
+    return result
+
+def ingest_document_file(file_path):
+    """Ingest a document file and return its summary; raises if ingestion fails."""
+    if not file_path:
+        raise ValueError("No file provided.")
+    logger = logging.getLogger(__name__)
+    logger.info("Processing document file: %s", file_path)
+    pipeline = _get_pipeline(get_db_manager())
+    document = pipeline.process_document(file_path)
+    result = _format_document_result("Processed document: ", document)
+    invalidate_search_cache()
+    logger.info("Successfully processed document file")
+    return result
+
+def process_text_input_core(text, instructions=""):
+    if not text.strip():
+        return "No text provided."
     try:
-        temp_dir = os.path.join(os.getcwd(), "knowledge_nexus_files")
-        os.makedirs(temp_dir, exist_ok=True)
-        file_id = str(uuid.uuid4())
-        temp_filename = f"{file_id}_text_input.txt"
-        file_path = os.path.join(temp_dir, temp_filename)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            if instructions:
-                f.write(f"Instructions: {instructions}\n\n")
-            f.write(text)
-        logger.info(f"Saved text input to temporary file: {file_path}")
-        pipeline = KnowledgeNexusPipeline(db_manager)
-        document = pipeline.process_document(file_path)
-        result = f"Processed text as document: {document.file_name}\n"
-        result += f"Document ID: {document.id}\n"
-        result += f"Content Type: {document.content_type}\n"
-        result += f"Status: {document.conversion_status}\n"
-        result += f"Description: {document.description}\n\n"
-        result += f"Summary: {document.summary}\n\n"
-        result += f"Entities extracted ({len(document.entities)}):\n"
-        for entity in document.entities:
-            result += f"- {entity}\n"
-        if document.error_message:
-            result += f"\nWarnings/Errors: {document.error_message}\n"
-        logger.info("Successfully processed text input as document")
-        return result
+        return ingest_text(text, instructions)
     except Exception as e:
-        logger.error("Error processing text input: %s", str(e))
+        logging.getLogger(__name__).error("Error processing text input: %s", str(e))
         return f"Error: {str(e)}"
-    finally:
-        db_manager.close()
 
 def process_document_file_core(file_path):
     if not file_path:
         return "No file provided."
-    logger = logging.getLogger(__name__)
-    logger.info("Processing document file: %s", file_path)
-    db_manager = Neo4jManager()
-    db_manager.connect()
     try:
-        pipeline = KnowledgeNexusPipeline(db_manager)
-        document = pipeline.process_document(file_path)
-        result = f"Processed document: {document.file_name}\n"
-        result += f"Document ID: {document.id}\n"
-        result += f"Content Type: {document.content_type}\n"
-        result += f"Status: {document.conversion_status}\n"
-        result += f"Description: {document.description}\n\n"
-        result += f"Summary: {document.summary}\n\n"
-        result += f"Entities extracted ({len(document.entities)}):\n"
-        for entity in document.entities:
-            result += f"- {entity}\n"
-        if document.error_message:
-            result += f"\nWarnings/Errors: {document.error_message}\n"
-        logger.info("Successfully processed document file")
-        return result
+        return ingest_document_file(file_path)
     except Exception as e:
-        logger.error("Error processing document file: %s", str(e))
+        logging.getLogger(__name__).error("Error processing document file: %s", str(e))
         return f"Error: {str(e)}"
-    finally:
-        db_manager.close()
+
+def submit_ingest_job(kind: str) -> str:
+    """Record a queued ingestion job and return its id."""
+    job_id = str(uuid.uuid4())
+    jobs.create_job(get_db_manager(), job_id, kind)
+    return job_id
+
+def run_ingest_job(job_id: str, func, *args):
+    """
+    Run an ingestion function for a queued job, recording its outcome.
+    func returns the result text on success and raises on failure. Any
+    exception, including one while marking the job running, records the job
+    as failed.
+    """
+    logger = logging.getLogger(__name__)
+    try:
+        db_manager = get_db_manager()
+        jobs.update_job(db_manager, job_id, "running")
+        result = func(*args)
+    except Exception as e:
+        logger.error("Ingestion job %s failed: %s", job_id, str(e))
+        _record_job_outcome(job_id, "failed", f"Error: {str(e)}")
+        return
+    _record_job_outcome(job_id, "finished", result)
+
+def _record_job_outcome(job_id: str, status: str, result: str):
+    try:
+        jobs.update_job(get_db_manager(), job_id, status, result)
+    except Exception as e:
+        # The job is expired as failed once INGEST_JOB_TIMEOUT passes
+        logging.getLogger(__name__).error("Could not record the outcome of job %s: %s", job_id, str(e))
+
+def get_ingest_job(job_id: str):
+    """
+    Return the stored state of an ingestion job, or None if it is unknown.
+    A job still queued or running after INGEST_JOB_TIMEOUT seconds, for example
+    because its worker restarted, is reported and recorded as failed.
+    """
+    db_manager = get_db_manager()
+    jobs.fail_stale_jobs(db_manager, INGEST_JOB_TIMEOUT, job_id)
+    return jobs.get_job(db_manager, job_id)
 
 def search_knowledge_core(query_text: str, node_type: str = "ALL", k: int = 10, min_score: float = 0.5):
-    if not query_text.strip():
+    # Queries differing only in whitespace share the result cache entry and
+    # the cached query embedding
+    query_text = " ".join(query_text.split())
+    if not query_text:
         return "No search query provided."
     logger = logging.getLogger(__name__)
-    db_manager = Neo4jManager()
-    db_manager.connect()
+    generation = _current_generation()
+    key = None if generation is None else _search_cache_key(query_text, node_type, k, min_score, generation)
+    with _search_cache_lock:
+        cached = _search_cache.get(key) if key is not None else None
+        if cached is not None:
+            _search_cache_stats["hits"] += 1
+            return cached
+        _search_cache_stats["misses"] += 1
     try:
-        query_embedding = get_embedding(query_text)
-        with db_manager.get_session() as session:
-            results = knowledge_search.search_knowledge(
-                session=session,
-                query_embedding=query_embedding,
-                node_type=node_type if node_type != "ALL" else None,
-                k=k,
-                min_score=min_score
-            )
-        if not results:
-            return f"No matching {node_type.lower() if node_type else 'knowledge'} found with similarity >= {min_score}."
-        output = f"Search Results for {node_type} (showing top {k} results with similarity >= {min_score}):\n\n"
-        for node in results:
-            node_types = node.get("types", [node_type]) if "types" in node else [node_type]
-            node_type_str = ", ".join(node_types)
-            similarity = node.get("similarity", "N/A")
-            if "Memory" in node_types:
-                content = node.get("content", "No content")
-                confidence = node.get("confidence", "N/A")
-                sentiment = node.get("sentiment", "N/A")
-                tags = node.get("tags", [])
-                output += (
-                    f"Type: {node_type_str}\n"
-                    f"Content: {content}\n"
-                    f"Confidence: {confidence}\n"
-                    f"Similarity: {similarity:.4f}\n"
-                    f"Sentiment: {sentiment}\n"
-                    f"Tags: {tags}\n"
-                )
-            elif "Document" in node_types:
-                title = node.get("file_name", "Untitled")
-                description = node.get("description", "No description")
-                output += (
-                    f"Type: {node_type_str}\n"
-                    f"Title: {title}\n"
-                    f"Description: {description}\n"
-                    f"Similarity: {similarity:.4f}\n"
-                )
-            else:
-                output += f"Type: {node_type_str}\n"
-                for key, value in node.items():
-                    if key not in ["embedding", "types", "similarity"] and not key.startswith("_"):
-                        output += f"{key}: {value}\n"
-                output += f"Similarity: {similarity:.4f}\n"
-            output += "---\n"
-        return output
+        output = _search_knowledge(query_text, node_type, k, min_score)
     except Exception as e:
         logger.error("Error during knowledge search: %s", str(e))
         return f"Error during search: {str(e)}"
-    finally:
-        db_manager.close() 
\ No newline at end of file
+    if key is not None:
+        with _search_cache_lock:
+            _search_cache[key] = output
+    return output
+
+def _search_knowledge(query_text: str, node_type: str, k: int, min_score: float) -> str:
+    db_manager = get_db_manager()
+    query_embedding = get_embedding(query_text)
+    with db_manager.get_session() as session:
+        results = knowledge_search.search_knowledge(
+            session=session,
+            query_embedding=query_embedding,
+            node_type=node_type if node_type != "ALL" else None,
+            k=k,
+            min_score=min_score
+        )
+    if not results:
+        return f"No matching {node_type.lower() if node_type else 'knowledge'} found with similarity >= {min_score}."
+    parts = [f"Search Results for {node_type} (showing top {k} results with similarity >= {min_score}):\n\n"]
+    for node in results:
+        node_types = node.get("types", [node_type]) if "types" in node else [node_type]
+        node_type_str = ", ".join(node_types)
+        similarity = node.get("similarity", "N/A")
+        if "Memory" in node_types:
+            content = node.get("content", "No content")
+            confidence = node.get("confidence", "N/A")
+            sentiment = node.get("sentiment", "N/A")
+            tags = node.get("tags", [])
+            parts.append(
+                f"Type: {node_type_str}\n"
+                f"Content: {content}\n"
+                f"Confidence: {confidence}\n"
+                f"Similarity: {similarity:.4f}\n"
+                f"Sentiment: {sentiment}\n"
+                f"Tags: {tags}\n"
+            )
+        elif "Document" in node_types:
+            title = node.get("file_name", "Untitled")
+            description = node.get("description", "No description")
+            parts.append(
+                f"Type: {node_type_str}\n"
+                f"Title: {title}\n"
+                f"Description: {description}\n"
+                f"Similarity: {similarity:.4f}\n"
+            )
+        else:
+            parts.append(f"Type: {node_type_str}\n")
+            parts.extend(
+                f"{key}: {value}\n" for key, value in node.items()
+                if key not in ["embedding", "types", "similarity"] and not key.startswith("_")
+            )
+            parts.append(f"Similarity: {similarity:.4f}\n")
+        parts.append("---\n")
+    return "".join(parts)
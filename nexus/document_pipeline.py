@@ -2,12 +2,13 @@
 Document processing pipeline for KnowledgeNexus.
 Handles document ingestion, conversion, and entity extraction.
 """
+import asyncio
 import logging
 from typing import List, Optional
 from pathlib import Path
 
 from db.db_manager import Neo4jManager
-from db import documents
+from db import documents, embedding_cache, knowledge_search, topics
 from models.document import Document
 from document_converter import DocumentConverter
 from nexus.entity_resolution import EntityResolutionPipeline
@@ -15,6 +16,9 @@ from nexus.entity_processing import EntityProcessingPipeline
 
 logger = logging.getLogger(__name__)
 
+# Number of documents converted and extracted concurrently in a directory run
+DEFAULT_CONCURRENCY = 8
+
 class DocumentProcessingPipeline:
     """
     Pipeline for processing documents through KnowledgeNexus.
@@ -54,19 +58,12 @@ class DocumentProcessingPipeline:
             storage_dir=self.storage_dir
         )
         
-        # Create vector index for document embeddings
-        try:
-            from db.vector_index import create_vector_index
-            create_vector_index(
-                self.db_manager.driver,
-                label="Document",
-                property="embedding",
-                dimensions=3072  # text-embedding-3-large dimensions
-            )
-            logger.info("Vector index created for Document embeddings")
-        except Exception as e:
-            logger.error("Failed to create vector index: %s", str(e))
-            # Don't raise, we can still proceed with document processing
+        # Create the Entity, Memory and Document vector indexes searches use
+        knowledge_search.setup_search_indexes(self.db_manager)
+        
+        documents.setup_document_infrastructure(self.db_manager)
+        topics.setup_topic_infrastructure(self.db_manager)
+        embedding_cache.setup_embedding_cache(self.db_manager)
         
         logger.info("Document processing pipeline initialized")
     
@@ -92,30 +89,100 @@ class DocumentProcessingPipeline:
             logger.error("Failed to process document %s: %s", file_path, str(e))
             raise
     
-    def process_directory(self, directory_path: str) -> List[Document]:
+    def process_batch(self, file_paths: List[str]) -> List[Document]:
+        """
+        Process a group of files together, e.g. a burst of files dropped into a
+        watched folder. They share one embedding request and one Neo4j write
+        transaction instead of paying for both once per file.
+        
+        Args:
+            file_paths: Paths of the documents to process
+            
+        Returns:
+            List[Document]: List of processed documents
+        """
+        logger.info("Processing batch of %d documents", len(file_paths))
+        # One unreadable file should not lose the rest of the batch
+        results = self.document_converter.store_files_and_convert(file_paths, return_exceptions=True)
+        processed_documents = []
+        for file_path, result in zip(file_paths, results):
+            if isinstance(result, Exception):
+                logger.error("Failed to process %s: %s", file_path, str(result))
+            else:
+                processed_documents.append(result)
+        return processed_documents
+    
+    def process_text(self, text: str, instructions: str = "") -> Document:
+        """
+        Process text held in memory as a document, without writing it to a temporary file first.
+        
+        Args:
+            text: The text to process
+            instructions: Optional instructions, stored ahead of the text
+            
+        Returns:
+            Document: Processed document with metadata and extracted information
+        """
+        logger.info("Processing text input of length %d", len(text))
+        content = f"Instructions: {instructions}\n\n{text}" if instructions else text
+        try:
+            document = self.document_converter.store_text_and_convert(content)
+            logger.info("Text processed successfully as document: %s", document.id)
+            return document
+        except Exception as e:
+            logger.error("Failed to process text input: %s", str(e))
+            raise
+    
+    async def process_document_async(self, file_path: str) -> Document:
+        """
+        Process a single document in a worker thread so several documents can
+        be in flight at once.
+        
+        Args:
+            file_path: Path to the document to process
+            
+        Returns:
+            Document: Processed document with metadata and extracted information
+        """
+        return await asyncio.to_thread(self.process_document, file_path)
+    
+    def process_directory(self, directory_path: str, concurrency: int = DEFAULT_CONCURRENCY) -> List[Document]:
         """
         Process all supported documents in a directory.
         
         Args:
             directory_path: Path to directory containing documents
+            concurrency: Maximum number of documents processed at the same time
+            
+        Returns:
+            List[Document]: List of processed documents
+        """
+        return asyncio.run(self.process_directory_async(directory_path, concurrency))
+    
+    async def process_directory_async(self, directory_path: str, concurrency: int = DEFAULT_CONCURRENCY) -> List[Document]:
+        """
+        Process all supported documents in a directory, up to `concurrency` at a time.
+        
+        Args:
+            directory_path: Path to directory containing documents
+            concurrency: Maximum number of documents processed at the same time
             
         Returns:
             List[Document]: List of processed documents
         """
         logger.info("Processing directory: %s", directory_path)
         
+        file_paths = [str(path) for path in Path(directory_path).rglob('*') if path.is_file()]
+        results = await self.document_converter.astore_files(file_paths, concurrency, return_exceptions=True)
+        
         processed_documents = []
         failed_files = []
-        
-        # Process each file in the directory
-        for file_path in Path(directory_path).rglob('*'):
-            if file_path.is_file():
-                try:
-                    document = self.process_document(str(file_path))
-                    processed_documents.append(document)
-                except Exception as e:
-                    logger.error("Failed to process %s: %s", file_path, str(e))
-                    failed_files.append((str(file_path), str(e)))
+        for file_path, result in zip(file_paths, results):
+            if isinstance(result, Exception):
+                logger.error("Failed to process %s: %s", file_path, str(result))
+                failed_files.append((file_path, str(result)))
+            else:
+                processed_documents.append(result)
         
         # Log summary
         logger.info("Directory processing complete. Processed: %d, Failed: %d",
@@ -1,18 +1,133 @@
 """
 Entity processing pipeline for KnowledgeNexus.
 """
+import asyncio
+import dataclasses
+import json
 import logging
-from typing import List
-from openai import OpenAI
+import time
+from typing import Any, Dict, Iterator, List, Optional
+from openai import OpenAI, AsyncOpenAI
+from openai.lib._pydantic import to_strict_json_schema
+from pydantic import BaseModel
 from db.db_manager import Neo4jManager
 from models.entities import ExtractedEntities, EntitySchema
+from models.topic import TopicSchema
 from models.relationship import Relationships, RelationshipSchema
 from nexus.entity_resolution import Entity, EntityResolutionPipeline
 from db import entities as db_entities
+from db.vector_utils import get_embeddings
 
 logger = logging.getLogger(__name__)
 client = OpenAI()
 
+# Extraction requests allowed in flight at once by extract_entities_batch
+DEFAULT_EXTRACTION_CONCURRENCY = 10
+# Seconds between status checks of an OpenAI Batch API job
+BATCH_POLL_INTERVAL = 30
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+# Documents longer than this many characters are extracted in overlapping
+# windows that are sent concurrently
+EXTRACTION_CHUNK_CHARS = 64 * 1024
+EXTRACTION_CHUNK_OVERLAP = 1024
+# Most windows extracted per document. Entity density plateaus on very long
+# documents, so beyond this the first and last windows are kept and the rest
+# are sampled evenly.
+MAX_EXTRACTION_WINDOWS = 16
+# Repeated paragraphs (page headers, footers, boilerplate) at least this long
+# are extracted once
+DEDUPE_PARAGRAPH_CHARS = 40
+
+EXTRACTION_SYSTEM_PROMPT = (
+    "You are an expert text analysis assistant. Extract all relevant entities, topics, and memories from the text. "
+    "For entities, identify their 'name', 'entity_type', and optionally 'aliases'. "
+    "For topics, identify the main subjects discussed, and provide a 'name', and optionally 'aliases' and 'notes'. "
+    "For memories, extract key snippets of knowledge as 'content' with a 'confidence' score. "
+)
+
+# Just the parts of a Batch API output line that are read back; decoding a
+# line straight into these skips building intermediate dicts
+class _BatchMessage(BaseModel):
+    content: Optional[str] = None
+
+class _BatchChoice(BaseModel):
+    message: _BatchMessage
+
+class _BatchBody(BaseModel):
+    choices: List[_BatchChoice] = []
+
+class _BatchResponse(BaseModel):
+    status_code: int
+    body: Optional[_BatchBody] = None
+
+class _BatchOutputLine(BaseModel):
+    custom_id: str
+    response: Optional[_BatchResponse] = None
+    error: Optional[Any] = None
+
+def _extraction_messages(text: str, instructions: str) -> List[dict]:
+    return [
+        {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Text: {text}\nInstructions: {instructions}"}
+    ]
+
+def _text_windows(text: str, size: int, overlap: int) -> Iterator[str]:
+    """Yield windows of `size` characters, each starting `size - overlap` after the previous one."""
+    step = max(size - overlap, 1)
+    for start in range(0, len(text), step):
+        yield text[start:start + size]
+        if start + size >= len(text):
+            break
+
+def _sample_windows(windows: List[str], limit: int) -> List[str]:
+    """Keep at most `limit` windows, always including the first and last, spaced evenly."""
+    if len(windows) <= limit:
+        return windows
+    if limit <= 1:
+        return windows[:limit]
+    step = (len(windows) - 1) / (limit - 1)
+    return [windows[round(i * step)] for i in range(limit)]
+
+def _dedupe_paragraphs(text: str, min_chars: int = DEDUPE_PARAGRAPH_CHARS) -> str:
+    """Drop repeats of paragraphs of at least `min_chars` characters, ignoring case and spacing."""
+    seen = set()
+    kept = []
+    for paragraph in text.split("\n\n"):
+        if len(paragraph) >= min_chars:
+            key = " ".join(paragraph.lower().split())
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(paragraph)
+    return "\n\n".join(kept)
+
+def _merge_extractions(results: List[ExtractedEntities]) -> ExtractedEntities:
+    """Combine per-window extractions, merging entities and topics reported by several windows."""
+    entities: Dict[str, EntitySchema] = {}
+    topics: Dict[str, TopicSchema] = {}
+    memories = {}
+    for result in results:
+        for entity in result.entities:
+            existing = entities.get(entity.name.lower())
+            if existing is None:
+                entities[entity.name.lower()] = dataclasses.replace(entity)
+            else:
+                existing.aliases = list(dict.fromkeys(existing.aliases + entity.aliases))
+                existing.notes = list(dict.fromkeys(existing.notes + entity.notes))
+        for topic in result.topics:
+            existing = topics.get(topic.name.lower())
+            if existing is None:
+                topics[topic.name.lower()] = dataclasses.replace(topic)
+            else:
+                existing.aliases = list(dict.fromkeys(existing.aliases + topic.aliases))
+        for memory in result.memories:
+            memories.setdefault(memory.content, memory)
+    return ExtractedEntities(
+        entities=list(entities.values()),
+        topics=list(topics.values()),
+        memories=list(memories.values())
+    )
+
 class EntityProcessingPipeline:
     def __init__(self, db_manager: Neo4jManager, resolution_pipeline: EntityResolutionPipeline):
         self.db_manager = db_manager
@@ -24,21 +139,10 @@ class EntityProcessingPipeline:
         Each entity should have at least 'name' and 'entity_type', and optionally 'aliases'.
         Each topic should have at least 'name', and optionally 'aliases' and 'notes'.
         """
-        system_prompt = (
-            "You are an expert text analysis assistant. Extract all relevant entities, topics, and memories from the text. "
-            "For entities, identify their 'name', 'entity_type', and optionally 'aliases'. "
-            "For topics, identify the main subjects discussed, and provide a 'name', and optionally 'aliases' and 'notes'. "
-            "For memories, extract key snippets of knowledge as 'content' with a 'confidence' score. "
-            
-        )
-        user_prompt = f"Text: {text}\nInstructions: {instructions}"
         try:
             response = client.beta.chat.completions.parse(
                 model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+                messages=_extraction_messages(text, instructions),
                 temperature=0.0,
                 response_format=ExtractedEntities,
             )
@@ -49,6 +153,138 @@ class EntityProcessingPipeline:
             logger.error("Failed to extract entities, topics, and memories: %s", e)
             return ExtractedEntities(entities=[], topics=[], memories=[]) 
 
+    async def extract_entities_from_text_async(self, text: str, instructions: str = "",
+                                               async_client: Optional[AsyncOpenAI] = None) -> ExtractedEntities:
+        """Async variant of extract_entities_from_text, so many extractions can wait on the API at once."""
+        if async_client is None:
+            async with AsyncOpenAI() as own_client:
+                return await self.extract_entities_from_text_async(text, instructions, own_client)
+        try:
+            response = await async_client.beta.chat.completions.parse(
+                model="gpt-4o-mini",
+                messages=_extraction_messages(text, instructions),
+                temperature=0.0,
+                response_format=ExtractedEntities,
+            )
+            return response.choices[0].message.parsed
+        except Exception as e:
+            logger.error("Failed to extract entities, topics, and memories: %s", e)
+            return ExtractedEntities(entities=[], topics=[], memories=[])
+
+    def extract_entities_from_document(self, text: str, instructions: str = "",
+                                       chunk_size: int = EXTRACTION_CHUNK_CHARS,
+                                       overlap: int = EXTRACTION_CHUNK_OVERLAP) -> ExtractedEntities:
+        """Extract entities, topics, and memories from a document of any length.
+        Blank texts return an empty result without a call. Texts up to `chunk_size` characters
+        take a single call; longer ones have repeated paragraphs removed and are split into
+        overlapping windows that are extracted concurrently and merged, so each request stays
+        small and the calls wait on the API together. At most MAX_EXTRACTION_WINDOWS windows
+        are extracted, sampled evenly across the document.
+        """
+        if not text or text.isspace():
+            return ExtractedEntities(entities=[], topics=[], memories=[])
+        if len(text) <= chunk_size:
+            return self.extract_entities_from_text(text, instructions)
+        text = _dedupe_paragraphs(text)
+        if len(text) <= chunk_size:
+            return self.extract_entities_from_text(text, instructions)
+        windows = list(_text_windows(text, chunk_size, overlap))
+        sampled = _sample_windows(windows, MAX_EXTRACTION_WINDOWS)
+        logger.info("Extracting entities from %d of %d windows of a %d character document",
+                    len(sampled), len(windows), len(text))
+        return _merge_extractions(self.extract_entities_batch(sampled, instructions))
+
+    def extract_entities_batch(self, texts: List[str], instructions: str = "",
+                               concurrency: int = DEFAULT_EXTRACTION_CONCURRENCY,
+                               mode: str = "online") -> List[ExtractedEntities]:
+        """Extract entities from many texts with up to `concurrency` requests in flight.
+        Rate-limit (429) and server errors are retried by the client with exponential backoff.
+        With mode="batch" the texts are submitted as one OpenAI Batch API job instead, which
+        is cheaper for large backfills but may take up to 24 hours.
+        Results are returned in the order of `texts`.
+        """
+        if mode == "batch":
+            return self.extract_entities_batch_offline(texts, instructions)
+        if mode != "online":
+            raise ValueError(f"Unknown extraction mode: {mode}")
+
+        async def run_batch() -> List[ExtractedEntities]:
+            semaphore = asyncio.Semaphore(concurrency)
+            async with AsyncOpenAI(max_retries=5) as async_client:
+                async def extract_one(text: str) -> ExtractedEntities:
+                    async with semaphore:
+                        return await self.extract_entities_from_text_async(text, instructions, async_client)
+                return await asyncio.gather(*(extract_one(text) for text in texts))
+
+        return asyncio.run(run_batch())
+
+    def extract_entities_batch_offline(self, texts: List[str], instructions: str = "",
+                                       poll_interval: float = BATCH_POLL_INTERVAL) -> List[ExtractedEntities]:
+        """Extract entities from many texts through the OpenAI Batch API.
+        Blocks until the batch job reaches a terminal state. Texts whose request failed
+        get an empty ExtractedEntities, as with the online extraction.
+        """
+        if not texts:
+            return []
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "ExtractedEntities",
+                "schema": to_strict_json_schema(ExtractedEntities),
+                "strict": True
+            }
+        }
+        lines = [
+            json.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": "gpt-4o-mini",
+                    "messages": _extraction_messages(text, instructions),
+                    "temperature": 0.0,
+                    "response_format": response_format
+                }
+            })
+            for i, text in enumerate(texts)
+        ]
+        batch_input = client.files.create(
+            file=("extraction_batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = client.batches.create(
+            input_file_id=batch_input.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info("Submitted extraction batch %s with %d requests", batch.id, len(texts))
+        while batch.status not in BATCH_TERMINAL_STATUSES:
+            time.sleep(poll_interval)
+            batch = client.batches.retrieve(batch.id)
+        logger.info("Extraction batch %s finished with status %s", batch.id, batch.status)
+
+        results = [ExtractedEntities(entities=[], topics=[], memories=[]) for _ in texts]
+        if not batch.output_file_id:
+            logger.error("Extraction batch %s produced no output", batch.id)
+            return results
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = _BatchOutputLine.model_validate_json(line)
+            except Exception as e:
+                logger.error("Failed to parse extraction batch line: %s", e)
+                continue
+            if record.response is None or record.response.status_code != 200:
+                logger.error("Extraction request %s failed: %s", record.custom_id, record.error)
+                continue
+            try:
+                content = record.response.body.choices[0].message.content
+                results[int(record.custom_id)] = ExtractedEntities.model_validate_json(content)
+            except Exception as e:
+                logger.error("Failed to parse extraction result %s: %s", record.custom_id, e)
+        return results
+
     def process_extracted_entities(self, extracted_entities: ExtractedEntities) -> List[Entity]:
         """
         Process extracted entities through resolution pipeline and update the database.
@@ -57,34 +293,56 @@ class EntityProcessingPipeline:
         logger.info("Processing %d extracted entities", len(extracted_entities.entities))
         final_entities = []
         
+        # The LLM often reports the same entity several times (once per mention);
+        # resolve each distinct name only once since every pass costs embedding
+        # calls, a similarity search and a database write.
+        unique_schemas = {}
         for entity_schema in extracted_entities.entities:
+            unique_schemas.setdefault(entity_schema.name.strip().lower(), entity_schema)
+        if len(unique_schemas) < len(extracted_entities.entities):
+            logger.info("Collapsed %d entity mentions into %d distinct entities",
+                        len(extracted_entities.entities), len(unique_schemas))
+        
+        # Entities resolved so far are candidates for the ones that follow, since
+        # nothing is written until the whole batch is resolved
+        pending_rows = {}
+        # Embed every distinct name in one request; stored entities are embedded
+        # by their lowercase name, so new names are compared the same way
+        name_embeddings = get_embeddings([name for name in unique_schemas]) if unique_schemas else []
+        for entity_schema, embedding in zip(unique_schemas.values(), name_embeddings):
             # Convert EntitySchema to Entity
             new_entity = Entity(
                 name=entity_schema.name,
-                aliases=[]  # Start with empty aliases, could be enhanced later
+                aliases=[],  # Start with empty aliases, could be enhanced later
+                embedding=embedding
             )
             
             # Search for existing entities with similar names
-            existing_entities_data = db_entities.search_similar_entities(self.db_manager, new_entity.name)
+            existing_entities_data = db_entities.search_similar_entities(
+                self.db_manager, new_entity.name, query_embedding=embedding
+            )
             existing_entities = [
-                Entity(name=data["name"], aliases=data.get("aliases", []))
+                Entity(name=data["name"], aliases=data.get("aliases") or [], embedding=data.get("embedding"))
                 for data in existing_entities_data
             ]
+            existing_entities.extend(final_entities)
             
             # Run through resolution pipeline
             resolved_entity = self.resolution_pipeline.resolve_entities(new_entity, existing_entities)
             
-            # Update or create in database
-            db_entities.update_entity(
-                self.db_manager,
-                name=resolved_entity.name,
-                aliases=resolved_entity.aliases,
-                entity_type=entity_schema.entity_type
-            )
-            
+            pending_rows[resolved_entity.name.lower()] = {
+                "name": resolved_entity.name,
+                "aliases": resolved_entity.aliases,
+                "entity_type": entity_schema.entity_type,
+                # Only a new entity's embedding is of its own lowercase name
+                "embedding": embedding if resolved_entity is new_entity else None
+            }
             final_entities.append(resolved_entity)
             logger.info("Processed entity: %s", resolved_entity.name)
         
+        # Update or create all resolved entities in one batched write
+        db_entities.update_entities(self.db_manager, list(pending_rows.values()))
+        
         return final_entities
 
     # Removed duplicate relationship inference methods (infer_relationships and infer_and_store_relationships) to consolidate relationship inference in DocumentConverter 
\ No newline at end of file
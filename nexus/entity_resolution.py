@@ -1,8 +1,9 @@
 import logging
 import difflib
+import numpy as np
 from openai import OpenAI
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import json
 
 logger = logging.getLogger(__name__)
@@ -14,6 +15,8 @@ class Entity(BaseModel):
     id: Optional[int] = None
     name: str
     aliases: List[str] = []
+    # Name embedding, kept so resolution does not re-embed known entities
+    embedding: Optional[List[float]] = Field(default=None, exclude=True, repr=False)
 
 
 class AIResolutionResult(BaseModel):
@@ -26,11 +29,17 @@ class EntityResolutionPipeline:
     def __init__(self, threshold: float = 0.95):
         self.threshold = threshold
 
+    def get_entity_embedding(self, entity: Entity) -> List[float]:
+        """Return the entity's name embedding, computing and remembering it if missing."""
+        if entity.embedding is None:
+            from db.vector_utils import get_embedding
+            entity.embedding = get_embedding(entity.name)
+        return entity.embedding
+
     def compute_similarity(self, entity_a: Entity, entity_b: Entity) -> float:
-        from db.vector_utils import get_embedding
-        from db.memories import cosine_similarity
-        emb_a = get_embedding(entity_a.name)
-        emb_b = get_embedding(entity_b.name)
+        from db.vector_utils import cosine_similarity
+        emb_a = np.asarray(self.get_entity_embedding(entity_a), dtype=np.float32)
+        emb_b = np.asarray(self.get_entity_embedding(entity_b), dtype=np.float32)
         sim = cosine_similarity(emb_a, emb_b)
         logger.debug("Computed embedding similarity between '%s' and '%s': %.2f", entity_a.name, entity_b.name, sim)
         return sim
@@ -75,7 +84,7 @@ class EntityResolutionPipeline:
             result = completion.choices[0].message.parsed
             
             logger.info("AI resolution result for '%s' and '%s': %s",
-                        entity_a.name, entity_b.name, result.dict())
+                        entity_a.name, entity_b.name, result)
             return result
             
         except Exception as e:
@@ -95,14 +104,28 @@ class EntityResolutionPipeline:
         name = entity_a.name if len(entity_a.name) >= len(entity_b.name) else entity_b.name
         aliases = list(set(entity_a.aliases + entity_b.aliases))
         merged_entity = Entity(name=name, aliases=aliases)
-        logger.info("Merged entity: %s", merged_entity.dict())
+        logger.info("Merged entity: %s", merged_entity)
         return merged_entity
 
     def resolve_entities(self, new_entity: Entity, existing_entities: List[Entity]) -> Entity:
-        for existing in existing_entities:
-            sim = self.compute_similarity(new_entity, existing)
-            logger.info("Similarity between '%s' and '%s': %.2f", new_entity.name, existing.name, sim)
-            if sim >= self.threshold:
+        if existing_entities:
+            from db.vector_utils import cosine_similarities, get_embeddings
+            # Embed every entity still missing a vector in one request rather
+            # than one request per candidate
+            missing = [entity for entity in [new_entity, *existing_entities] if entity.embedding is None]
+            if missing:
+                for entity, embedding in zip(missing, get_embeddings([entity.name for entity in missing])):
+                    entity.embedding = embedding
+            query = self.get_entity_embedding(new_entity)
+            candidates = np.asarray(
+                [self.get_entity_embedding(existing) for existing in existing_entities],
+                dtype=np.float32
+            )
+            sims = cosine_similarities(query, candidates)
+            matches = np.flatnonzero(sims >= self.threshold)
+            if matches.size:
+                existing = existing_entities[matches[0]]
+                sim = float(sims[matches[0]])
                 logger.info("Similarity (%.2f) above threshold for '%s'. Merging with '%s'.", sim, new_entity.name, existing.name)
                 merged = self.merge_entities(new_entity, existing)
                 existing_entities.remove(existing)
@@ -6,7 +6,7 @@ from typing import List, Optional
 from db.db_manager import Neo4jManager
 from nexus.entity_resolution import EntityResolutionPipeline
 from nexus.entity_processing import EntityProcessingPipeline
-from nexus.document_pipeline import DocumentProcessingPipeline
+from nexus.document_pipeline import DocumentProcessingPipeline, DEFAULT_CONCURRENCY
 
 logger = logging.getLogger(__name__)
 
@@ -52,17 +52,42 @@ class KnowledgeNexusPipeline:
         """
         return self.document_pipeline.process_document(file_path)
     
-    def process_directory(self, directory_path: str) -> List[dict]:
+    def process_batch(self, file_paths: List[str]) -> List[dict]:
+        """
+        Process a group of documents with shared embedding and database writes.
+        
+        Args:
+            file_paths: Paths of the documents to process
+            
+        Returns:
+            List[dict]: List of document records for successfully processed files
+        """
+        return self.document_pipeline.process_batch(file_paths)
+    
+    async def process_document_async(self, file_path: str) -> dict:
+        """
+        Process a single document without blocking the event loop.
+        
+        Args:
+            file_path: Path to the document to process
+            
+        Returns:
+            dict: Document record with metadata and extracted information
+        """
+        return await self.document_pipeline.process_document_async(file_path)
+    
+    def process_directory(self, directory_path: str, concurrency: int = DEFAULT_CONCURRENCY) -> List[dict]:
         """
         Process all supported documents in a directory.
         
         Args:
             directory_path: Path to directory containing documents
+            concurrency: Maximum number of documents processed at the same time
             
         Returns:
             List[dict]: List of document records for successfully processed files
         """
-        return self.document_pipeline.process_directory(directory_path)
+        return self.document_pipeline.process_directory(directory_path, concurrency)
     
     def get_document_entities(self, document_id: str) -> List[str]:
         """
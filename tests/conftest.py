@@ -1,7 +1,87 @@
 import sys
 import os
+import threading
+from types import SimpleNamespace
+from contextlib import contextmanager
+import pytest
 
 # Add the project root to sys.path for test imports
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
-    sys.path.insert(0, project_root) 
\ No newline at end of file
+    sys.path.insert(0, project_root)
+
+# Modules create their OpenAI client at import time; tests never call the API
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+class FakeResult(list):
+    """
+    Records returned by a statement, with the Result methods the code uses.
+    consume() returns the result itself as the summary, carrying its counters.
+    """
+
+    def __init__(self, records=(), nodes_created=0, relationships_created=0):
+        super().__init__(records)
+        self.counters = SimpleNamespace(nodes_created=nodes_created, relationships_created=relationships_created)
+
+    def single(self):
+        return self[0] if self else None
+
+    def consume(self):
+        return self
+
+class FakeNeo4j:
+    """
+    In-memory stand-in for Neo4jManager, its driver, sessions and transactions.
+
+    Every statement run is recorded in `runs` as (query, params). `handler`,
+    if set, is called as handler(query, params) and returns the statement's
+    records (or a FakeResult with counters) or raises to simulate a
+    database error.
+    """
+
+    def __init__(self, handler=None):
+        self.handler = handler
+        self.runs = []
+        self.transactions = 0
+        self.has_apoc = None
+        self.setup_lock = threading.Lock()
+        self.driver = self
+
+    def get_session(self):
+        return self
+
+    def session(self, **kwargs):
+        return self
+
+    @contextmanager
+    def get_transaction(self):
+        self.transactions += 1
+        yield self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def run(self, query, parameters=None, **params):
+        params = {**(parameters or {}), **params}
+        self.runs.append((query, params))
+        records = self.handler(query, params) if self.handler else None
+        return records if isinstance(records, FakeResult) else FakeResult(records or [])
+
+    def execute_write(self, func, *args):
+        self.transactions += 1
+        return func(self, *args)
+
+    def execute_read(self, func, *args):
+        return func(self, *args)
+
+    @property
+    def queries(self):
+        return [query for query, _ in self.runs]
+
+@pytest.fixture
+def fake_neo4j():
+    """A FakeNeo4j with no handler; tests set `handler` to return records."""
+    return FakeNeo4j()
@@ -0,0 +1,81 @@
+"""
+Tests for the ingestion job endpoints and request coalescing of the API.
+"""
+import asyncio
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from api import main
+from nexus import core
+
+def job_handler(jobs):
+    """Return a FakeNeo4j handler keeping IngestJob nodes in a dict."""
+    def handler(query, params):
+        if query.startswith("CREATE (j:IngestJob"):
+            jobs[params["job_id"]] = {"id": params["job_id"], "kind": params["kind"], "status": "queued", "result": None}
+        elif "SET j.status = $status" in query:
+            jobs[params["job_id"]].update(status=params["status"], result=params["result"])
+        elif "RETURN count(j)" in query:
+            return [{"count": 0}]
+        elif params["job_id"] in jobs:
+            return [jobs[params["job_id"]]]
+        return []
+    return handler
+
+@pytest.fixture
+def client(monkeypatch, fake_neo4j):
+    fake_neo4j.handler = job_handler({})
+    monkeypatch.setattr(core, "get_db_manager", lambda: fake_neo4j)
+    # Background tasks run before TestClient returns the response
+    return TestClient(main.app)
+
+def test_add_text_job_records_result(monkeypatch, client):
+    """Test that a text job is queued, run in the background and polled to its result."""
+    monkeypatch.setattr(main, "ingest_text", lambda text, instructions: f"Processed {text!r}")
+    response = client.post("/add_text", json={"text": "# Notes\n", "instructions": ""})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert response.json()["status"] == "queued"
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job == {"job_id": job_id, "status": "finished", "result": "Processed '# Notes\\n'"}
+
+def test_failed_job_is_recorded(monkeypatch, client):
+    """Test that an ingestion error marks the job failed with its message."""
+    def fail(text, instructions):
+        raise RuntimeError("extraction failed")
+
+    monkeypatch.setattr(main, "ingest_text", fail)
+    job_id = client.post("/add_text", json={"text": "notes"}).json()["job_id"]
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job["status"] == "failed"
+    assert job["result"] == "Error: extraction failed"
+
+def test_unknown_job_is_not_found(client):
+    """Test that polling an unknown job id returns 404."""
+    assert client.get("/jobs/missing").status_code == 404
+
+def test_single_flight_shares_concurrent_calls():
+    """Test that identical concurrent calls run once and share the result."""
+    calls = []
+    lock = threading.Lock()
+
+    def compute(value):
+        with lock:
+            calls.append(value)
+        time.sleep(0.05)
+        return value * 2
+
+    async def run():
+        results = await asyncio.gather(
+            main._single_flight(b"a", compute, 1),
+            main._single_flight(b"a", compute, 1),
+            main._single_flight(b"b", compute, 2),
+        )
+        # Only running calls are shared; a later call computes again
+        results.append(await main._single_flight(b"a", compute, 1))
+        return results
+
+    assert asyncio.run(run()) == [2, 2, 4, 2]
+    assert sorted(calls) == [1, 1, 2]
+    assert main._inflight == {}
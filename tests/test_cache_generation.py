@@ -0,0 +1,67 @@
+"""
+Tests for the shared search cache generation.
+"""
+from nexus import core
+
+def generation_handler(counters):
+    """Return a FakeNeo4j handler keeping the generation counters in a dict."""
+    def handler(query, params):
+        name = params["name"]
+        if "MERGE" in query:
+            counters[name] = counters.get(name, 0) + 1
+        return [{"value": counters.get(name, 0)}]
+    return handler
+
+def test_bump_from_another_process_invalidates_cache(monkeypatch, fake_neo4j):
+    """Test that a generation bumped elsewhere stops cached results from being served."""
+    counters = {}
+    searches = []
+
+    def fake_search(query_text, node_type, k, min_score):
+        searches.append(query_text)
+        return f"result {len(searches)}"
+
+    fake_neo4j.handler = generation_handler(counters)
+    monkeypatch.setattr(core, "get_db_manager", lambda: fake_neo4j)
+    monkeypatch.setattr(core, "_search_knowledge", fake_search)
+    monkeypatch.setattr(core, "SEARCH_GENERATION_REFRESH_MS", 0)
+    core.clear_search_cache()
+    first = core.search_knowledge_core("alice")
+    assert core.search_knowledge_core("alice") == first
+    # Another worker or the CLI ingests a document
+    counters[core.SEARCH_GENERATION] += 1
+    assert core.search_knowledge_core("alice") == "result 2"
+    assert searches == ["alice", "alice"]
+
+def test_cache_hits_reuse_generation_within_refresh_interval(monkeypatch, fake_neo4j):
+    """Test that cache hits do not read the generation again until the refresh interval passes."""
+    counters = {}
+    fake_neo4j.handler = generation_handler(counters)
+    monkeypatch.setattr(core, "get_db_manager", lambda: fake_neo4j)
+    monkeypatch.setattr(core, "_search_knowledge", lambda *args: "result")
+    monkeypatch.setattr(core, "SEARCH_GENERATION_REFRESH_MS", 60_000)
+    core.clear_search_cache()
+    statements = len(fake_neo4j.runs)
+    for _ in range(5):
+        core.search_knowledge_core("carol")
+    assert len(fake_neo4j.runs) == statements
+    assert core.get_search_cache_stats()["hits"] == 4
+    # A local invalidation takes effect immediately
+    core.invalidate_search_cache()
+    assert core._current_generation() == counters[core.SEARCH_GENERATION]
+    core.search_knowledge_core("carol")
+    assert core.get_search_cache_stats()["misses"] == 2
+
+def test_search_bypasses_cache_without_generation(monkeypatch, fake_neo4j):
+    """Test that results are not cached when the shared generation cannot be read."""
+    def unavailable(query, params):
+        raise RuntimeError("database unavailable")
+
+    searches = []
+    fake_neo4j.handler = unavailable
+    monkeypatch.setattr(core, "get_db_manager", lambda: fake_neo4j)
+    core.clear_search_cache()
+    monkeypatch.setattr(core, "_search_knowledge", lambda *args: searches.append(args) or "result")
+    core.search_knowledge_core("bob")
+    core.search_knowledge_core("bob")
+    assert len(searches) == 2
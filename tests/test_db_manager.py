@@ -3,7 +3,7 @@ Tests for the database manager module.
 """
 import os
 import pytest
-from db.db_manager import Neo4jManager
+from db.db_manager import Neo4jManager, get_db_manager
 
 def test_neo4j_manager_init(monkeypatch):
     """Test Neo4j manager initialization with default values."""
@@ -37,6 +37,19 @@ def test_neo4j_manager_connect_no_password(monkeypatch):
     with pytest.raises(ValueError, match="NEO4J_PASSWORD environment variable is required"):
         manager.connect()
 
+def test_get_db_manager_is_shared(monkeypatch):
+    """Test that the process-wide manager connects once and is reused."""
+    connects = []
+    monkeypatch.setattr(Neo4jManager, "connect", lambda self: connects.append(self))
+    get_db_manager.cache_clear()
+    try:
+        first = get_db_manager()
+        second = get_db_manager()
+        assert first is second
+        assert connects == [first]
+    finally:
+        get_db_manager.cache_clear()
+
 @pytest.mark.skipif(
     not os.getenv("NEO4J_PASSWORD"),
     reason="NEO4J_PASSWORD environment variable not set"
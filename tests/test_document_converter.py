@@ -0,0 +1,101 @@
+"""
+Tests for writing batches of documents in the document converter.
+"""
+import datetime
+import pytest
+
+pytest.importorskip("markitdown")
+
+import document_converter
+from db import documents
+from document_converter import DocumentConverter, _PreparedDocument, _completed_future
+from models.document import Document
+from conftest import FakeResult
+
+def prepared_document(name):
+    document = Document(
+        id=f"id-{name}",
+        file_name=name,
+        file_type=".md",
+        file_size=1,
+        upload_date=datetime.datetime(2024, 1, 1),
+        original_path=f"/missing/{name}",
+        markdown_path=f"/missing/{name}",
+        conversion_status="Conversion Skipped",
+        content_hash=f"hash-{name}"
+    )
+    return _PreparedDocument(document=document, is_new=True, markdown_text=f"text of {name}",
+                             relationships_future=_completed_future([]))
+
+def document_writes(query, params):
+    """FakeNeo4j handler reporting the document nodes a statement creates."""
+    if query == documents.CREATE_DOCUMENTS_WITH_ENTITIES_QUERY:
+        return FakeResult(nodes_created=len(params["documents"]))
+    if query == documents.CREATE_DOCUMENT_WITH_ENTITIES_QUERY:
+        return FakeResult(nodes_created=1)
+    if query == documents.RELEASE_FAILED_CONTENT_HASH_QUERY:
+        return [{"released": 0}]
+    return []
+
+def make_converter(monkeypatch, fake_neo4j, fail_prepare=()):
+    """A converter writing to fake_neo4j, preparing sources without converting or calling the LLM."""
+    def prepare(source, relationship_pool, batch_mode=False):
+        if source in fail_prepare:
+            raise ValueError(f"cannot convert {source}")
+        return prepared_document(source)
+
+    monkeypatch.setattr(
+        document_converter.embedding_cache, "get_or_compute_many",
+        lambda db_manager, texts, keys=None: [[1.0, 0.0] for _ in texts]
+    )
+    if fake_neo4j.handler is None:
+        fake_neo4j.handler = document_writes
+    converter = DocumentConverter.__new__(DocumentConverter)
+    converter.db_manager = fake_neo4j
+    monkeypatch.setattr(converter, "_prepare_document", prepare)
+    return converter
+
+def written_ids(fake_neo4j):
+    ids = []
+    for query, params in fake_neo4j.runs:
+        if query == documents.CREATE_DOCUMENTS_WITH_ENTITIES_QUERY:
+            ids.extend(row["id"] for row in params["documents"])
+        elif query == documents.CREATE_DOCUMENT_WITH_ENTITIES_QUERY:
+            ids.append(params["id"])
+    return ids
+
+def test_failing_source_does_not_stop_the_batch(monkeypatch, fake_neo4j):
+    """Test that the other sources of a batch are embedded and stored when one fails to prepare."""
+    converter = make_converter(monkeypatch, fake_neo4j, fail_prepare={"b.md"})
+    results = converter.store_files_and_convert(["a.md", "b.md", "c.md"], return_exceptions=True)
+    assert [result.id for result in (results[0], results[2])] == ["id-a.md", "id-c.md"]
+    assert isinstance(results[1], ValueError)
+    assert written_ids(fake_neo4j) == ["id-a.md", "id-c.md"]
+    assert results[0].embedding == [1.0, 0.0]
+
+def test_failing_source_is_raised_after_the_others_are_stored(monkeypatch, fake_neo4j):
+    """Test that without return_exceptions the failure is raised once the batch is written."""
+    converter = make_converter(monkeypatch, fake_neo4j, fail_prepare={"a.md"})
+    with pytest.raises(ValueError, match="cannot convert a.md"):
+        converter.store_files_and_convert(["a.md", "b.md"])
+    assert written_ids(fake_neo4j) == ["id-b.md"]
+
+def test_failed_batch_transaction_falls_back_to_one_by_one(monkeypatch, fake_neo4j):
+    """Test that a failed batched write stores each document on its own, returning the ones that still fail."""
+    def handler(query, params):
+        if query == documents.CREATE_DOCUMENTS_WITH_ENTITIES_QUERY:
+            raise RuntimeError("constraint violation")
+        if query == documents.CREATE_DOCUMENT_WITH_ENTITIES_QUERY and params["id"] == "id-b.md":
+            raise RuntimeError("constraint violation")
+        return document_writes(query, params)
+
+    fake_neo4j.handler = handler
+    converter = make_converter(monkeypatch, fake_neo4j)
+    results = converter.store_files_and_convert(["a.md", "b.md", "c.md"], return_exceptions=True)
+    assert results[0].id == "id-a.md"
+    assert isinstance(results[1], RuntimeError)
+    assert results[2].id == "id-c.md"
+    single_writes = [
+        params["id"] for query, params in fake_neo4j.runs if query == documents.CREATE_DOCUMENT_WITH_ENTITIES_QUERY
+    ]
+    assert single_writes == ["id-a.md", "id-b.md", "id-c.md"]
@@ -0,0 +1,96 @@
+"""
+Tests for the persistent embedding cache.
+"""
+import numpy as np
+import pytest
+from db import embedding_cache
+
+class EmbeddingStore:
+    """In-memory EmbeddingCache nodes answering the cache's statements."""
+
+    def __init__(self):
+        self.nodes = {}
+        self.signatures = {}
+        self.lookups = 0
+
+    def __call__(self, query, params):
+        if "keys" in params:
+            self.lookups += 1
+            return [{"key": key, "vector": self.nodes[key]} for key in params["keys"] if key in self.nodes]
+        if "model" in params:
+            return [{"key": key, "minhash": minhash} for key, minhash in self.signatures.items()]
+        for row in params["rows"]:
+            self.nodes.setdefault(row["key"], row["vector"])
+            if row["minhash"] is not None:
+                self.signatures.setdefault(row["key"], row["minhash"])
+        return []
+
+@pytest.fixture
+def manager(fake_neo4j):
+    fake_neo4j.handler = EmbeddingStore()
+    return fake_neo4j
+
+def test_get_or_compute_many_embeds_misses_once(monkeypatch, manager):
+    """Test that cached texts are read back and only misses reach the API."""
+    requests = []
+
+    def fake_get_embeddings(texts, model):
+        requests.append(list(texts))
+        return [[float(len(text)), 0.5] for text in texts]
+
+    monkeypatch.setattr(embedding_cache, "get_embeddings", fake_get_embeddings)
+    first = embedding_cache.get_or_compute_many(manager, ["alpha", "", "be"])
+    assert first == [[5.0, 0.5], None, [2.0, 0.5]]
+    second = embedding_cache.get_or_compute_many(manager, ["alpha\n", "gamma"])
+    assert second[0] == first[0]
+    assert requests == [["alpha", "be"], ["gamma"]]
+    stored = manager.handler.nodes[embedding_cache.cache_key("alpha")]
+    assert np.frombuffer(stored, dtype="<f4").tolist() == [5.0, 0.5]
+
+def test_minhash_signature_tolerates_small_edits():
+    """Test that near-duplicate texts agree on almost every MinHash slot."""
+    words = [f"word{i}" for i in range(2000)]
+    text = " ".join(words)
+    edited = " ".join(words[:1000] + ["typo"] + words[1001:])
+    other = " ".join(f"term{i * 7}" for i in range(2000))
+    signature = embedding_cache.minhash_signature(text)
+    assert signature.shape == (embedding_cache.MINHASH_PERMUTATIONS,)
+    assert np.mean(signature == embedding_cache.minhash_signature(edited)) >= 0.97
+    assert np.mean(signature == embedding_cache.minhash_signature(other)) < 0.97
+
+def test_get_or_compute_many_reuses_near_duplicates(monkeypatch, manager):
+    """Test that a long text differing only slightly reuses the cached embedding."""
+    requests = []
+
+    def fake_get_embeddings(texts, model):
+        requests.append(list(texts))
+        return [[float(len(texts)), 1.0] for _ in texts]
+
+    monkeypatch.setattr(embedding_cache, "get_embeddings", fake_get_embeddings)
+    monkeypatch.setattr(embedding_cache, "_minhash_index", embedding_cache._MinHashIndex())
+    words = [f"token{i}" for i in range(1500)]
+    original = " ".join(words)
+    edited = "   ".join(words)
+    first = embedding_cache.get_or_compute_many(manager, [original])
+    # A fresh process loads the stored signatures from the cache nodes
+    monkeypatch.setattr(embedding_cache, "_minhash_index", embedding_cache._MinHashIndex())
+    second = embedding_cache.get_or_compute_many(manager, [edited, "short"])
+    assert second[0] == first[0]
+    assert requests == [[original], ["short"]]
+
+def test_get_or_compute_many_uses_precomputed_keys(monkeypatch, manager):
+    """Test that a composite key hits the cache without rehashing the text."""
+    requests = []
+
+    def fake_get_embeddings(texts, model):
+        requests.append(list(texts))
+        return [[1.0, 0.0] for _ in texts]
+
+    monkeypatch.setattr(embedding_cache, "get_embeddings", fake_get_embeddings)
+    key = embedding_cache.composite_key("abc123", ["desc", "Note", "summary"])
+    assert key != embedding_cache.composite_key("abc123", ["desc", "Note", "other"])
+    embedding_cache.get_or_compute_many(manager, ["body\ndesc", "memory"], keys=[key, None])
+    second = embedding_cache.get_or_compute_many(manager, ["changed text", "memory"], keys=[key, None])
+    assert second == [[1.0, 0.0], [1.0, 0.0]]
+    assert requests == [["body\ndesc", "memory"]]
+    assert key in manager.handler.nodes
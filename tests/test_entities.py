@@ -0,0 +1,35 @@
+"""
+Tests for the entity database operations.
+"""
+from db import entities
+from models.relationship import RelationshipSchema
+
+def test_store_relationships_is_one_unwind(fake_neo4j):
+    """Test that a list of relationships is written with a single statement."""
+    relationships = [
+        RelationshipSchema(subject="Alice", predicate="knows", object="Bob", confidence=0.9),
+        RelationshipSchema(subject="Bob", predicate="works_with", object="Carol", confidence=0.7),
+        RelationshipSchema(subject="Carol", predicate="knows", object="Alice", confidence=0.8),
+    ]
+    entities.store_relationships(fake_neo4j, relationships)
+    assert len(fake_neo4j.runs) == 1
+    query, params = fake_neo4j.runs[0]
+    assert query == entities.MERGE_RELATIONSHIPS_QUERY
+    assert params["rows"][0] == {"subject": "alice", "object": "bob", "predicate": "knows", "confidence": 0.9}
+    assert len(params["rows"]) == 3
+
+def test_store_relationships_chunks_large_batches(monkeypatch, fake_neo4j):
+    """Test that rows beyond the batch size are split into separately committed statements."""
+    monkeypatch.setattr(entities, "WRITE_BATCH_SIZE", 2)
+    relationships = [
+        RelationshipSchema(subject=f"e{i}", predicate="next", object=f"e{i + 1}", confidence=1.0)
+        for i in range(5)
+    ]
+    entities.store_relationships(fake_neo4j, relationships)
+    assert [len(params["rows"]) for _, params in fake_neo4j.runs] == [2, 2, 1]
+    assert fake_neo4j.transactions == 3
+
+def test_store_relationships_empty(fake_neo4j):
+    """Test that an empty list does not touch the database."""
+    entities.store_relationships(fake_neo4j, [])
+    assert fake_neo4j.runs == []
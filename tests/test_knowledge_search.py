@@ -0,0 +1,78 @@
+"""
+Tests for the knowledge search module.
+"""
+import pytest
+from db import knowledge_search
+
+def search_handler(index_records=None, scan_records=None, fail_index=False):
+    """Return a FakeNeo4j handler serving canned vector index and scan records."""
+    index_records = index_records or {}
+    scan_records = scan_records or []
+
+    def handler(query, params):
+        if "queryNodes" in query:
+            if fail_index:
+                raise RuntimeError("no such index")
+            return index_records.get(params["index_name"], [])
+        if "node_ids" in params:
+            return [
+                {"node_id": node_id, "n": scan_records[int(node_id)]["n"], "types": ["Entity"]}
+                for node_id in params["node_ids"]
+            ]
+        return [
+            {"node_id": str(i), "embedding": record["n"].get("embedding"), "embedding_int8": None}
+            for i, record in enumerate(scan_records)
+        ]
+    return handler
+
+def test_search_uses_vector_index_for_label(fake_neo4j):
+    """Test that a single-label search reads the label's vector index."""
+    records = [{"n": {"name": "alice", "embedding": None, "embedding_int8": None}, "types": ["Entity"], "similarity": 0.9}]
+    fake_neo4j.handler = search_handler(index_records={"entity_embedding": records})
+    results = knowledge_search.search_knowledge(fake_neo4j, [1.0, 0.0], node_type="Entity", k=5, min_score=0.5)
+    assert results == [{"name": "alice", "similarity": 0.9}]
+    assert len(fake_neo4j.runs) == 1
+    assert fake_neo4j.runs[0][1]["index_name"] == "entity_embedding"
+
+def test_search_all_merges_indexes(fake_neo4j):
+    """Test that searching all types merges every index and keeps the top k."""
+    fake_neo4j.handler = search_handler(index_records={
+        "entity_embedding": [{"n": {"name": "a"}, "types": ["Entity"], "similarity": 0.6}],
+        "memoryIndex": [{"n": {"content": "b"}, "types": ["Memory"], "similarity": 0.8}],
+    })
+    results = knowledge_search.search_knowledge(fake_neo4j, [1.0, 0.0], node_type="ALL", k=1)
+    assert results == [{"content": "b", "similarity": 0.8, "types": ["Memory"]}]
+    assert len(fake_neo4j.runs) == len(knowledge_search.VECTOR_INDEXES)
+
+def test_search_falls_back_to_scan(fake_neo4j):
+    """Test that a failing index query falls back to scoring every node."""
+    scan = [
+        {"n": {"name": "near", "embedding": [1.0, 0.1]}},
+        {"n": {"name": "far", "embedding": [0.0, 1.0]}},
+    ]
+    fake_neo4j.handler = search_handler(scan_records=scan, fail_index=True)
+    results = knowledge_search.search_knowledge(fake_neo4j, [1.0, 0.0], node_type="Entity", k=5, min_score=0.5)
+    assert [r["name"] for r in results] == ["near"]
+    assert results[0]["similarity"] == pytest.approx(0.995, abs=1e-3)
+
+def test_scan_returns_sorted_top_k(fake_neo4j):
+    """Test that the scan keeps only the k best matches, best first."""
+    scan = [
+        {"n": {"name": "mid", "embedding": [1.0, 0.5]}},
+        {"n": {"name": "best", "embedding": [1.0, 0.0]}},
+        {"n": {"name": "low", "embedding": [1.0, 1.0]}},
+        {"n": {"name": "empty", "embedding": []}},
+    ]
+    fake_neo4j.handler = search_handler(scan_records=scan, fail_index=True)
+    results = knowledge_search.search_knowledge(fake_neo4j, [1.0, 0.0], node_type="Entity", k=2, min_score=0.0)
+    assert [r["name"] for r in results] == ["best", "mid"]
+    assert "embedding" not in results[0]
+    # Only the top k nodes are fetched in full
+    assert fake_neo4j.runs[-1][1]["node_ids"] == ["1", "0"]
+
+def test_setup_creates_every_search_index(fake_neo4j):
+    """Test that setup creates the vector index of every label searched through one."""
+    knowledge_search.setup_search_indexes(fake_neo4j)
+    created = " ".join(q for q in fake_neo4j.queries if "CREATE VECTOR INDEX" in q)
+    for index_name in knowledge_search.VECTOR_INDEXES.values():
+        assert f"CREATE VECTOR INDEX {index_name} IF NOT EXISTS" in created
@@ -0,0 +1,41 @@
+"""
+Tests for the topic database operations.
+"""
+from db import topics
+from models.topic import TopicSchema
+
+def test_resolve_topics_is_one_transaction(fake_neo4j):
+    """Test that every topic is resolved by one statement and names come back in input order."""
+    fake_neo4j.handler = lambda query, params: [
+        {"index": 1, "name": "Machine Learning"},
+        {"index": 0, "name": "Python"},
+    ]
+    extracted = [TopicSchema(name="Python"), TopicSchema(name="ML", aliases=["machine learning"])]
+    assert topics.resolve_topics(fake_neo4j, extracted) == ["Python", "Machine Learning"]
+    assert fake_neo4j.transactions == 1
+    query, params = fake_neo4j.runs[0]
+    assert query == topics.RESOLVE_TOPICS_QUERY
+    assert params["topics"][1] == {"index": 1, "name": "ML", "aliases": ["machine learning"], "query": '"ML"'}
+
+def test_resolve_topics_falls_back_without_index(fake_neo4j):
+    """Test that topics are resolved one by one when the batched statement fails."""
+    def handler(query, params):
+        if query in (topics.RESOLVE_TOPICS_QUERY, topics.SEARCH_TOPICS_FULLTEXT_QUERY):
+            raise RuntimeError("no such index")
+        if query == topics.SEARCH_TOPICS_SCAN_QUERY and params["topic_name"] == "ML":
+            return [{"name": "Machine Learning", "aliases": ["ml"]}]
+        return []
+
+    fake_neo4j.handler = handler
+    extracted = [TopicSchema(name="ML", aliases=["deep learning"]), TopicSchema(name="Rust")]
+    assert topics.resolve_topics(fake_neo4j, extracted) == ["Machine Learning", "Rust"]
+    updates = {
+        params["name"]: sorted(params["aliases"])
+        for query, params in fake_neo4j.runs if query.startswith("MERGE (t:Topic")
+    }
+    assert updates == {"Machine Learning": ["deep learning", "ml"], "Rust": []}
+
+def test_resolve_topics_empty(fake_neo4j):
+    """Test that no topics do not touch the database."""
+    assert topics.resolve_topics(fake_neo4j, []) == []
+    assert fake_neo4j.runs == []
@@ -0,0 +1,186 @@
+"""
+Tests for the vector helper functions.
+"""
+import base64
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from db import vector_utils
+from db.vector_utils import cosine_similarity, cosine_similarities, quantize_int8, dequantize_int8, top_k_indices, nearest_rows, embedding_matrix, stream_top_k
+
+def test_cosine_similarity_pair():
+    """Test the pairwise helper against the textbook formula and zero vectors."""
+    a, b = np.array([1.0, 2.0, 3.0]), np.array([-2.0, 0.5, 4.0])
+    expected = np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+    assert cosine_similarity(a, b) == pytest.approx(expected)
+    assert cosine_similarity(a, np.zeros(3)) == 0.0
+
+def test_cosine_similarities_matches_pairwise():
+    """Test batched similarities against a direct pairwise computation."""
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=8)
+    matrix = rng.normal(size=(5, 8))
+    expected = [
+        np.dot(query, row) / (np.linalg.norm(query) * np.linalg.norm(row))
+        for row in matrix
+    ]
+    assert np.allclose(cosine_similarities(query, matrix), expected, atol=1e-6)
+
+def test_cosine_similarities_zero_vector():
+    """Test that zero vectors score 0 instead of producing NaN."""
+    scores = cosine_similarities([1.0, 0.0], [[0.0, 0.0], [2.0, 0.0]])
+    assert scores.tolist() == pytest.approx([0.0, 1.0])
+
+def test_cosine_similarities_empty():
+    """Test that an empty candidate set yields no scores."""
+    assert cosine_similarities([1.0, 0.0], []).size == 0
+
+def test_top_k_indices_orders_and_filters():
+    """Test that top_k_indices returns the best k above the threshold, best first."""
+    scores = np.array([0.2, 0.9, 0.5, 0.7, 0.1])
+    assert top_k_indices(scores, 3).tolist() == [1, 3, 2]
+    assert top_k_indices(scores, 10, min_score=0.6).tolist() == [1, 3]
+    assert top_k_indices(scores, 0).size == 0
+    assert top_k_indices(np.array([]), 5).size == 0
+
+def test_nearest_rows_parallel_matches_serial(monkeypatch):
+    """Test that the threaded scan merges its blocks into the serial result."""
+    rng = np.random.default_rng(1)
+    query = rng.normal(size=16)
+    matrix = rng.normal(size=(200, 16))
+    serial_idx, serial_scores = nearest_rows(query, matrix, 7, min_score=0.0)
+    monkeypatch.setattr(vector_utils, "PARALLEL_SCAN_MIN_ROWS", 10)
+    monkeypatch.setattr(vector_utils.os, "cpu_count", lambda: 4)
+    parallel_idx, parallel_scores = nearest_rows(query, matrix, 7, min_score=0.0)
+    assert parallel_idx.tolist() == serial_idx.tolist()
+    assert np.allclose(parallel_scores, serial_scores)
+
+
+def test_quantize_int8_round_trip():
+    """Test that int8 codes reconstruct the vector within one quantization step."""
+    vector = np.random.default_rng(1).normal(size=384).astype(np.float32)
+    codes, scale = quantize_int8(vector)
+    assert len(codes) == 384
+    assert np.max(np.abs(dequantize_int8(codes, scale) - vector)) <= scale / 2 + 1e-6
+
+def test_quantize_int8_preserves_cosine():
+    """Test that scoring the raw codes stays close to float similarity."""
+    rng = np.random.default_rng(2)
+    query = rng.normal(size=384)
+    matrix = rng.normal(size=(10, 384))
+    decoded = np.stack([dequantize_int8(quantize_int8(row)[0]) for row in matrix])
+    assert np.allclose(cosine_similarities(query, decoded), cosine_similarities(query, matrix), atol=1e-2)
+
+def test_embedding_matrix_mixes_codes_and_lists():
+    """Test that codes and float lists decode into one matrix, skipping unusable rows."""
+    codes, _ = quantize_int8([0.5, -1.0, 0.25])
+    nodes = [
+        {"embedding_int8": codes},
+        {"embedding": None},
+        {"embedding": [1.0, 2.0, 3.0]},
+        {"embedding": [1.0, 2.0]},
+    ]
+    matrix, rows = embedding_matrix(nodes)
+    assert rows == [0, 2]
+    assert matrix.dtype == np.float32 and matrix.flags["C_CONTIGUOUS"]
+    assert matrix[0].tolist() == np.frombuffer(codes, dtype=np.int8).tolist()
+    assert matrix[1].tolist() == [1.0, 2.0, 3.0]
+    assert embedding_matrix([])[1] == []
+
+def test_stream_top_k_matches_full_scan():
+    """Test that block-wise streaming keeps the same top k as scoring everything at once."""
+    rng = np.random.default_rng(2)
+    query = rng.normal(size=8)
+    vectors = rng.normal(size=(50, 8))
+    nodes = ({"id": i, "embedding": v.tolist()} for i, v in enumerate(vectors))
+    top = stream_top_k(query, nodes, 5, min_score=0.0, block_size=7)
+    expected_idx, expected_scores = nearest_rows(query, vectors, 5, min_score=0.0)
+    assert [node["id"] for node, _ in top] == expected_idx.tolist()
+    assert np.allclose([score for _, score in top], expected_scores)
+    assert stream_top_k(query, iter([]), 5) == []
+
+def test_quantize_int8_zero_vector():
+    """Test that a zero vector quantizes without dividing by zero."""
+    codes, scale = quantize_int8([0.0, 0.0, 0.0])
+    assert codes == bytes(3) and scale == 1.0
+
+
+def test_get_embeddings_batches_and_keeps_order(monkeypatch):
+    """Test that texts are embedded in few requests and mapped back by index."""
+    requests = []
+
+    def create(model, input, dimensions, encoding_format):
+        requests.append(input)
+        # Return the items out of order to exercise the index mapping
+        data = [SimpleNamespace(index=i, embedding=np.eye(4)[len(text)].tolist()) for i, text in enumerate(input)]
+        return SimpleNamespace(data=list(reversed(data)))
+
+    monkeypatch.setattr(vector_utils, "client", SimpleNamespace(embeddings=SimpleNamespace(create=create)))
+    monkeypatch.setattr(vector_utils, "EMBEDDING_BATCH_SIZE", 2)
+    monkeypatch.setattr(vector_utils, "_embedding_cache", vector_utils.LRUCache(maxsize=8))
+    embeddings = vector_utils.get_embeddings(["a", "  ", "bbb", "cc"])
+    assert embeddings == [np.eye(4)[1].tolist(), None, np.eye(4)[3].tolist(), np.eye(4)[2].tolist()]
+    assert requests == [["a", "bbb"], ["cc"]]
+
+
+def test_get_embedding_is_cached(monkeypatch):
+    """Test that repeated texts are embedded once and served from the cache."""
+    calls = []
+
+    def create(model, input, dimensions, encoding_format):
+        calls.append(input)
+        return SimpleNamespace(data=[SimpleNamespace(index=0, embedding=[0.6, 0.8])])
+
+    monkeypatch.setattr(vector_utils, "client", SimpleNamespace(embeddings=SimpleNamespace(create=create)))
+    monkeypatch.setattr(vector_utils, "_embedding_cache", vector_utils.LRUCache(maxsize=8))
+    first = vector_utils.get_embedding("Alice ")
+    first.append(1.0)
+    assert vector_utils.get_embedding("Alice") == pytest.approx([0.6, 0.8])
+    assert calls == ["Alice"]
+
+
+def test_get_embedding_is_normalized(monkeypatch):
+    """Test that base64 embeddings are decoded and come back with unit length."""
+    def create(model, input, dimensions, encoding_format):
+        assert encoding_format == "base64"
+        packed = base64.b64encode(np.array([3.0, 4.0], dtype="<f4").tobytes()).decode()
+        return SimpleNamespace(data=[SimpleNamespace(index=0, embedding=packed)])
+
+    monkeypatch.setattr(vector_utils, "client", SimpleNamespace(embeddings=SimpleNamespace(create=create)))
+    monkeypatch.setattr(vector_utils, "_embedding_cache", vector_utils.LRUCache(maxsize=8))
+    assert vector_utils.get_embedding("Bob") == pytest.approx([0.6, 0.8])
+
+
+def test_get_embeddings_shares_cache(monkeypatch):
+    """Test that batch embedding skips cached and repeated texts."""
+    requests = []
+
+    def create(model, input, dimensions, encoding_format):
+        requests.append(input)
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[1.0, 0.0]) for i in range(len(input))])
+
+    monkeypatch.setattr(vector_utils, "client", SimpleNamespace(embeddings=SimpleNamespace(create=create)))
+    monkeypatch.setattr(vector_utils, "_embedding_cache", vector_utils.LRUCache(maxsize=8))
+    vector_utils.get_embedding("alice")
+    embeddings = vector_utils.get_embeddings(["alice", "bob", "bob"])
+    assert embeddings == [[1.0, 0.0]] * 3
+    assert requests == ["alice", ["bob"]]
+    assert vector_utils.get_embedding("bob") == [1.0, 0.0]
+    assert len(requests) == 2
+
+
+def test_embedding_dimensions_are_requested_and_keyed(monkeypatch):
+    """Test that the configured dimensions reach the API and separate cached vectors."""
+    requests = []
+
+    def create(model, input, dimensions, encoding_format):
+        requests.append(dimensions)
+        return SimpleNamespace(data=[SimpleNamespace(index=0, embedding=[1.0] * dimensions)])
+
+    monkeypatch.setattr(vector_utils, "client", SimpleNamespace(embeddings=SimpleNamespace(create=create)))
+    monkeypatch.setattr(vector_utils, "_embedding_cache", vector_utils.LRUCache(maxsize=8))
+    monkeypatch.setattr(vector_utils, "EMBEDDING_DIMENSIONS", 4)
+    assert len(vector_utils.get_embedding("carol")) == 4
+    monkeypatch.setattr(vector_utils, "EMBEDDING_DIMENSIONS", 2)
+    assert len(vector_utils.get_embeddings(["carol"])[0]) == 2
+    assert requests == [4, 2]